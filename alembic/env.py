@@ -1,9 +1,10 @@
+from contextlib import ExitStack
 from logging.config import fileConfig
 import os
 import sys
 from pathlib import Path
 
-from sqlalchemy import engine_from_config
+from sqlalchemy import create_engine
 from sqlalchemy import pool
 
 from alembic import context
@@ -11,8 +12,12 @@ from alembic import context
 # プロジェクトルートをパスに追加
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from app.database import Base
-from app.models import User, Channel, Message, MessageReport  # noqa: F401
+from app.config import get_settings
+from app.database import DEFAULT_SHARD, Base
+from app.models import Workspace, User, Channel, Message, MessageReport, MessageMention, MessageRevision, ChannelReadState, RateLimitBucket, RevokedToken  # noqa: F401
+from app.models import ReportHourlyRollup, ReportWindowTotal, ReportRollupWatermark  # noqa: F401
+from app.services.workspaces import align_id_sequences
+from app.sqlite import create_schema, create_sqlite_engine, is_sqlite_url
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -32,9 +37,16 @@ if config.config_file_name is not None:
 target_metadata = Base.metadata
 
 
+def shard_urls() -> dict:
+    """マイグレーションするシャード（default は DATABASE_URL、続けて DATABASE_SHARDS の順）"""
+    return {DEFAULT_SHARD: database_url, **get_settings().DATABASE_SHARDS}
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
+    SQLの出力は default シャードの分だけ（他のシャードは online で適用する）。
+
     This configures the context with just a URL
     and not an Engine, though an Engine is acceptable
     here as well.  By skipping the Engine creation
@@ -44,6 +56,7 @@ def run_migrations_offline() -> None:
     script output.
     """
     url = config.get_main_option("sqlalchemy.url")
+    config.attributes["shard"] = DEFAULT_SHARD
     context.configure(
         url=url,
         target_metadata=target_metadata,
@@ -60,23 +73,41 @@ def run_migrations_online() -> None:
 
     In this scenario we need to create an Engine
     and associate a connection with the context.
-    """
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
-
-
-if context.is_offline_mode():
+    全シャードに同じマイグレーションを順に適用し（マイグレーションは config.attributes["shard"] で
+    シャードを見分けられる）、最後にシャード間でIDが重ならないよう連番を揃える。
+    """
+    with ExitStack() as stack:
+        connections = {}
+        for name, url in shard_urls().items():
+            connectable = create_engine(url, poolclass=pool.NullPool)
+            connection = stack.enter_context(connectable.connect())
+            config.attributes["shard"] = name
+            context.configure(
+                connection=connection, target_metadata=target_metadata
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+            connections[name] = connection
+
+        for connection in connections.values():
+            stack.enter_context(connection.begin())
+        align_id_sequences(connections)
+
+
+def run_sqlite_schema() -> None:
+    """SQLite ではマイグレーション（Postgres 向け）を適用せず、モデルからテーブルを作って head を記録する"""
+    connectable = create_sqlite_engine(database_url)
+    with connectable.begin() as connection:
+        create_schema(connection)
+        context.configure(connection=connection, target_metadata=target_metadata)
+        context.get_context().stamp(context.script, "head")
+
+
+if is_sqlite_url(database_url):
+    run_sqlite_schema()
+elif context.is_offline_mode():
     run_migrations_offline()
 else:
     run_migrations_online()
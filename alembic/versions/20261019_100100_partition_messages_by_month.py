@@ -0,0 +1,176 @@
+"""partition messages by month
+
+messages を created_at、message_reports を message_created_at（通報対象メッセージの投稿日時）で
+月次レンジパーティションに変換する。パーティションテーブルの主キー・一意制約には
+パーティションキーを含める必要があるため、それぞれ複合キーになる。
+パーティション作成の DDL は app.services.partitions を読み込まず、このファイルに写しておく
+（後でアプリ側の関数を変えても、このマイグレーションの処理は変わらない）。
+
+Revision ID: 8a4e6d2c5b31
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-19 10:01:00.000000
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4e6d2c5b31'
+down_revision: Union[str, None] = '3f1c2a9b7d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 変換時にあらかじめ作っておく未来の月数
+PRECREATE_MONTHS = 3
+# このマイグレーションで分割するテーブル -> パーティションキー
+PARTITIONED_TABLES = ("messages", "message_reports")
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(month: date) -> str:
+    return f"{month:%Y-%m-%d} 00:00:00+00"
+
+
+def _create_month_partitions(start: date, end: date) -> None:
+    """start月からend月（両端含む）までの各テーブルの月次パーティションを作成"""
+    month = start
+    while month <= end:
+        for table in PARTITIONED_TABLES:
+            op.execute(
+                f"CREATE TABLE IF NOT EXISTS {table}_p{month:%Y%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(_add_months(month, 1))}')"
+            )
+        month = _add_months(month, 1)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    # 既存テーブルを退避（インデックス・制約名は新テーブルと衝突するため付け替える）
+    op.drop_index('ix_message_reports_reporter_user_id', table_name='message_reports')
+    op.drop_index('ix_message_reports_message_id', table_name='message_reports')
+    op.drop_index('ix_message_reports_id', table_name='message_reports')
+    op.drop_index('ix_messages_id', table_name='messages')
+    op.execute("ALTER TABLE message_reports RENAME CONSTRAINT message_reports_pkey TO message_reports_legacy_pkey")
+    op.execute("ALTER TABLE message_reports RENAME CONSTRAINT uq_message_report_per_user TO uq_message_report_per_user_legacy")
+    op.execute("ALTER TABLE message_reports RENAME TO message_reports_legacy")
+    op.execute("ALTER TABLE messages RENAME CONSTRAINT messages_pkey TO messages_legacy_pkey")
+    op.execute("ALTER TABLE messages RENAME TO messages_legacy")
+
+    op.execute("""
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            channel_id INTEGER NOT NULL REFERENCES channels (id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            text TEXT NOT NULL,
+            is_edited BOOLEAN,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE,
+            CONSTRAINT messages_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("""
+        CREATE TABLE message_reports (
+            id INTEGER NOT NULL DEFAULT nextval('message_reports_id_seq'),
+            message_id INTEGER NOT NULL,
+            message_created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            reporter_user_id INTEGER NOT NULL REFERENCES users (id),
+            label VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            CONSTRAINT message_reports_pkey PRIMARY KEY (id, message_created_at),
+            CONSTRAINT uq_message_report_per_user UNIQUE (message_id, reporter_user_id, message_created_at),
+            CONSTRAINT message_reports_message_fkey FOREIGN KEY (message_id, message_created_at)
+                REFERENCES messages (id, created_at) ON DELETE CASCADE
+        ) PARTITION BY RANGE (message_created_at)
+    """)
+    op.create_index('ix_messages_id', 'messages', ['id'], unique=False)
+    op.create_index('ix_messages_channel_id_created_at', 'messages', ['channel_id', 'created_at'], unique=False)
+    op.create_index('ix_message_reports_id', 'message_reports', ['id'], unique=False)
+    op.create_index('ix_message_reports_message_id', 'message_reports', ['message_id'], unique=False)
+    op.create_index('ix_message_reports_reporter_user_id', 'message_reports', ['reporter_user_id'], unique=False)
+
+    # 既存データの最古月から数か月先までのパーティションを作成
+    oldest = conn.execute(sa.text("SELECT min(created_at) FROM messages_legacy")).scalar()
+    current = _month_start(datetime.now(timezone.utc).date())
+    start = _month_start(oldest.astimezone(timezone.utc).date()) if oldest else current
+    _create_month_partitions(start, _add_months(current, PRECREATE_MONTHS))
+
+    op.execute("""
+        INSERT INTO messages (id, channel_id, user_id, text, is_edited, created_at, updated_at)
+        SELECT id, channel_id, user_id, text, is_edited, coalesce(created_at, now()), updated_at
+        FROM messages_legacy
+    """)
+    op.execute("""
+        INSERT INTO message_reports (id, message_id, message_created_at, reporter_user_id, label, created_at)
+        SELECT r.id, r.message_id, m.created_at, r.reporter_user_id, r.label, r.created_at
+        FROM message_reports_legacy r
+        JOIN messages m ON m.id = r.message_id
+    """)
+
+    # シーケンスを新テーブルに付け替えてから旧テーブルを削除
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute("ALTER SEQUENCE message_reports_id_seq OWNED BY message_reports.id")
+    op.execute("DROP TABLE message_reports_legacy")
+    op.execute("DROP TABLE messages_legacy")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_message_reports_reporter_user_id', table_name='message_reports')
+    op.drop_index('ix_message_reports_message_id', table_name='message_reports')
+    op.drop_index('ix_message_reports_id', table_name='message_reports')
+    op.drop_index('ix_messages_channel_id_created_at', table_name='messages')
+    op.drop_index('ix_messages_id', table_name='messages')
+    op.execute("ALTER TABLE message_reports RENAME CONSTRAINT message_reports_pkey TO message_reports_partitioned_pkey")
+    op.execute("ALTER TABLE message_reports RENAME CONSTRAINT uq_message_report_per_user TO uq_message_report_per_user_partitioned")
+    op.execute("ALTER TABLE message_reports RENAME TO message_reports_partitioned")
+    op.execute("ALTER TABLE messages RENAME CONSTRAINT messages_pkey TO messages_partitioned_pkey")
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+
+    op.execute("""
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            channel_id INTEGER NOT NULL REFERENCES channels (id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            text TEXT NOT NULL,
+            is_edited BOOLEAN,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE,
+            CONSTRAINT messages_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("""
+        CREATE TABLE message_reports (
+            id INTEGER NOT NULL DEFAULT nextval('message_reports_id_seq'),
+            message_id INTEGER NOT NULL REFERENCES messages (id) ON DELETE CASCADE,
+            reporter_user_id INTEGER NOT NULL REFERENCES users (id),
+            label VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            CONSTRAINT message_reports_pkey PRIMARY KEY (id),
+            CONSTRAINT uq_message_report_per_user UNIQUE (message_id, reporter_user_id)
+        )
+    """)
+    op.execute("INSERT INTO messages SELECT * FROM messages_partitioned")
+    op.execute("""
+        INSERT INTO message_reports (id, message_id, reporter_user_id, label, created_at)
+        SELECT id, message_id, reporter_user_id, label, created_at FROM message_reports_partitioned
+    """)
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute("ALTER SEQUENCE message_reports_id_seq OWNED BY message_reports.id")
+    op.execute("DROP TABLE message_reports_partitioned")
+    op.execute("DROP TABLE messages_partitioned")
+    op.create_index('ix_messages_id', 'messages', ['id'], unique=False)
+    op.create_index('ix_message_reports_id', 'message_reports', ['id'], unique=False)
+    op.create_index('ix_message_reports_message_id', 'message_reports', ['message_id'], unique=False)
+    op.create_index('ix_message_reports_reporter_user_id', 'message_reports', ['reporter_user_id'], unique=False)
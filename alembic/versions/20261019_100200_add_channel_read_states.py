@@ -0,0 +1,37 @@
+"""add channel read states
+
+Revision ID: c52b9e0f4a77
+Revises: 8a4e6d2c5b31
+Create Date: 2026-10-19 10:02:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52b9e0f4a77'
+down_revision: Union[str, None] = '8a4e6d2c5b31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('channel_read_states',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('channel_id', sa.Integer(), nullable=False),
+    sa.Column('last_read_message_id', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['channel_id'], ['channels.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'channel_id')
+    )
+    op.create_index(op.f('ix_channel_read_states_channel_id'), 'channel_read_states', ['channel_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_channel_read_states_channel_id'), table_name='channel_read_states')
+    op.drop_table('channel_read_states')
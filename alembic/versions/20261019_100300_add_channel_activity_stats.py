@@ -0,0 +1,54 @@
+"""add channel activity stats
+
+Revision ID: 5d7f1b3e9c02
+Revises: c52b9e0f4a77
+Create Date: 2026-10-19 10:03:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7f1b3e9c02'
+down_revision: Union[str, None] = 'c52b9e0f4a77'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('channels', sa.Column('last_message_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.add_column('channels', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('channels', sa.Column('active_member_count', sa.Integer(), server_default='0', nullable=False))
+
+    # 既存データから集計値を埋める
+    op.execute("""
+        UPDATE channels c SET
+            last_message_at = coalesce(
+                (SELECT max(m.created_at) FROM messages m WHERE m.channel_id = c.id),
+                c.created_at,
+                now()
+            ),
+            message_count = (SELECT count(*) FROM messages m WHERE m.channel_id = c.id)
+    """)
+    op.execute("""
+        UPDATE channels c SET active_member_count = r.member_count
+        FROM (
+            SELECT channel_id, count(*) AS member_count
+            FROM channel_read_states GROUP BY channel_id
+        ) r
+        WHERE r.channel_id = c.id
+    """)
+
+    op.create_index('ix_channels_last_message_at_id', 'channels', ['last_message_at', 'id'], unique=False)
+    op.create_index('ix_channels_name_prefix', 'channels', ['name'], unique=False, postgresql_ops={'name': 'varchar_pattern_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_channels_name_prefix', table_name='channels')
+    op.drop_index('ix_channels_last_message_at_id', table_name='channels')
+    op.drop_column('channels', 'active_member_count')
+    op.drop_column('channels', 'message_count')
+    op.drop_column('channels', 'last_message_at')
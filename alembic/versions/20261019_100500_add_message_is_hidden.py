@@ -0,0 +1,27 @@
+"""add message is_hidden
+
+Revision ID: 7b9d2e4a1c68
+Revises: e81a4c6f2d95
+Create Date: 2026-10-19 10:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b9d2e4a1c68'
+down_revision: Union[str, None] = 'e81a4c6f2d95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # パーティション親に追加すれば全パーティションに反映される（定数デフォルトなので書き換えは発生しない）
+    op.add_column('messages', sa.Column('is_hidden', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('messages', 'is_hidden')
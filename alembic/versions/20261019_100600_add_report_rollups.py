@@ -0,0 +1,82 @@
+"""add report rollups
+
+Revision ID: 2c6f8a0d3e17
+Revises: 7b9d2e4a1c68
+Create Date: 2026-10-19 10:06:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c6f8a0d3e17'
+down_revision: Union[str, None] = '7b9d2e4a1c68'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 集計期間（app.services.report_rollups.PERIODS と同じ）
+_PERIODS = "periods (period, length) AS (VALUES ('1h', interval '1 hour'), ('24h', interval '24 hours'), ('7d', interval '7 days'))"
+
+
+def upgrade() -> None:
+    op.create_table('report_hourly_rollups',
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('channel_id', sa.Integer(), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('author_user_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('bucket_start', 'channel_id', 'message_id')
+    )
+    op.create_table('report_window_totals',
+    sa.Column('period', sa.String(length=10), nullable=False),
+    sa.Column('channel_id', sa.Integer(), nullable=False),
+    sa.Column('subject_type', sa.String(length=10), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('period', 'channel_id', 'subject_type', 'subject_id')
+    )
+    op.create_index('ix_report_window_totals_ranking', 'report_window_totals', ['period', 'channel_id', 'subject_type', 'count', 'subject_id'], unique=False)
+    op.create_table('report_rollup_watermarks',
+    sa.Column('period', sa.String(length=10), nullable=False),
+    sa.Column('expired_through', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('period')
+    )
+    # 既存の通報から直近7日分の集計を作る（アプリのコードはこの時点のスキーマを前提にしないため、SQLで書く）
+    op.execute("""
+        INSERT INTO report_hourly_rollups (bucket_start, channel_id, message_id, author_user_id, count)
+        SELECT date_trunc('hour', r.created_at), m.channel_id, r.message_id, m.user_id, count(*)
+        FROM message_reports r
+        JOIN messages m ON m.id = r.message_id AND m.created_at = r.message_created_at
+        WHERE r.created_at >= date_trunc('hour', now()) - interval '7 days'
+        GROUP BY 1, 2, 3, 4
+    """)
+    op.execute(f"""
+        WITH {_PERIODS}, recent AS (
+            SELECT p.period, h.channel_id, h.message_id, h.author_user_id, h.count
+            FROM periods p
+            JOIN report_hourly_rollups h ON h.bucket_start >= date_trunc('hour', now()) - p.length
+        )
+        INSERT INTO report_window_totals (period, channel_id, subject_type, subject_id, count)
+        SELECT period, channel_id, 'message', message_id, sum(count) FROM recent GROUP BY period, channel_id, message_id
+        UNION ALL
+        SELECT period, channel_id, 'user', author_user_id, sum(count) FROM recent GROUP BY period, channel_id, author_user_id
+        UNION ALL
+        SELECT period, 0, 'message', message_id, sum(count) FROM recent GROUP BY period, message_id
+        UNION ALL
+        SELECT period, 0, 'user', author_user_id, sum(count) FROM recent GROUP BY period, author_user_id
+    """)
+    op.execute(f"""
+        WITH {_PERIODS}
+        INSERT INTO report_rollup_watermarks (period, expired_through)
+        SELECT period, date_trunc('hour', now()) - length FROM periods
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('report_rollup_watermarks')
+    op.drop_index('ix_report_window_totals_ranking', table_name='report_window_totals')
+    op.drop_table('report_window_totals')
+    op.drop_table('report_hourly_rollups')
@@ -0,0 +1,53 @@
+"""add message mentions
+
+message_mentions は messages（created_at）と同じ月で切り離せるよう、message_created_at の
+月次レンジパーティションにする（messages のパーティションを切り離す前に同じ月を片付けるため）。
+
+Revision ID: 9e3a5c7b1f40
+Revises: 2c6f8a0d3e17
+Create Date: 2026-10-19 10:07:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3a5c7b1f40'
+down_revision: Union[str, None] = '2c6f8a0d3e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('message_mentions',
+    sa.Column('mentioned_user_id', sa.Integer(), nullable=False),
+    sa.Column('message_created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('channel_id', sa.Integer(), nullable=False),
+    sa.Column('author_user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['mentioned_user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['author_user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['channel_id'], ['channels.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['message_id', 'message_created_at'], ['messages.id', 'messages.created_at'], name='message_mentions_message_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('mentioned_user_id', 'message_created_at', 'message_id'),
+    postgresql_partition_by='RANGE (message_created_at)'
+    )
+    op.create_index('ix_message_mentions_message_id', 'message_mentions', ['message_id'], unique=False)
+
+    # messages にある月と同じパーティションを作る（以降の月は manage_partitions.py precreate で作る）
+    partitions = op.get_bind().execute(sa.text(
+        "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'messages'"
+    )).all()
+    for name, bound in partitions:
+        op.execute(f"CREATE TABLE message_mentions{name[len('messages'):]} PARTITION OF message_mentions {bound}")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_message_mentions_message_id', table_name='message_mentions')
+    op.drop_table('message_mentions')
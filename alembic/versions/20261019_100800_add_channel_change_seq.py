@@ -0,0 +1,28 @@
+"""add channel change_seq
+
+Revision ID: 4d1b7f9e2a53
+Revises: 9e3a5c7b1f40
+Create Date: 2026-10-19 10:08:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d1b7f9e2a53'
+down_revision: Union[str, None] = '9e3a5c7b1f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('channels', sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('channels', sa.Column('changed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('channels', 'changed_at')
+    op.drop_column('channels', 'change_seq')
@@ -0,0 +1,53 @@
+"""add message revisions
+
+message_revisions は messages と同じ月で切り離せるよう、message_created_at の月次レンジパーティションにする。
+パーティションテーブルの主キー・一意制約にはパーティションキーを含める必要があるため、それぞれ複合キーになる。
+
+Revision ID: 6a0c2e8d4b95
+Revises: 4d1b7f9e2a53
+Create Date: 2026-10-19 10:09:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a0c2e8d4b95'
+down_revision: Union[str, None] = '4d1b7f9e2a53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('message_revisions',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('message_created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('is_snapshot', sa.Boolean(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('edited_by', sa.Integer(), nullable=False),
+    sa.Column('edited_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['edited_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['message_id', 'message_created_at'], ['messages.id', 'messages.created_at'], name='message_revisions_message_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', 'message_created_at'),
+    sa.UniqueConstraint('message_id', 'seq', 'message_created_at', name='uq_message_revision_seq'),
+    postgresql_partition_by='RANGE (message_created_at)'
+    )
+
+    # messages にある月と同じパーティションを作る（以降の月は manage_partitions.py precreate で作る）
+    partitions = op.get_bind().execute(sa.text(
+        "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'messages'"
+    )).all()
+    for name, bound in partitions:
+        op.execute(f"CREATE TABLE message_revisions{name[len('messages'):]} PARTITION OF message_revisions {bound}")
+
+
+def downgrade() -> None:
+    op.drop_table('message_revisions')
@@ -0,0 +1,107 @@
+"""add workspaces
+
+Revision ID: 8c4e2a6f1b73
+Revises: 3f8b1d6c9a24
+Create Date: 2026-10-19 10:11:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2a6f1b73'
+down_revision: Union[str, None] = '3f8b1d6c9a24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 集計期間（app.services.report_rollups.PERIODS と同じ）
+_PERIODS = "periods (period, length) AS (VALUES ('1h', interval '1 hour'), ('24h', interval '24 hours'), ('7d', interval '7 days'))"
+
+
+def upgrade() -> None:
+    op.create_table('workspaces',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('slug', sa.String(length=50), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('shard', sa.String(length=50), server_default='default', nullable=False),
+    sa.Column('state', sa.String(length=20), server_default='active', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('slug')
+    )
+    op.create_index(op.f('ix_workspaces_id'), 'workspaces', ['id'], unique=False)
+    # 既存のユーザー・チャンネルはすべて既定のワークスペースに属する（対応表は default シャードのみ）
+    if op.get_context().config.attributes.get('shard', 'default') == 'default':
+        op.execute("INSERT INTO workspaces (id, slug, name) VALUES (1, 'default', 'default')")
+        op.execute("SELECT setval(pg_get_serial_sequence('workspaces', 'id'), 1)")
+
+    op.add_column('users', sa.Column('workspace_id', sa.Integer(), server_default='1', nullable=False))
+    op.alter_column('users', 'workspace_id', server_default=None)
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_index('ix_users_username', table_name='users')
+    op.create_index('ix_users_workspace_email', 'users', ['workspace_id', 'email'], unique=True)
+    op.create_index('ix_users_workspace_username', 'users', ['workspace_id', 'username'], unique=True)
+
+    op.add_column('channels', sa.Column('workspace_id', sa.Integer(), server_default='1', nullable=False))
+    op.alter_column('channels', 'workspace_id', server_default=None)
+    op.drop_constraint('channels_name_key', 'channels', type_='unique')
+    op.create_unique_constraint('uq_channels_workspace_name', 'channels', ['workspace_id', 'name'])
+    op.drop_index('ix_channels_name_prefix', table_name='channels')
+    op.drop_index('ix_channels_last_message_at_id', table_name='channels')
+    op.create_index('ix_channels_workspace_last_message_at_id', 'channels', ['workspace_id', 'last_message_at', 'id'], unique=False)
+    op.create_index('ix_channels_workspace_name_prefix', 'channels', ['workspace_id', 'name'], unique=False, postgresql_ops={'name': 'varchar_pattern_ops'})
+
+    # 失効リストはユーザーのシャードに関係なく default シャードに置く
+    op.drop_constraint('revoked_tokens_user_id_fkey', 'revoked_tokens', type_='foreignkey')
+
+    # 全チャンネル合計（channel_id = 0）の行を、ワークスペース単位（channel_id = -workspace_id）に作り直す
+    op.execute("DELETE FROM report_window_totals")
+    op.execute(f"""
+        WITH {_PERIODS}, recent AS (
+            SELECT p.period, h.channel_id, -c.workspace_id AS workspace_channel_id,
+                   h.message_id, h.author_user_id, h.count
+            FROM periods p
+            JOIN report_rollup_watermarks w ON w.period = p.period
+            JOIN report_hourly_rollups h ON h.bucket_start >= w.expired_through
+            JOIN channels c ON c.id = h.channel_id
+        )
+        INSERT INTO report_window_totals (period, channel_id, subject_type, subject_id, count)
+        SELECT period, channel_id, 'message', message_id, sum(count) FROM recent GROUP BY period, channel_id, message_id
+        UNION ALL
+        SELECT period, channel_id, 'user', author_user_id, sum(count) FROM recent GROUP BY period, channel_id, author_user_id
+        UNION ALL
+        SELECT period, workspace_channel_id, 'message', message_id, sum(count)
+        FROM recent GROUP BY period, workspace_channel_id, message_id
+        UNION ALL
+        SELECT period, workspace_channel_id, 'user', author_user_id, sum(count)
+        FROM recent GROUP BY period, workspace_channel_id, author_user_id
+    """)
+
+
+def downgrade() -> None:
+    # ワークスペース単位の合計を、以前の全チャンネル合計（channel_id = 0）にまとめ直す
+    op.execute("""
+        INSERT INTO report_window_totals (period, channel_id, subject_type, subject_id, count)
+        SELECT period, 0, subject_type, subject_id, sum(count)
+        FROM report_window_totals WHERE channel_id < 0
+        GROUP BY period, subject_type, subject_id
+    """)
+    op.execute("DELETE FROM report_window_totals WHERE channel_id < 0")
+    op.create_foreign_key('revoked_tokens_user_id_fkey', 'revoked_tokens', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    op.drop_index('ix_channels_workspace_name_prefix', table_name='channels')
+    op.drop_index('ix_channels_workspace_last_message_at_id', table_name='channels')
+    op.create_index('ix_channels_last_message_at_id', 'channels', ['last_message_at', 'id'], unique=False)
+    op.create_index('ix_channels_name_prefix', 'channels', ['name'], unique=False, postgresql_ops={'name': 'varchar_pattern_ops'})
+    op.drop_constraint('uq_channels_workspace_name', 'channels', type_='unique')
+    op.create_unique_constraint('channels_name_key', 'channels', ['name'])
+    op.drop_column('channels', 'workspace_id')
+    op.drop_index('ix_users_workspace_username', table_name='users')
+    op.drop_index('ix_users_workspace_email', table_name='users')
+    op.create_index('ix_users_username', 'users', ['username'], unique=True)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.drop_column('users', 'workspace_id')
+    op.drop_index(op.f('ix_workspaces_id'), table_name='workspaces')
+    op.drop_table('workspaces')
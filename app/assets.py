@@ -0,0 +1,39 @@
+"""静的ファイルの配信（内容ハッシュ付きURLと長期キャッシュ）
+
+テンプレートでは `{{ static_url('css/style.css') }}` で `/static/css/style.css?v=<内容のハッシュ>` を出力する。
+ハッシュ付きのURLは内容が変われば別のURLになるため、immutable として1年間キャッシュさせる。
+"""
+import hashlib
+from pathlib import Path
+from typing import Dict, Tuple
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# path -> (mtime_ns, ハッシュ)
+_hashes: Dict[str, Tuple[int, str]] = {}
+
+
+def static_url(path: str) -> str:
+    """内容ハッシュ付きの静的ファイルURL"""
+    file = STATIC_DIR / path
+    mtime = file.stat().st_mtime_ns
+    cached = _hashes.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _hashes[path] = (mtime, hashlib.sha256(file.read_bytes()).hexdigest()[:12])
+    return f"/static/{path}?v={cached[1]}"
+
+
+class HashedStaticFiles(StaticFiles):
+    """?v= 付きで参照されたファイルは immutable、それ以外は毎回再検証させる"""
+    
+    async def get_response(self, path: str, scope: Scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200 or response.status_code == 304:
+            if b"v=" in scope.get("query_string", b""):
+                response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+            else:
+                response.headers["Cache-Control"] = "no-cache"
+        return response
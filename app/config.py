@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Dict
 
 
 class Settings(BaseSettings):
@@ -14,14 +15,78 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "postgresql://postgres:postgres@db:5432/powerharafilter"
     POSTGRES_PASSWORD: str | None = None  # DBコンテナ用。アプリでは未使用だが環境変数として許容する。
+    DATABASE_READ_REPLICA_URL: str | None = None  # 未設定ならプライマリで読み取りも行う
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # -1 で無効
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # 0 で無制限
+    READ_AFTER_WRITE_SECONDS: int = 5  # 書き込み直後にプライマリから読む期間（レプリカ遅延の上限目安）
+    # DATABASE_URL が sqlite:///path/to/chat.db（sqlite:// でメモリ上）のときの設定
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # 書き込みの順番待ち・ロック待ちの上限
+    SQLITE_CACHE_SIZE_KB: int = 65536  # 接続ごとのページキャッシュ
+    SQLITE_MMAP_SIZE_MB: int = 256  # 0 で無効
+    # 追加のシャード（JSON: {"shard2": "postgresql://..."}）。DATABASE_URL は "default" シャード兼ワークスペース一覧の置き場
+    # 並び順をIDの採番に使うため、シャードは末尾に追加する
+    DATABASE_SHARDS: Dict[str, str] = {}
+    WORKSPACE_MAP_TTL_SECONDS: float = 5.0  # ワークスペース → シャードの対応表を読み直す間隔
+    SHARD_ID_STRIDE: int = 16  # シャード間でIDが重ならないよう、各シャードの連番をこの間隔で採番する（シャード数の上限）
     
     # JWT Settings
     SECRET_KEY: str = "dev-secret-key-not-for-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_REVOCATION_REFRESH_SECONDS: float = 30.0  # 失効リストを読み直す間隔（NOTIFYを取りこぼした場合の保険）
     
     # App Settings
     DEBUG: bool = True
+    MESSAGE_HISTORY_LIMIT: int = 200  # チャンネル画面に表示する直近メッセージ数
+    CHANNEL_PAGE_SIZE: int = 50  # チャンネル一覧の1ページあたりの件数
+    MESSAGE_ARCHIVE_DIR: str = "archive"  # 切り離した古いパーティションの出力先
+    PARTITION_PRECREATE_MONTHS: int = 3  # 起動時・定期的に、当月から何か月先までのパーティションを用意するか
+    PARTITION_PRECREATE_INTERVAL_SECONDS: float = 21600.0  # 未来のパーティションを確かめる間隔
+    USERNAME_CACHE_TTL_SECONDS: float = 60.0  # メンション解決用のユーザー名一覧を読み直す間隔
+    MENTION_PAGE_SIZE: int = 30  # メンション一覧の1ページあたりの件数
+    API_PAGE_SIZE: int = 50  # JSON API の履歴1ページの既定件数
+    API_PAGE_SIZE_MAX: int = 200  # JSON API の履歴1ページの最大件数
+    API_TAILS_MAX_CHANNELS: int = 50  # 複数チャンネルの末尾取得で1回に指定できるチャンネル数
+    MESSAGE_REVISION_SNAPSHOT_INTERVAL: int = 8  # 編集履歴でこの版数ごとに差分ではなく本文を保存する
+    REPORT_ROLLUP_EXPIRE_INTERVAL_SECONDS: float = 300.0  # 通報集計から期間外の分を差し引く間隔
+
+    # Rate Limit Settings（書き込み系エンドポイント）
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory"（ワーカー単位）または "postgres"（全ワーカー共有）
+    RATE_LIMIT_USER_RATE: float = 1.0  # ユーザーごとの書き込み数/秒
+    RATE_LIMIT_USER_BURST: int = 10
+    RATE_LIMIT_CHANNEL_RATE: float = 20.0  # チャンネルごとの投稿・編集数/秒
+    RATE_LIMIT_CHANNEL_BURST: int = 50
+    RATE_LIMIT_MAX_KEYS: int = 100000  # ワーカー内で保持するバケット数の上限
+    
+    # Server Settings
+    SERVER_MODE: str = "development"  # "development"（--reload）または "production"
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    WEB_CONCURRENCY: int = 1  # 本番モードのワーカープロセス数（リアルタイム配信はワーカーをまたがないため既定は1）
+    COMPRESSION_MIN_SIZE: int = 1024  # これ以上の大きさのHTML・JSONを圧縮する（brotliがあれば優先）
+    TEMPLATE_CACHE_DIR: str = "/tmp/powerharafilter-jinja-cache"
+    WS_DRAIN_TIMEOUT_SECONDS: float = 5.0  # シャットダウン時にWebSocketを閉じ切るまでの猶予
+    WS_RECONNECT_JITTER_MS: int = 3000  # 再接続を分散させるための最大待ち時間
+    WS_MAX_SUBSCRIPTIONS: int = 500  # 1接続あたりの購読チャンネル数の上限
+    WS_PING_INTERVAL_SECONDS: float = 20.0  # サーバーからpingを送る間隔
+    WS_IDLE_TIMEOUT_SECONDS: float = 60.0  # この間クライアントから何も届かなければ切断する
+    WS_ADMISSION_RATE: float = 50.0  # 1ワーカーが受け入れるハンドシェイク数/秒
+    WS_ADMISSION_BURST: int = 100
+    WS_COALESCE_WINDOW_MS: float = 0.0  # 0より大きいと、この間に届いたチャンネルのイベントを1フレームにまとめる（5〜20程度）
+    PRESENCE_SNAPSHOT_INTERVAL_SECONDS: float = 2.0  # 在席・入力中表示を配信する間隔（変化のあったチャンネルのみ）
+    TYPING_TIMEOUT_SECONDS: float = 5.0  # 最後の入力通知からこの時間で入力中表示を消す
+    PRESENCE_TYPING_NAMES: int = 3  # 入力中表示で名前を出す人数
+    SSE_FEED_BUFFER: int = 64  # SSEで遅れた購読者に後から送れるイベント数（チャンネルごと）
+    GRACEFUL_SHUTDOWN_TIMEOUT_SECONDS: int = 15
+
+    @property
+    def is_production(self) -> bool:
+        """本番モードかどうか"""
+        return self.SERVER_MODE == "production"
 
 
 @lru_cache()
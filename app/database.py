@@ -1,23 +1,114 @@
+from fastapi import Request, Response
+from starlette.requests import HTTPConnection
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from app.config import get_settings
+from app.sqlite import create_sqlite_engine, is_sqlite_url
 
 settings = get_settings()
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-)
+# 書き込み直後であることを示すCookie（有効期間中は読み取りもプライマリで行う）
+RECENT_WRITE_COOKIE = "recent_write"
+
+
+def _create_engine(url: str):
+    """プール設定とステートメントタイムアウトを適用したエンジンを生成"""
+    if is_sqlite_url(url):
+        return create_sqlite_engine(url)
+    connect_args = {}
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        connect_args=connect_args,
+    )
+
+
+engine = _create_engine(settings.DATABASE_URL)
+
+# 読み取り専用レプリカ（未設定ならプライマリと同じエンジン）
+if settings.DATABASE_READ_REPLICA_URL:
+    read_engine = _create_engine(settings.DATABASE_READ_REPLICA_URL)
+else:
+    read_engine = engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# シャード名 -> エンジン。DATABASE_URL は "default" シャードで、ワークスペースの対応表と失効リストも置く
+DEFAULT_SHARD = "default"
+shard_engines = {DEFAULT_SHARD: engine}
+for _name, _url in settings.DATABASE_SHARDS.items():
+    shard_engines[_name] = _create_engine(_url)
+shard_sessions = {
+    name: sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+    for name, shard_engine in shard_engines.items()
+}
 
 Base = declarative_base()
 
 
-def get_db():
-    """DBセッションを取得する依存関係"""
+def get_db(connection: HTTPConnection):
+    """リクエストのワークスペースが置かれたシャードのDBセッションを取得する依存関係"""
+    from app.services.workspaces import resolve_shard
+    db = shard_sessions[resolve_shard(connection, write=True)]()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_catalog_db():
+    """default シャード（ワークスペースの対応表・失効リスト）のDBセッションを取得する依存関係"""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db(request: Request):
+    """読み取り専用のDBセッションを取得する依存関係
+
+    直前に書き込んだユーザーは自分の投稿がレプリカ遅延で欠けないよう、
+    RECENT_WRITE_COOKIE が有効な間はプライマリから読む。
+    読み取りレプリカは default シャードにだけ設定でき、他のシャードはプライマリから読む。
+    """
+    from app.services.workspaces import resolve_shard
+    shard = resolve_shard(request)
+    if shard != DEFAULT_SHARD:
+        db = shard_sessions[shard]()
+    elif read_engine is engine or request.cookies.get(RECENT_WRITE_COOKIE):
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def mark_recent_write(response: Response) -> Response:
+    """書き込み直後の読み取りをプライマリへ向けるCookieをセット"""
+    if read_engine is not engine:
+        response.set_cookie(
+            key=RECENT_WRITE_COOKIE,
+            value="1",
+            max_age=settings.READ_AFTER_WRITE_SECONDS,
+            httponly=True,
+            samesite="lax",
+        )
+    return response
+
+
+def upsert_insert(db: Session, table):
+    """ON CONFLICT を付けられる INSERT（セッションの接続先に合わせて Postgres / SQLite のものを使う）"""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
@@ -1,31 +1,95 @@
+import asyncio
+import math
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from pathlib import Path
-from app.routers import auth, channels, messages
+from fastapi.responses import HTMLResponse, JSONResponse
+from app.assets import STATIC_DIR, HashedStaticFiles
+from app.middleware import CompressionMiddleware
+from app.routers import admin, api_v1, auth, channels, mentions, messages
 from app.config import get_settings
+from app.database import engine
+from app.services import partitions, report_rollups, token_revocation
+from app.services.admission import admission
+from app.services.channel_feed import channel_feeds
+from app.services.presence import presence
+from app.services.rate_limit import RateLimitExceeded, get_rate_limit_metrics
+from app.services.websocket_manager import manager
+from app.sqlite import create_schema, write_queue
+from app.templating import templates, warm_up_templates
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動時・終了時の処理"""
+    # 初回リクエストでのコンパイル待ちをなくすため、全テンプレートを事前に読み込む
+    warm_up_templates()
+    # SQLite はマイグレーションを使わず、モデルからテーブルを作る（メモリ上のDBは起動のたびに空）
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            create_schema(conn)
+    # 失効済みトークンを受け付けないよう、リクエストを受ける前に失効リストを読み込む
+    await token_revocation.load_revocations()
+    heartbeat_task = asyncio.create_task(manager.heartbeat())
+    partition_task = asyncio.create_task(partitions.precreate_loop())
+    report_rollup_task = asyncio.create_task(report_rollups.expire_loop())
+    revocation_task = asyncio.create_task(token_revocation.sync_loop())
+    presence_task = asyncio.create_task(presence.run())
+    yield
+    presence_task.cancel()
+    heartbeat_task.cancel()
+    partition_task.cancel()
+    report_rollup_task.cancel()
+    revocation_task.cancel()
+    # uvicorn経由以外で終了した場合も残っている接続を閉じる
+    await manager.drain()
+
+
 # FastAPIアプリケーション
 app = FastAPI(
     title="パワハラフィルターチャット",
     description="パワハラ防止フィルター付きSlack風チャットアプリケーション",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # 静的ファイルのマウント
-BASE_DIR = Path(__file__).resolve().parent
-app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
+app.mount("/static", HashedStaticFiles(directory=STATIC_DIR), name="static")
+
+# HTML・JSON の圧縮（SSEなどのストリーミングは対象外）
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    """流量制限超過（HTMXからのリクエストには通知用の部分テンプレートを返す）"""
+    retry_after = max(1, math.ceil(exc.retry_after))
+    message = (
+        "投稿が多すぎます"
+        if exc.scope == "user"
+        else "このチャンネルへの投稿が集中しています"
+    )
+    headers = {"Retry-After": str(retry_after)}
+    if request.headers.get("HX-Request"):
+        # 元のターゲットではなく通知領域に追加する
+        headers.update({"HX-Retarget": "#flash-messages", "HX-Reswap": "beforeend"})
+        return templates.TemplateResponse(
+            "partials/rate_limited.html",
+            {"request": request, "message": message, "retry_after": retry_after},
+            status_code=429,
+            headers=headers,
+        )
+    return JSONResponse({"detail": message}, status_code=429, headers=headers)
 
-# Jinja2テンプレート設定
-templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
 # ルーター登録
 app.include_router(auth.router)
 app.include_router(channels.router)
 app.include_router(messages.router)
+app.include_router(mentions.router)
+app.include_router(admin.router)
+app.include_router(api_v1.router)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -46,6 +110,37 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """ワーカー単位のメトリクス"""
+    return {
+        "rate_limit": get_rate_limit_metrics(),
+        "websocket": {
+            "connections": len(manager.connections),
+            "channels": len(manager.active_connections),
+            "frames_sent": manager.frames_sent,
+            "events_coalesced": manager.events_coalesced,
+            "admitted": admission.admitted,
+            "rejected": admission.rejected,
+        },
+        "presence": {
+            "typing_events": presence.typing_events,
+            "typing_collapsed": presence.typing_collapsed,
+            "snapshots_sent": presence.snapshots_sent,
+        },
+        "sse": {
+            "subscribers": channel_feeds.subscribers,
+            "channels": len(channel_feeds.feeds),
+        },
+        "token_revocation": {
+            "revoked": len(token_revocation.revoked_tokens.expires),
+            "notifications": token_revocation.revoked_tokens.notifications,
+            "listening": token_revocation.revoked_tokens.listener is not None,
+        },
+        "sqlite_write_queue": write_queue.metrics() if engine.dialect.name == "sqlite" else None,
+    }
+
+
 @app.get("/auth/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """ログインページ"""
@@ -1,6 +1,14 @@
+from app.models.workspace import Workspace
 from app.models.user import User
 from app.models.channel import Channel
 from app.models.message import Message
 from app.models.message_report import MessageReport
+from app.models.message_mention import MessageMention
+from app.models.message_revision import MessageRevision
+from app.models.channel_read_state import ChannelReadState
+from app.models.rate_limit_bucket import RateLimitBucket
+from app.models.revoked_token import RevokedToken
+from app.models.report_rollup import ReportHourlyRollup, ReportWindowTotal, ReportRollupWatermark
 
-__all__ = ["User", "Channel", "Message", "MessageReport"]
+__all__ = ["Workspace", "User", "Channel", "Message", "MessageReport", "MessageMention", "MessageRevision", "ChannelReadState", "RateLimitBucket", "RevokedToken",
+           "ReportHourlyRollup", "ReportWindowTotal", "ReportRollupWatermark"]
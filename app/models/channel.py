@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -7,13 +7,33 @@ from app.database import Base
 class Channel(Base):
     """チャンネルモデル"""
     __tablename__ = "channels"
+    __table_args__ = (
+        Index("ix_channels_workspace_last_message_at_id", "workspace_id", "last_message_at", "id"),
+        # LIKE 'prefix%' をロケールに関係なくインデックスで引けるようにする
+        Index(
+            "ix_channels_workspace_name_prefix", "workspace_id", "name",
+            postgresql_ops={"name": "varchar_pattern_ops"},
+        ),
+        # チャンネル名はワークスペース内で一意
+        UniqueConstraint("workspace_id", "name", name="uq_channels_workspace_name"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), unique=True, nullable=False)
+    # workspaces は default シャードにあるため外部キーは張らない
+    workspace_id = Column(Integer, nullable=False)
+    name = Column(String(100), nullable=False)
     description = Column(Text, nullable=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    # 一覧表示用の集計値（メッセージの書き込み時に更新する）
+    last_message_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    active_member_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # チャンネル画面の内容（メッセージ・通報）が変わるたびに増やす。ETag / Last-Modified に使う
+    change_seq = Column(BigInteger, nullable=False, default=0, server_default="0")
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
     # リレーション
     creator = relationship("User", backref="created_channels")
     messages = relationship("Message", back_populates="channel", cascade="all, delete-orphan")
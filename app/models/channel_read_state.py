@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class ChannelReadState(Base):
+    """ユーザーごとのチャンネル既読位置と未読数"""
+    __tablename__ = "channel_read_states"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    channel_id = Column(Integer, ForeignKey("channels.id", ondelete="CASCADE"), primary_key=True, index=True)
+    last_read_message_id = Column(Integer, nullable=False, default=0, server_default="0")
+    # メッセージの投稿・削除時に増減させる（一覧表示のたびに数えない）
+    unread_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<ChannelReadState(user_id={self.user_id}, channel_id={self.channel_id}, unread_count={self.unread_count})>"
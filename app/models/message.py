@@ -1,19 +1,28 @@
-from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import false as sa_false, func
 from app.database import Base
 
 
 class Message(Base):
     """メッセージモデル"""
     __tablename__ = "messages"
+    # created_at の月次レンジパーティション。DB上の主キーは (id, created_at)（マイグレーションで管理）
+    __table_args__ = (
+        Index("ix_messages_channel_id_created_at", "channel_id", "created_at"),
+        # SQLite では主キーが id だけのため、(id, created_at) への外部キーの参照先として一意制約を置く
+        UniqueConstraint("id", "created_at", name="uq_messages_id_created_at").ddl_if(dialect="sqlite"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     channel_id = Column(Integer, ForeignKey("channels.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     text = Column(Text, nullable=False)
     is_edited = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # 管理者による非表示（履歴・未読数・メッセージ数から除外する）
+    is_hidden = Column(Boolean, nullable=False, default=False, server_default=sa_false())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # リレーション
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, ForeignKeyConstraint, Index
+from app.database import Base
+
+
+class MessageMention(Base):
+    """メッセージ中の @ユーザー名 の索引（「自分宛てのメンション」一覧用）"""
+    __tablename__ = "message_mentions"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["message_id", "message_created_at"],
+            ["messages.id", "messages.created_at"],
+            name="message_mentions_message_fkey",
+            ondelete="CASCADE",
+        ),
+        # 編集時に対象メッセージのメンションを差し替えるため
+        Index("ix_message_mentions_message_id", "message_id"),
+        # messages と同じ月で切り離せるよう、メッセージの投稿月で分割する
+        {"postgresql_partition_by": "RANGE (message_created_at)"},
+    )
+    
+    # (mentioned_user_id, message_created_at, message_id) の主キー索引を新しい順に読めば一覧になる
+    mentioned_user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    message_created_at = Column(DateTime(timezone=True), primary_key=True)
+    message_id = Column(Integer, primary_key=True)
+    channel_id = Column(Integer, ForeignKey("channels.id", ondelete="CASCADE"), nullable=False)
+    author_user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    
+    def __repr__(self):
+        return f"<MessageMention(mentioned_user_id={self.mentioned_user_id}, message_id={self.message_id})>"
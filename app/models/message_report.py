@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, ForeignKeyConstraint, UniqueConstraint
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -6,12 +6,22 @@ from app.database import Base
 class MessageReport(Base):
     """メッセージ通報モデル"""
     __tablename__ = "message_reports"
+    # 通報対象メッセージの投稿月で分割し、messages のパーティションと対応させる
+    # （message_id から message_created_at は一意に決まるため、一意制約の意味は変わらない）
     __table_args__ = (
-        UniqueConstraint("message_id", "reporter_user_id", name="uq_message_report_per_user"),
+        UniqueConstraint("message_id", "reporter_user_id", "message_created_at", name="uq_message_report_per_user"),
+        ForeignKeyConstraint(
+            ["message_id", "message_created_at"],
+            ["messages.id", "messages.created_at"],
+            name="message_reports_message_fkey",
+            ondelete="CASCADE",
+        ),
+        {"postgresql_partition_by": "RANGE (message_created_at)"},
     )
     
     id = Column(Integer, primary_key=True, index=True)
-    message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), nullable=False, index=True)
+    message_id = Column(Integer, nullable=False, index=True)
+    message_created_at = Column(DateTime(timezone=True), nullable=False)
     reporter_user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     label = Column(String(50), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
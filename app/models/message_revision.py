@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, BigInteger, Boolean, DateTime, ForeignKey, ForeignKeyConstraint, LargeBinary, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class MessageRevision(Base):
+    """メッセージの編集前の版（追記のみ）
+
+    seq 版の本文を、1つ新しい版からの差分（is_snapshot=False）または本文そのもの（is_snapshot=True）として
+    zlib 圧縮して持つ。最新版の本文は messages.text にある。
+    """
+    __tablename__ = "message_revisions"
+    # messages と同じ月で切り離せるよう、メッセージの投稿月で分割する。DB上の主キーは (id, message_created_at)（マイグレーションで管理）
+    __table_args__ = (
+        UniqueConstraint("message_id", "seq", "message_created_at", name="uq_message_revision_seq"),
+        ForeignKeyConstraint(
+            ["message_id", "message_created_at"],
+            ["messages.id", "messages.created_at"],
+            name="message_revisions_message_fkey",
+            ondelete="CASCADE",
+        ),
+        {"postgresql_partition_by": "RANGE (message_created_at)"},
+    )
+    
+    # SQLite の自動採番は INTEGER PRIMARY KEY だけ
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    message_id = Column(Integer, nullable=False)
+    message_created_at = Column(DateTime(timezone=True), nullable=False)
+    # 何番目の版か（投稿時の本文が0）
+    seq = Column(Integer, nullable=False)
+    is_snapshot = Column(Boolean, nullable=False, default=False)
+    payload = Column(LargeBinary, nullable=False)
+    # この版を書き換えたユーザーと日時
+    edited_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    edited_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<MessageRevision(message_id={self.message_id}, seq={self.seq}, is_snapshot={self.is_snapshot})>"
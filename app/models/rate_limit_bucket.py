@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Float, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class RateLimitBucket(Base):
+    """全ワーカー共有の流量制限バケット（RATE_LIMIT_BACKEND=postgres のときに使用）"""
+    __tablename__ = "rate_limit_buckets"
+    
+    key = Column(String(100), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<RateLimitBucket(key={self.key}, tokens={self.tokens})>"
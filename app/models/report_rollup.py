@@ -0,0 +1,49 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from app.database import Base
+
+
+class ReportHourlyRollup(Base):
+    """1時間ごと・メッセージごとの通報数（集計期間から外れた分を差し引くために使う）"""
+    __tablename__ = "report_hourly_rollups"
+    
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    channel_id = Column(Integer, primary_key=True)
+    message_id = Column(Integer, primary_key=True)
+    # 通報されたメッセージの投稿者
+    author_user_id = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0, server_default="0")
+    
+    def __repr__(self):
+        return f"<ReportHourlyRollup(bucket_start={self.bucket_start}, message_id={self.message_id}, count={self.count})>"
+
+
+class ReportWindowTotal(Base):
+    """集計期間（1h/24h/7d）ごとの通報数の合計
+
+    channel_id=0 は全チャンネル合計。subject_type は "message" または "user"（投稿者）。
+    """
+    __tablename__ = "report_window_totals"
+    __table_args__ = (
+        # 上位k件を索引の先頭から読むだけで返せるようにする
+        Index("ix_report_window_totals_ranking", "period", "channel_id", "subject_type", "count", "subject_id"),
+    )
+    
+    period = Column(String(10), primary_key=True)
+    channel_id = Column(Integer, primary_key=True)
+    subject_type = Column(String(10), primary_key=True)
+    subject_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0, server_default="0")
+    
+    def __repr__(self):
+        return f"<ReportWindowTotal(period={self.period}, channel_id={self.channel_id}, {self.subject_type}={self.subject_id}, count={self.count})>"
+
+
+class ReportRollupWatermark(Base):
+    """集計期間ごとに、どの時間帯までの通報を合計から差し引いたか"""
+    __tablename__ = "report_rollup_watermarks"
+    
+    period = Column(String(10), primary_key=True)
+    expired_through = Column(DateTime(timezone=True), nullable=False)
+    
+    def __repr__(self):
+        return f"<ReportRollupWatermark(period={self.period}, expired_through={self.expired_through})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -6,10 +6,17 @@ from app.database import Base
 class User(Base):
     """ユーザーモデル"""
     __tablename__ = "users"
+    __table_args__ = (
+        # メールアドレス・ユーザー名はワークスペース内で一意
+        Index("ix_users_workspace_email", "workspace_id", "email", unique=True),
+        Index("ix_users_workspace_username", "workspace_id", "username", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    email = Column(String(255), unique=True, index=True, nullable=False)
-    username = Column(String(100), unique=True, index=True, nullable=False)
+    # workspaces は default シャードにあるため外部キーは張らない
+    workspace_id = Column(Integer, nullable=False)
+    email = Column(String(255), nullable=False)
+    username = Column(String(100), nullable=False)
     hashed_password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
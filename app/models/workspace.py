@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class Workspace(Base):
+    """ワークスペース（組織）とその置き場所のシャード
+
+    対応表として参照するのは default シャードの行だけ（他のシャードの表は空のまま）。
+    """
+    __tablename__ = "workspaces"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    slug = Column(String(50), unique=True, nullable=False)
+    name = Column(String(100), nullable=False)
+    shard = Column(String(50), nullable=False, default="default", server_default="default")
+    # active: 通常 / readonly: シャード間の移動中で書き込みを受け付けない
+    state = Column(String(20), nullable=False, default="active", server_default="active")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<Workspace(id={self.id}, slug={self.slug}, shard={self.shard})>"
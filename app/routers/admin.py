@@ -0,0 +1,165 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Literal, Optional
+from app.database import get_db, get_read_db
+from app.models.channel import Channel
+from app.models.message import Message
+from app.models.user import User
+from app.schemas.moderation import (
+    BulkModerationRequest,
+    BulkModerationResult,
+    MessageHistory,
+    MessageVersion,
+    ReportDashboard,
+    ReportedMessage,
+    ReportedUser,
+)
+from app.services.auth import get_current_admin_user
+from app.services.report_rollups import top_reported
+from app.services.revisions import load_history, load_version
+from app.services.moderation import bulk_moderate
+from app.services.websocket_manager import manager
+
+router = APIRouter(prefix="/admin", tags=["管理"])
+
+
+async def run_bulk_moderation(
+    action: str, body: BulkModerationRequest, admin: User, db: Session
+) -> BulkModerationResult:
+    """一括処理を1トランザクションで実行し、チャンネルごとに1件だけイベントを配信"""
+    try:
+        affected = bulk_moderate(
+            db,
+            action,
+            admin.workspace_id,
+            channel_id=body.channel_id,
+            message_ids=body.message_ids,
+            user_id=body.user_id,
+            since=body.since,
+            until=body.until,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    
+    for channel_id, message_ids in affected.items():
+        await manager.broadcast_to_channel(channel_id, {
+            "type": "bulk_delete",
+            "action": action,
+            "message_ids": message_ids,
+        })
+    
+    return BulkModerationResult(
+        action=action,
+        total=sum(len(ids) for ids in affected.values()),
+        channels={channel_id: len(ids) for channel_id, ids in affected.items()},
+    )
+
+
+@router.post("/messages/bulk_hide", response_model=BulkModerationResult)
+async def bulk_hide_messages(
+    body: BulkModerationRequest,
+    admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """メッセージの一括非表示（ID一覧・ユーザー・チャンネル内の期間で指定）"""
+    return await run_bulk_moderation("hide", body, admin, db)
+
+
+@router.post("/messages/bulk_delete", response_model=BulkModerationResult)
+async def bulk_delete_messages(
+    body: BulkModerationRequest,
+    admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """メッセージの一括削除（ID一覧・ユーザー・チャンネル内の期間で指定）"""
+    return await run_bulk_moderation("delete", body, admin, db)
+
+
+@router.get("/reports/dashboard", response_model=ReportDashboard)
+async def report_dashboard(
+    period: Literal["1h", "24h", "7d"] = "24h",
+    channel_id: Optional[int] = None,
+    limit: int = Query(10, ge=1, le=100),
+    admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_read_db)
+):
+    """通報数の多いメッセージ・ユーザー（channel_id 省略時はワークスペース内の全チャンネル）
+
+    集計済みの report_window_totals から上位 limit 件を読み、表示用の情報は
+    その件数分だけ messages / users から引く。集計は1時間単位で期間外の分を差し引く。
+    """
+    if channel_id is not None and db.query(Channel.id).filter(
+        Channel.id == channel_id, Channel.workspace_id == admin.workspace_id
+    ).first() is None:
+        raise HTTPException(status_code=404, detail="チャンネルが見つかりません")
+    message_rows = top_reported(db, admin.workspace_id, period, "message", channel_id, limit)
+    user_rows = top_reported(db, admin.workspace_id, period, "user", channel_id, limit)
+    
+    message_ids = [row.subject_id for row in message_rows]
+    messages = {}
+    if message_ids:
+        for msg, username in (
+            db.query(Message, User.username)
+            .join(User, Message.user_id == User.id)
+            .filter(Message.id.in_(message_ids))
+        ):
+            messages[msg.id] = (msg, username)
+    
+    user_ids = [row.subject_id for row in user_rows]
+    usernames = dict(db.query(User.id, User.username).filter(User.id.in_(user_ids))) if user_ids else {}
+    
+    top_messages = []
+    for row in message_rows:
+        item = ReportedMessage(message_id=row.subject_id, report_count=row.count)
+        if row.subject_id in messages:
+            msg, username = messages[row.subject_id]
+            item.channel_id = msg.channel_id
+            item.text = msg.text
+            item.author_user_id = msg.user_id
+            item.username = username
+            item.is_hidden = msg.is_hidden
+        top_messages.append(item)
+    
+    return ReportDashboard(
+        period=period,
+        channel_id=channel_id,
+        top_messages=top_messages,
+        top_users=[
+            ReportedUser(user_id=row.subject_id, report_count=row.count, username=usernames.get(row.subject_id))
+            for row in user_rows
+        ],
+    )
+
+
+@router.get("/messages/{message_id}/history", response_model=MessageHistory)
+async def message_history(
+    message_id: int,
+    seq: Optional[int] = Query(None, ge=0),
+    admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_read_db)
+):
+    """メッセージの編集履歴（seq を指定するとその版だけを復元して返す）"""
+    message = (
+        db.query(Message)
+        .join(Channel, Message.channel_id == Channel.id)
+        .filter(Message.id == message_id, Channel.workspace_id == admin.workspace_id)
+        .first()
+    )
+    if not message:
+        raise HTTPException(status_code=404, detail="メッセージが見つかりません")
+    
+    if seq is None:
+        versions = [MessageVersion(**version) for version in load_history(db, message)]
+    else:
+        text = load_version(db, message, seq)
+        if text is None:
+            raise HTTPException(status_code=404, detail="指定した版がありません")
+        versions = [MessageVersion(seq=seq, text=text)]
+    
+    return MessageHistory(
+        message_id=message.id,
+        channel_id=message.channel_id,
+        user_id=message.user_id,
+        versions=versions,
+    )
@@ -0,0 +1,291 @@
+"""モバイル・ボット向けの JSON API（/api/v1）
+
+HTML を返す画面用エンドポイントと同じ処理を、Bearer トークン認証の JSON で提供する。
+履歴の読み取りは fields で指定された列だけを SELECT し、行をそのまま dict にして
+ORJSONResponse で返す（1行ごとに Pydantic モデルを作らない）。
+"""
+import base64
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, select, true, tuple_
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.database import get_db, get_read_db, mark_recent_write
+from app.models.channel import Channel
+from app.models.message import Message
+from app.models.message_report import MessageReport
+from app.models.user import User
+from app.routers.messages import (
+    count_reports,
+    edit_message,
+    find_workspace_message,
+    get_workspace_channel,
+    post_message,
+    remove_message,
+)
+from app.schemas.message import MessageCreate, MessageReportSummary, MessageUpdate, MessageWithUser
+from app.services.auth import decode_token, get_active_user, get_current_user_required, oauth2_scheme
+
+settings = get_settings()
+
+router = APIRouter(prefix="/api/v1", tags=["JSON API"], default_response_class=ORJSONResponse)
+
+# fields で指定できる列
+FIELD_COLUMNS = {
+    "id": Message.id,
+    "channel_id": Message.channel_id,
+    "user_id": Message.user_id,
+    "username": User.username,
+    "text": Message.text,
+    "is_edited": Message.is_edited,
+    "created_at": Message.created_at,
+    "updated_at": Message.updated_at,
+}
+# 列ではなく別クエリで集計する項目
+REPORT_COUNTS_FIELD = "report_counts"
+DEFAULT_FIELDS = ("id", "user_id", "username", "text", "is_edited", "created_at")
+
+
+async def get_api_reader(
+    token: Optional[str] = Depends(oauth2_scheme),
+    db: Session = Depends(get_read_db)
+) -> User:
+    """読み取り系エンドポイントのユーザー（認証も読み取り用セッションで行う）"""
+    token_data = decode_token(token) if token else None
+    user = get_active_user(db, token_data) if token_data else None
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="認証情報が無効です",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """カンマ区切りの fields を検証する（省略時は DEFAULT_FIELDS）"""
+    if not fields:
+        return DEFAULT_FIELDS
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in FIELD_COLUMNS and name != REPORT_COUNTS_FIELD]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f"不正な fields です: {','.join(unknown)}")
+    return names
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(row) -> str:
+    """(created_at, id) をクエリ文字列にそのまま載せられる不透明な文字列にする（"UNIXマイクロ秒:id" の base64url）"""
+    micros = (row["created_at"] - _EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(f"{micros}:{row['id']}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        micros, message_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return _EPOCH + timedelta(microseconds=int(micros)), int(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="不正なカーソルです")
+
+
+def history_select(fields: Tuple[str, ...]):
+    """指定された列だけを読む SELECT（カーソル用に id・created_at は常に読む）"""
+    names = [name for name in FIELD_COLUMNS if name in fields or name in ("id", "created_at")]
+    stmt = select(*[FIELD_COLUMNS[name].label(name) for name in names]).where(Message.is_hidden.is_(False))
+    if "username" in fields:
+        stmt = stmt.join(User, Message.user_id == User.id)
+    return stmt.order_by(Message.created_at.desc(), Message.id.desc())
+
+
+def attach_report_counts(db: Session, rows: List[dict]) -> None:
+    """rows に report_counts を付ける（ページ全体で1回の集計クエリ）"""
+    for row in rows:
+        row[REPORT_COUNTS_FIELD] = {}
+    if not rows:
+        return
+    by_id = {row["id"]: row for row in rows}
+    counts = (
+        db.query(MessageReport.message_id, MessageReport.label, func.count(MessageReport.id))
+        .filter(
+            MessageReport.message_id.in_(by_id),
+            # 通報はメッセージの投稿月で分割されているため、期間で絞ってパーティションを限定する
+            MessageReport.message_created_at.between(
+                min(row["created_at"] for row in rows),
+                max(row["created_at"] for row in rows),
+            ),
+        )
+        .group_by(MessageReport.message_id, MessageReport.label)
+    )
+    for message_id, label, count in counts:
+        by_id[message_id][REPORT_COUNTS_FIELD][label] = count
+
+
+def build_page(rows: List[dict], fields: Tuple[str, ...], limit: int) -> dict:
+    """limit + 1 件読んだ rows から1ページ分の応答を作る"""
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {
+        "messages": [{name: row[name] for name in fields} for row in rows[:limit]],
+        "next_cursor": next_cursor,
+    }
+
+
+def message_body(message: Message, user: User) -> MessageWithUser:
+    return MessageWithUser(
+        id=message.id,
+        channel_id=message.channel_id,
+        user_id=message.user_id,
+        username=user.username,
+        text=message.text,
+        is_edited=bool(message.is_edited),
+        created_at=message.created_at,
+        updated_at=message.updated_at,
+    )
+
+
+@router.get("/channels/tails")
+async def channel_tails(
+    ids: str = Query(..., description="カンマ区切りのチャンネルID"),
+    limit: int = Query(settings.API_PAGE_SIZE, ge=1),
+    fields: Optional[str] = None,
+    user: User = Depends(get_api_reader),
+    db: Session = Depends(get_read_db)
+):
+    """複数チャンネルの最新メッセージを1往復で返す
+
+    LATERAL 副問い合わせでチャンネルごとに (channel_id, created_at) 索引の先頭だけを読む。
+    LATERAL の無い SQLite ではチャンネルごとに同じ SELECT を実行する（同じプロセス内なので往復の費用は小さい）。
+    各チャンネルの next_cursor は /channels/{channel_id}/messages にそのまま渡せる。
+    """
+    try:
+        channel_ids = list(dict.fromkeys(int(value) for value in ids.split(",") if value.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="不正なチャンネルIDです")
+    if not channel_ids or len(channel_ids) > settings.API_TAILS_MAX_CHANNELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"チャンネルは1〜{settings.API_TAILS_MAX_CHANNELS}件で指定してください",
+        )
+    names = parse_fields(fields)
+    limit = min(limit, settings.API_PAGE_SIZE_MAX)
+
+    channels = select(Channel.id.label("channel_id")).where(
+        Channel.id.in_(channel_ids), Channel.workspace_id == user.workspace_id
+    )
+    grouped = defaultdict(list)
+    if db.get_bind().dialect.name == "sqlite":
+        for channel_id in db.scalars(channels).all():
+            stmt = history_select(names).where(Message.channel_id == channel_id).limit(limit + 1)
+            for row in db.execute(stmt).mappings():
+                grouped[channel_id].append(dict(row))
+    else:
+        channels = channels.subquery("c")
+        tail = (
+            history_select(names)
+            .where(Message.channel_id == channels.c.channel_id)
+            .limit(limit + 1)
+            .lateral("tail")
+        )
+        stmt = select(channels.c.channel_id.label("tail_channel_id"), tail).select_from(channels.join(tail, true()))
+        for row in db.execute(stmt).mappings():
+            grouped[row["tail_channel_id"]].append(dict(row))
+    if REPORT_COUNTS_FIELD in names:
+        attach_report_counts(db, [row for rows in grouped.values() for row in rows[:limit]])
+
+    return ORJSONResponse({
+        "channels": {
+            str(channel_id): build_page(grouped[channel_id], names, limit)
+            for channel_id in channel_ids
+            if channel_id in grouped
+        },
+    })
+
+
+@router.get("/channels/{channel_id}/messages")
+async def channel_history(
+    channel_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.API_PAGE_SIZE, ge=1),
+    fields: Optional[str] = None,
+    user: User = Depends(get_api_reader),
+    db: Session = Depends(get_read_db)
+):
+    """チャンネルの履歴（新しい順、cursor より古いものをキーセットで1ページ）"""
+    names = parse_fields(fields)
+    limit = min(limit, settings.API_PAGE_SIZE_MAX)
+    get_workspace_channel(db, channel_id, user)
+
+    stmt = history_select(names).where(Message.channel_id == channel_id)
+    if cursor:
+        stmt = stmt.where(tuple_(Message.created_at, Message.id) < tuple_(*decode_cursor(cursor)))
+    rows = [dict(row) for row in db.execute(stmt.limit(limit + 1)).mappings()]
+    if REPORT_COUNTS_FIELD in names:
+        attach_report_counts(db, rows[:limit])
+
+    return ORJSONResponse(build_page(rows, names, limit))
+
+
+@router.post(
+    "/channels/{channel_id}/messages",
+    response_model=MessageWithUser,
+    status_code=status.HTTP_201_CREATED,
+)
+async def api_create_message(
+    channel_id: int,
+    body: MessageCreate,
+    response: Response,
+    user: User = Depends(get_current_user_required),
+    db: Session = Depends(get_db)
+):
+    """メッセージ投稿"""
+    message = await post_message(db, channel_id, user, body.text)
+    mark_recent_write(response)
+    return message_body(message, user)
+
+
+@router.patch("/channels/{channel_id}/messages/{message_id}", response_model=MessageWithUser)
+async def api_update_message(
+    channel_id: int,
+    message_id: int,
+    body: MessageUpdate,
+    response: Response,
+    user: User = Depends(get_current_user_required),
+    db: Session = Depends(get_db),
+    created_at: Optional[datetime] = None
+):
+    """メッセージ編集（本人のみ）"""
+    message = await edit_message(db, channel_id, message_id, user, body.text, created_at)
+    mark_recent_write(response)
+    return message_body(message, user)
+
+
+@router.delete("/channels/{channel_id}/messages/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def api_delete_message(
+    channel_id: int,
+    message_id: int,
+    user: User = Depends(get_current_user_required),
+    db: Session = Depends(get_db),
+    created_at: Optional[datetime] = None
+):
+    """メッセージ削除（本人または管理者）"""
+    await remove_message(db, channel_id, message_id, user, created_at)
+    return mark_recent_write(Response(status_code=status.HTTP_204_NO_CONTENT))
+
+
+@router.get("/messages/{message_id}/reports", response_model=MessageReportSummary)
+async def api_report_summary(
+    message_id: int,
+    user: User = Depends(get_api_reader),
+    db: Session = Depends(get_read_db),
+    created_at: Optional[datetime] = None
+):
+    """メッセージのラベル別通報数"""
+    message = find_workspace_message(db, message_id, user.workspace_id, created_at=created_at)
+    if not message or message.is_hidden:
+        raise HTTPException(status_code=404, detail="メッセージが見つかりません")
+
+    return {"message_id": message_id, "counts": count_reports(db, message)}
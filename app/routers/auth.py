@@ -1,31 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from app.database import get_db
+from typing import Optional
+from app.database import get_catalog_db, get_db, mark_recent_write
 from app.models.user import User
 from app.schemas.user import UserCreate, UserResponse, Token
 from app.services.auth import (
     get_password_hash,
     verify_password,
     create_access_token,
+    decode_token,
+    oauth2_scheme,
 )
+from app.services.token_revocation import revoke_token
+from app.services.mentions import username_cache
+from app.services.workspaces import request_workspace_id
 
 router = APIRouter(prefix="/auth", tags=["認証"])
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    """ユーザー登録"""
-    # メールアドレスの重複チェック
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+async def register(request: Request, user_data: UserCreate, db: Session = Depends(get_db)):
+    """ユーザー登録（X-Workspace ヘッダー等で指定したワークスペースに登録）"""
+    workspace_id = request_workspace_id(request)
+    # メールアドレスの重複チェック（ワークスペース内）
+    existing_user = db.query(User).filter(User.workspace_id == workspace_id, User.email == user_data.email).first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="このメールアドレスは既に登録されています"
         )
     
-    # ユーザー名の重複チェック
-    existing_username = db.query(User).filter(User.username == user_data.username).first()
+    # ユーザー名の重複チェック（ワークスペース内）
+    existing_username = db.query(User).filter(
+        User.workspace_id == workspace_id, User.username == user_data.username
+    ).first()
     if existing_username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -35,6 +44,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     # 新規ユーザー作成
     hashed_password = get_password_hash(user_data.password)
     new_user = User(
+        workspace_id=workspace_id,
         email=user_data.email,
         username=user_data.username,
         hashed_password=hashed_password,
@@ -42,19 +52,24 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    username_cache.add(new_user)
     
     return new_user
 
 
 @router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """ログイン（JWTトークン発行）"""
-    # ユーザー検索（usernameフィールドにemailを使用）
-    user = db.query(User).filter(User.email == form_data.username).first()
+    # ユーザー検索（usernameフィールドにemailを使用、メールアドレスはワークスペース内で一意）
+    user = db.query(User).filter(
+        User.workspace_id == request_workspace_id(request),
+        User.email == form_data.username,
+    ).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -77,10 +92,9 @@ async def login(
             detail="このアカウントは無効化されています"
         )
     
-    # トークン生成
-    # トークン生成
+    # トークン生成（ws は以降のリクエストをワークスペースのシャードへ振り分けるのに使う）
     access_token = create_access_token(
-        data={"sub": str(user.id), "email": user.email}
+        data={"sub": str(user.id), "email": user.email, "ws": user.workspace_id}
     )
     
     # Cookieにトークンをセット
@@ -93,5 +107,29 @@ async def login(
         samesite="lax",
         secure=False,  # ローカル開発環境（HTTPSでない）場合はFalse
     )
+    # 登録直後のユーザーがレプリカ遅延で見つからないことを防ぐ
+    mark_recent_write(response)
     
     return Token(access_token=access_token, token_type="bearer")
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    request: Request,
+    token: Optional[str] = Depends(oauth2_scheme),
+    db: Session = Depends(get_catalog_db)
+):
+    """ログアウト（使用中のトークンを失効させ、Cookieを削除）
+
+    失効リストはワークスペースのシャードに関係なく default シャードに書き込む。
+    """
+    # Authorization ヘッダーが無ければCookieのトークンを失効させる
+    token = token or request.cookies.get("access_token")
+    token_data = decode_token(token) if token else None
+    if token_data and token_data.jti:
+        revoke_token(db, token_data.jti, token_data.user_id, token_data.expires_at)
+        db.commit()
+    
+    response = Response(status_code=status.HTTP_204_NO_CONTENT)
+    response.delete_cookie(key="access_token", httponly=True, samesite="lax")
+    return response
@@ -1,26 +1,29 @@
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, Response
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from pathlib import Path
 from typing import Optional
-from app.database import get_db
+from app.config import get_settings
+from app.database import get_db, get_read_db, mark_recent_write
 from app.models.channel import Channel
+from app.models.channel_read_state import ChannelReadState
 from app.models.user import User
 from app.schemas.channel import ChannelCreate, ChannelResponse
+from app.templating import TEMPLATES_VERSION, templates
+from app.services.http_cache import cache_headers, is_not_modified
 from app.services.auth import get_current_user_required
+from app.services.read_markers import get_read_state, mark_channel_read
 from app.routers.messages import get_messages_with_reports
 
-router = APIRouter(prefix="/channels", tags=["チャンネル"])
+settings = get_settings()
 
-# テンプレート設定
-BASE_DIR = Path(__file__).resolve().parent.parent
-templates = Jinja2Templates(directory=BASE_DIR / "templates")
+router = APIRouter(prefix="/channels", tags=["チャンネル"])
 
 
 def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)) -> Optional[User]:
     """Cookieからトークンを取得してユーザーを返す"""
-    from app.services.auth import decode_token
+    from app.services.auth import decode_token, get_active_user
     token = request.cookies.get("access_token")
     if not token:
         return None
@@ -30,7 +33,7 @@ def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)
     token_data = decode_token(token)
     if not token_data:
         return None
-    return db.query(User).filter(User.id == token_data.user_id).first()
+    return get_active_user(db, token_data)
 
 
 def require_login(request: Request, db: Session = Depends(get_db)) -> User:
@@ -44,23 +47,80 @@ def require_login(request: Request, db: Session = Depends(get_db)) -> User:
     return user
 
 
+def encode_channel_cursor(channel: Channel) -> str:
+    return f"{channel.last_message_at.isoformat()}_{channel.id}"
+
+
+def decode_channel_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        last_message_at, channel_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(last_message_at), int(channel_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="不正なカーソルです")
+
+
+def list_channels(db: Session, user: User, q: str = "", cursor: Optional[str] = None):
+    """最終投稿の新しい順に1ページ分のチャンネルと未読数を1クエリで取得
+
+    (last_message_at, id) のキーセットでページングし、q はチャンネル名の前方一致で絞り込む。
+    """
+    query = (
+        db.query(Channel, ChannelReadState.unread_count)
+        .outerjoin(
+            ChannelReadState,
+            (ChannelReadState.channel_id == Channel.id) & (ChannelReadState.user_id == user.id),
+        )
+        .filter(Channel.workspace_id == user.workspace_id)
+    )
+    if q:
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(Channel.name.like(f"{escaped}%", escape="\\"))
+    if cursor:
+        query = query.filter(
+            tuple_(Channel.last_message_at, Channel.id) < tuple_(*decode_channel_cursor(cursor))
+        )
+    rows = (
+        query
+        .order_by(Channel.last_message_at.desc(), Channel.id.desc())
+        .limit(settings.CHANNEL_PAGE_SIZE + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(rows) > settings.CHANNEL_PAGE_SIZE:
+        rows = rows[:settings.CHANNEL_PAGE_SIZE]
+        next_cursor = encode_channel_cursor(rows[-1][0])
+    channels = [channel for channel, _ in rows]
+    unread_counts = {channel.id: unread for channel, unread in rows if unread}
+    return channels, unread_counts, next_cursor
+
+
 @router.get("", response_class=HTMLResponse)
 async def channels_list(
     request: Request,
-    db: Session = Depends(get_db)
+    q: str = "",
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    """チャンネル一覧ページ"""
+    """チャンネル一覧ページ（HTMXからの検索・続きの読み込みには部分テンプレートを返す）"""
     user = get_current_user_from_cookie(request, db)
     if not user:
         from fastapi.responses import RedirectResponse
         return RedirectResponse(url="/auth/login", status_code=303)
     
-    channels = db.query(Channel).order_by(Channel.created_at.desc()).all()
+    channels, unread_counts, next_cursor = list_channels(db, user, q, cursor)
+    context = {
+        "request": request,
+        "channels": channels,
+        "unread_counts": unread_counts,
+        "next_cursor": next_cursor,
+        "q": q,
+    }
+    if request.headers.get("HX-Request"):
+        return templates.TemplateResponse("partials/channel_list.html", context)
     return templates.TemplateResponse(
         "channels/list.html",
         {
-            "request": request,
-            "channels": channels,
+            **context,
             "user": user,
             "title": "チャンネル一覧",
         }
@@ -80,18 +140,21 @@ async def create_channel(
         raise HTTPException(status_code=401, detail="ログインが必要です")
     
     # 重複チェック
-    existing = db.query(Channel).filter(Channel.name == name).first()
+    existing = db.query(Channel).filter(Channel.workspace_id == user.workspace_id, Channel.name == name).first()
     if existing:
         return templates.TemplateResponse(
             "partials/channel_error.html",
             {
                 "request": request,
                 "error": "このチャンネル名は既に使用されています",
-            }
+            },
+            # 一覧ではなくモーダル内のエラー欄に表示する
+            headers={"HX-Retarget": "#channel-error-container", "HX-Reswap": "innerHTML"},
         )
     
     # 新規チャンネル作成
     new_channel = Channel(
+        workspace_id=user.workspace_id,
         name=name,
         description=description,
         created_by=user.id,
@@ -100,22 +163,23 @@ async def create_channel(
     db.commit()
     db.refresh(new_channel)
     
-    # チャンネル一覧の部分テンプレートを返す
-    channels = db.query(Channel).order_by(Channel.created_at.desc()).all()
-    return templates.TemplateResponse(
-        "partials/channel_list.html",
+    # 一覧全体は再描画せず、作成したチャンネルの行だけを返して先頭に追加する
+    return mark_recent_write(templates.TemplateResponse(
+        "partials/channel_item.html",
         {
             "request": request,
-            "channels": channels,
+            "channel": new_channel,
+            "unread_counts": {},
         }
-    )
+    ))
 
 
 @router.get("/{channel_id}", response_class=HTMLResponse)
 async def channel_detail(
     request: Request,
     channel_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    write_db: Session = Depends(get_db)
 ):
     """チャンネル詳細（メッセージ一覧）ページ"""
     user = get_current_user_from_cookie(request, db)
@@ -123,12 +187,25 @@ async def channel_detail(
         from fastapi.responses import RedirectResponse
         return RedirectResponse(url="/auth/login", status_code=303)
     
-    channel = db.query(Channel).filter(Channel.id == channel_id).first()
+    channel = db.query(Channel).filter(Channel.id == channel_id, Channel.workspace_id == user.workspace_id).first()
     if not channel:
         raise HTTPException(status_code=404, detail="チャンネルが見つかりません")
     
+    # 画面の内容はチャンネルの変更番号と閲覧ユーザーで決まるため、変わっていなければ履歴を読まずに返す
+    etag = f'W/"{channel.id}-{channel.change_seq}-{user.id}-{TEMPLATES_VERSION}"'
+    headers = cache_headers(etag, channel.changed_at)
+    if is_not_modified(request, etag, channel.changed_at):
+        return Response(status_code=304, headers=headers)
+    
     message_list = get_messages_with_reports(db, channel_id, user)
     
+    # 表示した最新メッセージまでを既読にする（既に既読なら書き込まない）
+    latest_id = message_list[-1]["id"] if message_list else 0
+    state = get_read_state(db, user.id, channel_id)
+    if state is None or state.last_read_message_id < latest_id or state.unread_count:
+        mark_channel_read(write_db, user.id, channel_id, latest_id)
+        write_db.commit()
+    
     return templates.TemplateResponse(
         "channels/detail.html",
         {
@@ -137,5 +214,6 @@ async def channel_detail(
             "messages": message_list,
             "user": user,
             "title": f"#{channel.name}",
-        }
+        },
+        headers=headers,
     )
@@ -0,0 +1,93 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.config import get_settings
+from app.database import get_read_db
+from app.models.channel import Channel
+from app.models.message import Message
+from app.models.message_mention import MessageMention
+from app.models.user import User
+from app.schemas.message import MentionFeed, MentionItem
+from app.routers.messages import get_current_user_from_cookie
+
+settings = get_settings()
+
+router = APIRouter(prefix="/mentions", tags=["メンション"])
+
+
+def encode_mention_cursor(mention: MessageMention) -> str:
+    return f"{mention.message_created_at.isoformat()}_{mention.message_id}"
+
+
+def decode_mention_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, message_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="不正なカーソルです")
+
+
+@router.get("", response_model=MentionFeed)
+async def mentions_feed(
+    request: Request,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """自分宛てのメンション（新しい順）
+
+    message_mentions の主キー索引 (mentioned_user_id, message_created_at, message_id) を
+    キーセットで範囲スキャンし、1ページ分のメッセージだけを結合する。
+    """
+    user = get_current_user_from_cookie(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="ログインが必要です")
+    
+    query = db.query(MessageMention).filter(MessageMention.mentioned_user_id == user.id)
+    if cursor:
+        query = query.filter(
+            tuple_(MessageMention.message_created_at, MessageMention.message_id)
+            < tuple_(*decode_mention_cursor(cursor))
+        )
+    mentions = (
+        query
+        .order_by(MessageMention.message_created_at.desc(), MessageMention.message_id.desc())
+        .limit(settings.MENTION_PAGE_SIZE + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(mentions) > settings.MENTION_PAGE_SIZE:
+        mentions = mentions[:settings.MENTION_PAGE_SIZE]
+        next_cursor = encode_mention_cursor(mentions[-1])
+    
+    items = []
+    if mentions:
+        rows = (
+            db.query(Message, User.username, Channel.name)
+            .join(User, Message.user_id == User.id)
+            .join(Channel, Message.channel_id == Channel.id)
+            .filter(
+                tuple_(Message.id, Message.created_at).in_(
+                    [(m.message_id, m.message_created_at) for m in mentions]
+                ),
+                Message.is_hidden.is_(False),
+            )
+            .all()
+        )
+        by_id = {msg.id: (msg, username, channel_name) for msg, username, channel_name in rows}
+        for mention in mentions:
+            if mention.message_id not in by_id:
+                continue
+            msg, username, channel_name = by_id[mention.message_id]
+            items.append(MentionItem(
+                message_id=msg.id,
+                channel_id=msg.channel_id,
+                channel_name=channel_name,
+                author_user_id=msg.user_id,
+                username=username,
+                text=msg.text,
+                created_at=msg.created_at,
+            ))
+    
+    return MentionFeed(items=items, next_cursor=next_cursor)
@@ -1,27 +1,35 @@
 from collections import defaultdict
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, StreamingResponse
 from sqlalchemy import func
 from sqlalchemy.orm import Session
-from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
+import asyncio
 import json
 from datetime import datetime
-from app.database import get_db
+from app.config import get_settings
+from app.database import get_db, get_read_db, mark_recent_write
 from app.models.message import Message
 from app.models.channel import Channel
 from app.models.user import User
 from app.models.message_report import MessageReport
 from app.schemas.message import MessageCreate, MessageUpdate, MessageReportSummary
-from app.services.auth import decode_token
-from app.services.websocket_manager import manager
+from app.templating import templates
+from app.services import channel_stats, report_rollups
+from app.services.auth import decode_token, get_active_user
+from app.services.mentions import record_mentions
+from app.services.rate_limit import check_write_rate
+from app.services.revisions import lock_message, record_revision
+from app.services.read_markers import mark_channel_read, on_message_created, on_message_deleted
+from app.services.admission import CLOSE_CODE_TRY_AGAIN_LATER, admission
+from app.services.channel_feed import channel_feeds
+from app.services.presence import presence
+from app.services.websocket_manager import CLOSE_CODE_IDLE_TIMEOUT, CLOSE_CODE_SERVICE_RESTART, Connection, manager
+from app.services.workspaces import request_workspace_id, resolve_shard, shard_map
 
-router = APIRouter(tags=["メッセージ"])
+settings = get_settings()
 
-# テンプレート設定
-BASE_DIR = Path(__file__).resolve().parent.parent
-templates = Jinja2Templates(directory=BASE_DIR / "templates")
+router = APIRouter(tags=["メッセージ"])
 
 ALLOWED_REPORT_LABELS = {"uncomfortable", "harassment_suspected"}
 
@@ -36,30 +44,71 @@ def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)
     token_data = decode_token(token)
     if not token_data:
         return None
-    return db.query(User).filter(User.id == token_data.user_id).first()
+    return get_active_user(db, token_data)
+
+
+def get_workspace_channel(db: Session, channel_id: int, user: User) -> Channel:
+    """ユーザーのワークスペースのチャンネル（他のワークスペースのチャンネルは存在しない扱い）"""
+    channel = db.query(Channel).filter(Channel.id == channel_id, Channel.workspace_id == user.workspace_id).first()
+    if not channel:
+        raise HTTPException(status_code=404, detail="チャンネルが見つかりません")
+    return channel
+
+
+def find_workspace_message(
+    db: Session,
+    message_id: int,
+    workspace_id: int,
+    channel_id: Optional[int] = None,
+    created_at: Optional[datetime] = None,
+):
+    """ワークスペース内のメッセージ（channel_id を指定するとそのチャンネルに限る）
+
+    created_at（履歴に表示した投稿日時）が分かっていれば渡す。投稿月のパーティションだけを読む。
+    """
+    query = (
+        db.query(Message)
+        .join(Channel, Message.channel_id == Channel.id)
+        .filter(Message.id == message_id, Channel.workspace_id == workspace_id)
+    )
+    if channel_id is not None:
+        query = query.filter(Message.channel_id == channel_id)
+    if created_at is not None:
+        query = query.filter(Message.created_at == created_at)
+    return query.first()
 
 
 def get_messages_with_reports(db: Session, channel_id: int, current_user: Optional[User]):
     """メッセージ一覧に通報情報を付与して返す"""
+    # 新しい順に上限件数だけ取得する（直近の月パーティションだけを読む）
     messages = (
         db.query(Message, User)
         .join(User, Message.user_id == User.id)
-        .filter(Message.channel_id == channel_id)
-        .order_by(Message.created_at.asc())
+        .filter(Message.channel_id == channel_id, Message.is_hidden.is_(False))
+        .order_by(Message.created_at.desc())
+        .limit(settings.MESSAGE_HISTORY_LIMIT)
         .all()
     )
+    messages.reverse()
     message_ids = [msg.id for msg, _ in messages]
     report_counts = defaultdict(dict)
     user_report_map = {}
 
     if message_ids:
+        # 通報はメッセージの投稿月で分割されているため、期間で絞ってパーティションを限定する
+        in_range = (
+            MessageReport.message_id.in_(message_ids),
+            MessageReport.message_created_at.between(
+                messages[0][0].created_at, messages[-1][0].created_at
+            ),
+        )
         counts = (
             db.query(
                 MessageReport.message_id,
                 MessageReport.label,
                 func.count(MessageReport.id).label("count"),
             )
-            .filter(MessageReport.message_id.in_(message_ids))
+            .filter(*in_range)
             .group_by(MessageReport.message_id, MessageReport.label)
             .all()
         )
@@ -70,7 +119,7 @@ def get_messages_with_reports(db: Session, channel_id: int, current_user: Option
             user_reports = (
                 db.query(MessageReport.message_id, MessageReport.label)
                 .filter(
-                    MessageReport.message_id.in_(message_ids),
+                    *in_range,
                     MessageReport.reporter_user_id == current_user.id,
                 )
                 .all()
@@ -108,22 +157,26 @@ def render_messages_partial(request: Request, db: Session, channel_id: int, user
     )
 
 
-@router.post("/channels/{channel_id}/messages", response_class=HTMLResponse)
-async def create_message(
-    request: Request,
-    channel_id: int,
-    text: str = Form(...),
-    db: Session = Depends(get_db)
-):
-    """メッセージ投稿（HTMX対応）"""
-    user = get_current_user_from_cookie(request, db)
-    if not user:
-        raise HTTPException(status_code=401, detail="ログインが必要です")
-    
-    # チャンネル存在確認
-    channel = db.query(Channel).filter(Channel.id == channel_id).first()
-    if not channel:
-        raise HTTPException(status_code=404, detail="チャンネルが見つかりません")
+async def notify_mentions(user_ids, channel_id: int, message: Message, author: User):
+    """メンションされたユーザーの接続にだけ通知（購読中のチャンネルかどうかに関係なく届く）"""
+    for user_id in user_ids:
+        await manager.send_to_user(user_id, {
+            "type": "mention",
+            "channel_id": channel_id,
+            "message": {
+                "id": message.id,
+                "text": message.text,
+                "user_id": author.id,
+                "username": author.username,
+            },
+        })
+
+
+async def post_message(db: Session, channel_id: int, user: User, text: str) -> Message:
+    """メッセージを投稿して配信（HTMLとJSON APIで共通）"""
+    # チャンネル存在確認（存在しないチャンネルへの投稿では流量制限のトークンを使わない）
+    get_workspace_channel(db, channel_id, user)
+    await check_write_rate(user.id, channel_id)
     
     # メッセージ作成
     new_message = Message(
@@ -132,8 +185,13 @@ async def create_message(
         text=text,
     )
     db.add(new_message)
+    db.flush()
+    on_message_created(db, channel_id, new_message.id, user.id)
+    channel_stats.on_message_created(db, channel_id)
+    mentioned_user_ids = record_mentions(db, new_message, user.workspace_id)
     db.commit()
     db.refresh(new_message)
+    presence.stop_typing(channel_id, user.id)
     
     # WebSocketで新規メッセージを配信
     await manager.broadcast_to_channel(channel_id, {
@@ -147,36 +205,33 @@ async def create_message(
             "created_at": new_message.created_at.isoformat() if new_message.created_at else None,
         }
     })
-    
-    return render_messages_partial(request, db, channel_id, user)
+    await notify_mentions(mentioned_user_ids, channel_id, new_message, user)
+    return new_message
 
 
-@router.put("/channels/{channel_id}/messages/{message_id}", response_class=HTMLResponse)
-async def update_message(
-    request: Request,
-    channel_id: int,
-    message_id: int,
-    text: str = Form(...),
-    db: Session = Depends(get_db)
-):
-    """メッセージ編集"""
-    user = get_current_user_from_cookie(request, db)
-    if not user:
-        raise HTTPException(status_code=401, detail="ログインが必要です")
+async def edit_message(
+    db: Session, channel_id: int, message_id: int, user: User, text: str, created_at: Optional[datetime] = None
+) -> Message:
+    """メッセージを編集して配信（HTMLとJSON APIで共通）"""
+    message = find_workspace_message(db, message_id, user.workspace_id, channel_id, created_at)
     
-    message = db.query(Message).filter(
-        Message.id == message_id,
-        Message.channel_id == channel_id
-    ).first()
-    
-    if not message:
+    # 非表示にされたメッセージは履歴と同じく存在しない扱い（本文・メンションを配信し直さない）
+    if not message or message.is_hidden:
         raise HTTPException(status_code=404, detail="メッセージが見つかりません")
     
     if message.user_id != user.id:
         raise HTTPException(status_code=403, detail="編集権限がありません")
     
+    await check_write_rate(user.id, channel_id)
+    
+    # 書き換え前の本文を履歴に残す（messages には何も足さない）
+    lock_message(db, message)
+    if text != message.text:
+        record_revision(db, message, message.text, text, user.id)
     message.text = text
     message.is_edited = True
+    mentioned_user_ids = record_mentions(db, message, user.workspace_id, edited=True)
+    channel_stats.on_channel_changed(db, channel_id)
     db.commit()
     db.refresh(message)
     
@@ -189,26 +244,15 @@ async def update_message(
             "is_edited": True,
         }
     })
-    
-    return render_messages_partial(request, db, channel_id, user)
+    await notify_mentions(mentioned_user_ids, channel_id, message, user)
+    return message
 
 
-@router.delete("/channels/{channel_id}/messages/{message_id}", response_class=HTMLResponse)
-async def delete_message(
-    request: Request,
-    channel_id: int,
-    message_id: int,
-    db: Session = Depends(get_db)
-):
-    """メッセージ削除"""
-    user = get_current_user_from_cookie(request, db)
-    if not user:
-        raise HTTPException(status_code=401, detail="ログインが必要です")
-    
-    message = db.query(Message).filter(
-        Message.id == message_id,
-        Message.channel_id == channel_id
-    ).first()
+async def remove_message(
+    db: Session, channel_id: int, message_id: int, user: User, created_at: Optional[datetime] = None
+) -> None:
+    """メッセージを削除して配信（HTMLとJSON APIで共通）"""
+    message = find_workspace_message(db, message_id, user.workspace_id, channel_id, created_at)
     
     if not message:
         raise HTTPException(status_code=404, detail="メッセージが見つかりません")
@@ -217,6 +261,10 @@ async def delete_message(
         raise HTTPException(status_code=403, detail="削除権限がありません")
     
     db.delete(message)
+    # 非表示済みのメッセージは非表示にした時点で集計から外している
+    if not message.is_hidden:
+        on_message_deleted(db, channel_id, message_id)
+        channel_stats.on_messages_deleted(db, channel_id)
     db.commit()
     
     # WebSocketで削除を配信
@@ -224,8 +272,57 @@ async def delete_message(
         "type": "delete_message",
         "message_id": message_id,
     })
+
+
+@router.post("/channels/{channel_id}/messages", response_class=HTMLResponse)
+async def create_message(
+    request: Request,
+    channel_id: int,
+    text: str = Form(...),
+    db: Session = Depends(get_db)
+):
+    """メッセージ投稿（HTMX対応）"""
+    user = get_current_user_from_cookie(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="ログインが必要です")
+    
+    await post_message(db, channel_id, user, text)
+    return mark_recent_write(render_messages_partial(request, db, channel_id, user))
+
+
+@router.put("/channels/{channel_id}/messages/{message_id}", response_class=HTMLResponse)
+async def update_message(
+    request: Request,
+    channel_id: int,
+    message_id: int,
+    text: str = Form(...),
+    db: Session = Depends(get_db),
+    created_at: Optional[datetime] = None
+):
+    """メッセージ編集"""
+    user = get_current_user_from_cookie(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="ログインが必要です")
+    
+    await edit_message(db, channel_id, message_id, user, text, created_at)
+    return mark_recent_write(render_messages_partial(request, db, channel_id, user))
+
+
+@router.delete("/channels/{channel_id}/messages/{message_id}", response_class=HTMLResponse)
+async def delete_message(
+    request: Request,
+    channel_id: int,
+    message_id: int,
+    db: Session = Depends(get_db),
+    created_at: Optional[datetime] = None
+):
+    """メッセージ削除"""
+    user = get_current_user_from_cookie(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="ログインが必要です")
     
-    return render_messages_partial(request, db, channel_id, user)
+    await remove_message(db, channel_id, message_id, user, created_at)
+    return mark_recent_write(render_messages_partial(request, db, channel_id, user))
 
 
 @router.post("/messages/{message_id}/report", response_class=HTMLResponse)
@@ -233,7 +330,8 @@ async def report_message(
     request: Request,
     message_id: int,
     label: str = Form(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    created_at: Optional[datetime] = None
 ):
     """メッセージ通報（HTMX対応）"""
     user = get_current_user_from_cookie(request, db)
@@ -243,14 +341,18 @@ async def report_message(
     if label not in ALLOWED_REPORT_LABELS:
         raise HTTPException(status_code=400, detail="不正なラベルです")
     
-    message = db.query(Message).filter(Message.id == message_id).first()
-    if not message:
+    message = find_workspace_message(db, message_id, user.workspace_id, created_at=created_at)
+    # 非表示にされたメッセージへの通報は集計に加えない
+    if not message or message.is_hidden:
         raise HTTPException(status_code=404, detail="メッセージが見つかりません")
     
+    await check_write_rate(user.id)
+    
     existing = (
         db.query(MessageReport)
         .filter(
             MessageReport.message_id == message_id,
+            MessageReport.message_created_at == message.created_at,
             MessageReport.reporter_user_id == user.id,
         )
         .first()
@@ -258,71 +360,218 @@ async def report_message(
     if not existing:
         report = MessageReport(
             message_id=message_id,
+            message_created_at=message.created_at,
             reporter_user_id=user.id,
             label=label,
         )
         db.add(report)
+        report_rollups.on_report_created(db, user.workspace_id, message.channel_id, message_id, message.user_id)
+        channel_stats.on_channel_changed(db, message.channel_id)
         db.commit()
     
-    return render_messages_partial(request, db, message.channel_id, user)
+    return mark_recent_write(render_messages_partial(request, db, message.channel_id, user))
 
 
-@router.get("/messages/{message_id}/report_summary", response_model=MessageReportSummary)
-async def report_summary(
-    message_id: int,
-    db: Session = Depends(get_db)
-):
-    """メッセージ通報の集計を返す"""
-    message = db.query(Message).filter(Message.id == message_id).first()
-    if not message:
-        raise HTTPException(status_code=404, detail="メッセージが見つかりません")
-    
+def count_reports(db: Session, message: Message) -> Dict[str, int]:
+    """メッセージのラベル別通報数（通報のないラベルは0）"""
     counts = {label: 0 for label in ALLOWED_REPORT_LABELS}
     rows = (
         db.query(
             MessageReport.label,
             func.count(MessageReport.id).label("count"),
         )
-        .filter(MessageReport.message_id == message_id)
+        .filter(
+            MessageReport.message_id == message.id,
+            MessageReport.message_created_at == message.created_at,
+        )
         .group_by(MessageReport.label)
         .all()
     )
     for row in rows:
         counts[row.label] = row.count
+    return counts
+
+
+@router.get("/messages/{message_id}/report_summary", response_model=MessageReportSummary)
+async def report_summary(
+    request: Request,
+    message_id: int,
+    db: Session = Depends(get_read_db),
+    created_at: Optional[datetime] = None
+):
+    """メッセージ通報の集計を返す"""
+    message = find_workspace_message(db, message_id, request_workspace_id(request), created_at=created_at)
+    if not message or message.is_hidden:
+        raise HTTPException(status_code=404, detail="メッセージが見つかりません")
     
-    return MessageReportSummary(message_id=message_id, counts=counts)
+    return MessageReportSummary(message_id=message_id, counts=count_reports(db, message))
 
 
-@router.websocket("/ws/channels/{channel_id}")
-async def websocket_endpoint(
-    websocket: WebSocket,
+@router.get("/channels/{channel_id}/events")
+async def channel_event_stream(
     channel_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: Session = Depends(get_read_db)
 ):
-    """WebSocketエンドポイント"""
-    # クエリパラメータからトークンを取得
+    """閲覧専用クライアント向けのServer-Sent Eventsストリーム
+
+    WebSocketと同じイベントを data フレームで流す。受信ループを持たないため、
+    読むだけのクライアントは1接続あたりのメモリとCPUが小さく済む。
+    """
+    user = get_current_user_from_cookie(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="ログインが必要です")
+    get_workspace_channel(db, channel_id, user)
+    # ストリーム中にDB接続を握り続けないよう、認証に使ったトランザクションを閉じる
+    db.commit()
+    
+    return StreamingResponse(
+        channel_feeds.stream(channel_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def authenticate_websocket(websocket: WebSocket, db: Session) -> Optional[User]:
+    """クエリパラメータのトークンからWebSocket接続のユーザーを取得"""
     token = websocket.query_params.get("token")
     if not token:
-        await websocket.close(code=4001)
-        return
-    
+        return None
     token_data = decode_token(token)
     if not token_data:
+        return None
+    return get_active_user(db, token_data)
+
+
+async def handle_client_event(db: Session, conn: Connection, data: str):
+    """クライアントから受信したフレームを処理"""
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return
+    if not isinstance(event, dict):
+        return
+    event_type = event.get("type")
+    channel_id = event.get("channel_id")
+    if event_type == "ack":
+        # 受信したメッセージの既読通知（チャンネル省略時は唯一の購読チャンネル）
+        message_id = event.get("message_id")
+        if channel_id is None and len(conn.channels) == 1:
+            channel_id = next(iter(conn.channels))
+        if isinstance(message_id, int) and channel_id in conn.channels:
+            mark_channel_read(db, conn.user_id, channel_id, message_id)
+            db.commit()
+    elif event_type == "pong":
+        # 最終受信時刻の更新だけでよい
+        return
+    elif event_type == "subscribe" and isinstance(channel_id, int):
+        if channel_id not in conn.channels:
+            # 他のワークスペースのチャンネルは購読させない
+            found = db.query(Channel.id).filter(
+                Channel.id == channel_id, Channel.workspace_id == conn.workspace_id
+            ).first()
+            db.commit()
+            if found is None:
+                await conn.websocket.send_json({"type": "error", "detail": "チャンネルが見つかりません"})
+                return
+        if not manager.subscribe(conn, channel_id):
+            await conn.websocket.send_json({
+                "type": "error",
+                "detail": "購読できるチャンネル数の上限に達しました",
+            })
+    elif event_type == "unsubscribe" and isinstance(channel_id, int):
+        manager.unsubscribe(conn, channel_id)
+    elif event_type == "typing" and channel_id in conn.channels:
+        # 配信は在席表示の定期送信でまとめて行う
+        presence.start_typing(channel_id, conn.user_id)
+    elif event_type == "typing_stop" and channel_id in conn.channels:
+        presence.stop_typing(channel_id, conn.user_id)
+
+
+async def receive_loop(db: Session, conn: Connection, shard: str):
+    """切断されるまでクライアントからのフレームを処理
+
+    pingへの応答を含め WS_IDLE_TIMEOUT_SECONDS の間何も届かなければ、
+    half-openとみなして切断する。
+    ワークスペースが別のシャードへ移ったら、張り直して移動先につなぎ直すよう 1012 で閉じる。
+    """
+    try:
+        while True:
+            try:
+                data = await asyncio.wait_for(
+                    conn.websocket.receive_text(),
+                    timeout=settings.WS_IDLE_TIMEOUT_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                await conn.websocket.close(code=CLOSE_CODE_IDLE_TIMEOUT)
+                break
+            conn.touch()
+            entry = shard_map.lookup(conn.workspace_id)
+            if entry is None or entry[0] != shard:
+                await conn.websocket.close(code=CLOSE_CODE_SERVICE_RESTART)
+                break
+            await handle_client_event(db, conn, data)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.remove(conn)
+
+
+async def admit_websocket(websocket: WebSocket) -> bool:
+    """ハンドシェイクの受け入れ可否を判定し、拒否する場合は待ち時間を伝えて閉じる"""
+    retry_after_ms = admission.admit()
+    if retry_after_ms is None:
+        return True
+    # ブラウザは受け入れ前に閉じた理由を読めないため、受け入れてからクローズ理由で伝える
+    await websocket.accept()
+    await websocket.close(code=CLOSE_CODE_TRY_AGAIN_LATER, reason=f"retry_after_ms={retry_after_ms}")
+    return False
+
+
+@router.websocket("/ws")
+async def multiplexed_websocket_endpoint(
+    websocket: WebSocket,
+    db: Session = Depends(get_db)
+):
+    """1本の接続で複数チャンネルを購読するWebSocketエンドポイント
+
+    クライアントは {"type": "subscribe" | "unsubscribe", "channel_id": N} で購読を切り替え、
+    サーバーからのイベントには channel_id が付く。入力中は {"type": "typing", "channel_id": N} を送る。
+    """
+    # DBで認証する前に受け入れ数を制限する
+    if not await admit_websocket(websocket):
+        return
+    user = authenticate_websocket(websocket, db)
+    if not user:
         await websocket.close(code=4001)
         return
     
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    conn = await manager.accept(websocket, user.id, user.username, user.workspace_id)
+    # 接続中にDB接続を握り続けないよう、認証に使ったトランザクションを閉じる
+    db.commit()
+    await receive_loop(db, conn, resolve_shard(websocket))
+
+
+@router.websocket("/ws/channels/{channel_id}")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    channel_id: int,
+    db: Session = Depends(get_db)
+):
+    """WebSocketエンドポイント（単一チャンネル）"""
+    if not await admit_websocket(websocket):
+        return
+    user = authenticate_websocket(websocket, db)
     if not user:
         await websocket.close(code=4001)
         return
     
-    # 接続を登録
-    await manager.connect(websocket, channel_id, user.id)
+    found = db.query(Channel.id).filter(Channel.id == channel_id, Channel.workspace_id == user.workspace_id).first()
+    db.commit()
+    if found is None:
+        await websocket.close(code=4004)
+        return
     
-    try:
-        while True:
-            # クライアントからのメッセージを待機
-            data = await websocket.receive_text()
-            # ここで受信したメッセージを処理することも可能
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, channel_id, user.id)
+    # 接続を登録
+    conn = await manager.connect(websocket, channel_id, user.id, user.username, user.workspace_id)
+    await receive_loop(db, conn, resolve_shard(websocket))
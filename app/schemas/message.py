@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, Literal, Dict
+from typing import Optional, Literal, Dict, List
 
 
 class MessageBase(BaseModel):
@@ -45,3 +45,20 @@ class MessageReportSummary(BaseModel):
     """メッセージ通報集計スキーマ"""
     message_id: int
     counts: Dict[str, int]
+
+
+class MentionItem(BaseModel):
+    """自分宛てのメンション"""
+    message_id: int
+    channel_id: int
+    channel_name: str
+    author_user_id: int
+    username: str
+    text: str
+    created_at: datetime
+
+
+class MentionFeed(BaseModel):
+    """メンション一覧の1ページ（next_cursor が None なら最後のページ）"""
+    items: List[MentionItem]
+    next_cursor: Optional[str] = None
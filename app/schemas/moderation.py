@@ -0,0 +1,69 @@
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+from typing import Optional, List, Dict, Literal
+
+
+class BulkModerationRequest(BaseModel):
+    """一括非表示・一括削除の対象条件（指定した条件はすべてANDで絞り込む）"""
+    channel_id: Optional[int] = None
+    message_ids: Optional[List[int]] = Field(default=None, max_length=10000)
+    user_id: Optional[int] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    
+    @model_validator(mode="after")
+    def check_conditions(self):
+        if not self.message_ids and self.user_id is None and self.since is None and self.until is None:
+            raise ValueError("message_ids・user_id・期間のいずれかを指定してください")
+        if (self.since is not None or self.until is not None) and self.channel_id is None:
+            raise ValueError("期間で指定する場合は channel_id も指定してください")
+        return self
+
+
+class BulkModerationResult(BaseModel):
+    """一括処理の結果"""
+    action: str
+    total: int
+    channels: Dict[int, int]
+
+
+class ReportedMessage(BaseModel):
+    """ダッシュボードの通報数上位メッセージ（削除済みなら本文などは None）"""
+    message_id: int
+    report_count: int
+    channel_id: Optional[int] = None
+    text: Optional[str] = None
+    author_user_id: Optional[int] = None
+    username: Optional[str] = None
+    is_hidden: Optional[bool] = None
+
+
+class ReportedUser(BaseModel):
+    """ダッシュボードの通報数上位ユーザー（通報されたメッセージの投稿者）"""
+    user_id: int
+    report_count: int
+    username: Optional[str] = None
+
+
+class ReportDashboard(BaseModel):
+    """通報ダッシュボード"""
+    period: Literal["1h", "24h", "7d"]
+    channel_id: Optional[int] = None
+    top_messages: List[ReportedMessage]
+    top_users: List[ReportedUser]
+
+
+class MessageVersion(BaseModel):
+    """メッセージの1つの版（edited_at はこの版が書き換えられた日時。現在の版は None）"""
+    seq: int
+    text: str
+    edited_by: Optional[int] = None
+    edited_at: Optional[datetime] = None
+
+
+class MessageHistory(BaseModel):
+    """メッセージの編集履歴（古い順）"""
+    message_id: int
+    channel_id: int
+    user_id: int
+    versions: List[MessageVersion]
@@ -40,4 +40,7 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     """トークンデータスキーマ"""
     user_id: Optional[int] = None
+    workspace_id: Optional[int] = None
     email: Optional[str] = None
+    jti: Optional[str] = None
+    expires_at: Optional[datetime] = None
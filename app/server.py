@@ -0,0 +1,62 @@
+"""アプリケーションサーバー起動スクリプト
+
+    python -m app.server
+
+SERVER_MODE=development では --reload 付きの単一プロセス、
+SERVER_MODE=production では uvloop/httptools を使い、WEB_CONCURRENCY 個のワーカーで起動する。
+WebSocket・SSE の配信と在席表示はワーカーのメモリ上にあり、ワーカー間で中継しないため既定は1ワーカー。
+"""
+import uvicorn
+from app.config import get_settings
+
+
+class DrainingServer(uvicorn.Server):
+    """シャットダウン前にWebSocketクライアントを順に切断するサーバー"""
+
+    async def shutdown(self, sockets=None) -> None:
+        # uvicornは既存接続を即座に切断するため、その前にアプリ側で通知して閉じる
+        from app.services.websocket_manager import manager
+
+        await manager.drain()
+        await super().shutdown(sockets=sockets)
+
+
+def build_config() -> uvicorn.Config:
+    """起動モードに応じたuvicorn設定を生成"""
+    settings = get_settings()
+    if not settings.is_production:
+        return uvicorn.Config(
+            "app.main:app",
+            host=settings.HOST,
+            port=settings.PORT,
+            reload=True,
+        )
+    return uvicorn.Config(
+        "app.main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=settings.WEB_CONCURRENCY,
+        loop="uvloop",
+        http="httptools",
+        access_log=settings.DEBUG,
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_TIMEOUT_SECONDS,
+    )
+
+
+def main() -> None:
+    config = build_config()
+    server = DrainingServer(config=config)
+    if config.should_reload:
+        from uvicorn.supervisors import ChangeReload
+
+        ChangeReload(config, target=server.run, sockets=[config.bind_socket()]).run()
+    elif config.workers > 1:
+        from uvicorn.supervisors import Multiprocess
+
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
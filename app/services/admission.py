@@ -0,0 +1,42 @@
+"""WebSocketハンドシェイクの受け入れ制御
+
+ローリングリスタートなどで切断されたクライアントが一斉に再接続してきても、
+ワーカーごとに一定レートまでしか受け入れず、超えた分には待ち時間（ジッター付き）を返して
+再接続のタイミングをばらけさせる。
+"""
+import random
+from typing import Optional
+from app.config import get_settings
+from app.services.rate_limit import TokenBucket
+
+settings = get_settings()
+
+# 1013: Try Again Later
+CLOSE_CODE_TRY_AGAIN_LATER = 1013
+
+
+class AdmissionController:
+    """ワーカー単位のハンドシェイク受け入れ制御"""
+    
+    def __init__(self, rate: float, burst: int, jitter_ms: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.jitter_ms = jitter_ms
+        self.admitted = 0
+        self.rejected = 0
+    
+    def admit(self) -> Optional[int]:
+        """受け入れるならNone、拒否するなら再試行までのミリ秒を返す"""
+        wait = self.bucket.try_acquire()
+        if wait == 0:
+            self.admitted += 1
+            return None
+        self.rejected += 1
+        return int(wait * 1000) + random.randint(0, self.jitter_ms)
+
+
+# シングルトンインスタンス
+admission = AdmissionController(
+    rate=settings.WS_ADMISSION_RATE,
+    burst=settings.WS_ADMISSION_BURST,
+    jitter_ms=settings.WS_RECONNECT_JITTER_MS,
+)
@@ -1,4 +1,5 @@
-from datetime import datetime, timedelta
+import uuid
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -9,6 +10,8 @@ from app.config import get_settings
 from app.database import get_db
 from app.models.user import User
 from app.schemas.user import TokenData
+from app.services.token_revocation import revoked_tokens
+from app.services.workspaces import DEFAULT_WORKSPACE_ID
 
 settings = get_settings()
 
@@ -36,24 +39,48 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # jti はログアウト時の失効に使う
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
 def decode_token(token: str) -> Optional[TokenData]:
-    """トークンをデコード"""
+    """トークンをデコード（失効済みなら None）
+
+    失効の確認はワーカー内の失効リストを引くだけで、DBには問い合わせない。
+    jti の無いトークン（jti 導入前に発行されたもの）は期限まで有効とする。
+    ws の無いトークン（ワークスペース導入前に発行されたもの）は既定のワークスペースのユーザーとみなす。
+    """
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id: int = payload.get("sub")
         email: str = payload.get("email")
+        jti: Optional[str] = payload.get("jti")
         if user_id is None:
             return None
-        return TokenData(user_id=user_id, email=email)
+        if jti is not None and revoked_tokens.is_revoked(jti):
+            return None
+        return TokenData(
+            user_id=user_id,
+            workspace_id=payload.get("ws", DEFAULT_WORKSPACE_ID),
+            email=email,
+            jti=jti,
+            expires_at=datetime.fromtimestamp(payload["exp"], tz=timezone.utc),
+        )
     except JWTError:
         return None
 
 
+def get_active_user(db: Session, token_data: TokenData) -> Optional[User]:
+    """トークンのユーザー（無効化されたユーザー・トークンと別のワークスペースのユーザーは None）"""
+    return db.query(User).filter(
+        User.id == token_data.user_id,
+        User.workspace_id == token_data.workspace_id,
+        User.is_active.isnot(False),
+    ).first()
+
+
 async def get_current_user(
     token: Optional[str] = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
@@ -66,8 +93,7 @@ async def get_current_user(
     if token_data is None:
         return None
     
-    user = db.query(User).filter(User.id == token_data.user_id).first()
-    return user
+    return get_active_user(db, token_data)
 
 
 async def get_current_user_required(
@@ -88,7 +114,7 @@ async def get_current_user_required(
     if token_data is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    user = get_active_user(db, token_data)
     if user is None:
         raise credentials_exception
     
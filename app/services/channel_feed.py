@@ -0,0 +1,112 @@
+"""閲覧専用クライアント向けのServer-Sent Eventsフィード
+
+チャンネルごとに1つの ChannelFeed を持ち、イベントは publish 時に1度だけSSEのバイト列へ
+エンコードして直近分をリングバッファに積む。購読者は自分がどこまで送ったか（seq）だけを持ち、
+同じバイト列を共有して書き出すため、接続ごとの受信ループやキューを持たない。
+"""
+import asyncio
+import json
+import random
+from collections import deque
+from typing import AsyncIterator, Dict
+from app.config import get_settings
+
+settings = get_settings()
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+# リングバッファから溢れるほど遅れた購読者には、履歴の再取得を促す
+RESYNC_FRAME = b'event: resync\ndata: {}\n\n'
+
+
+def encode_event(payload: dict) -> bytes:
+    """SSEの data フレームにエンコード"""
+    return b"data: " + json.dumps(payload, ensure_ascii=False).encode() + b"\n\n"
+
+
+class ChannelFeed:
+    """1チャンネル分の共有フィード"""
+    __slots__ = ("events", "seq", "changed", "subscribers")
+    
+    def __init__(self):
+        # (seq, エンコード済みイベント)
+        self.events = deque(maxlen=settings.SSE_FEED_BUFFER)
+        self.seq = 0
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+    
+    def wake(self):
+        """待機中の購読者を全員起こす"""
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+    
+    def publish(self, frame: bytes):
+        self.seq += 1
+        self.events.append((self.seq, frame))
+        self.wake()
+    
+    def since(self, cursor: int) -> bytes:
+        """cursor より後のイベントを返す"""
+        if cursor == self.seq - 1:
+            # ほとんどの場合は直前の1件だけなので、共有のバイト列をそのまま返す
+            return self.events[-1][1]
+        if not self.events or self.events[0][0] > cursor + 1:
+            return RESYNC_FRAME
+        return b"".join(frame for seq, frame in self.events if seq > cursor)
+
+
+class ChannelFeedHub:
+    """チャンネルごとの ChannelFeed と、購読者1人分のストリーム"""
+    
+    def __init__(self):
+        self.feeds: Dict[int, ChannelFeed] = {}
+        self.subscribers = 0
+        self.closed = False
+    
+    def publish(self, channel_id: int, payload: dict):
+        """購読者がいるチャンネルにだけ、エンコードして配信"""
+        feed = self.feeds.get(channel_id)
+        if feed is not None:
+            feed.publish(encode_event(payload))
+    
+    def keepalive(self):
+        """全フィードの購読者にコメント行を送らせる（プロキシのアイドル切断と切断検知のため）"""
+        for feed in self.feeds.values():
+            feed.wake()
+    
+    def close(self):
+        """シャットダウン時に全ストリームを終了させる"""
+        self.closed = True
+        for feed in self.feeds.values():
+            feed.wake()
+    
+    async def stream(self, channel_id: int) -> AsyncIterator[bytes]:
+        """購読者1人分のSSEストリーム"""
+        feed = self.feeds.get(channel_id)
+        if feed is None:
+            feed = self.feeds[channel_id] = ChannelFeed()
+        feed.subscribers += 1
+        self.subscribers += 1
+        try:
+            yield f"retry: {settings.WS_RECONNECT_JITTER_MS}\n\n".encode()
+            cursor = feed.seq
+            while not self.closed:
+                if feed.seq == cursor:
+                    await feed.changed.wait()
+                    if feed.seq == cursor:
+                        if not self.closed:
+                            yield KEEPALIVE_FRAME
+                        continue
+                frame = feed.since(cursor)
+                cursor = feed.seq
+                yield frame
+            # 再接続が一斉に起きないよう、待ち時間をばらつかせてから切断する
+            yield f"retry: {random.randint(0, settings.WS_RECONNECT_JITTER_MS)}\n\n".encode()
+        finally:
+            feed.subscribers -= 1
+            self.subscribers -= 1
+            if not feed.subscribers and self.feeds.get(channel_id) is feed:
+                del self.feeds[channel_id]
+
+
+# シングルトンインスタンス
+channel_feeds = ChannelFeedHub()
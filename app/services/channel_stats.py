@@ -0,0 +1,51 @@
+"""チャンネル一覧用の非正規化集計（最終投稿日時・メッセージ数・参加人数）と変更番号の更新
+
+いずれも呼び出し元と同じトランザクションで実行し、commitは呼び出し側で行う。
+参加人数はチャンネルを一度でも開いた（既読位置を持つ）ユーザー数。
+変更番号（change_seq）はチャンネル画面の内容が変わるたびに増やし、条件付きGETの判定に使う。
+"""
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from app.models.channel import Channel
+
+
+def on_message_created(db: Session, channel_id: int) -> None:
+    db.execute(
+        update(Channel)
+        .where(Channel.id == channel_id)
+        .values(
+            message_count=Channel.message_count + 1,
+            last_message_at=func.now(),
+            change_seq=Channel.change_seq + 1,
+            changed_at=func.now(),
+        )
+    )
+
+
+def on_messages_deleted(db: Session, channel_id: int, count: int = 1) -> None:
+    db.execute(
+        update(Channel)
+        .where(Channel.id == channel_id)
+        .values(
+            message_count=func.greatest(Channel.message_count - count, 0),
+            change_seq=Channel.change_seq + 1,
+            changed_at=func.now(),
+        )
+    )
+
+
+def on_channel_changed(db: Session, channel_id: int) -> None:
+    """メッセージの編集・通報など、件数は変わらないが画面の内容が変わったとき"""
+    db.execute(
+        update(Channel)
+        .where(Channel.id == channel_id)
+        .values(change_seq=Channel.change_seq + 1, changed_at=func.now())
+    )
+
+
+def on_member_joined(db: Session, channel_id: int) -> None:
+    db.execute(
+        update(Channel)
+        .where(Channel.id == channel_id)
+        .values(active_member_count=Channel.active_member_count + 1)
+    )
@@ -0,0 +1,37 @@
+"""条件付きGET（ETag / Last-Modified）の判定"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict
+from fastapi import Request
+
+
+def cache_headers(etag: str, last_modified: datetime) -> Dict[str, str]:
+    """再検証を前提にした（毎回 304 で確認させる）キャッシュ用ヘッダー"""
+    return {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified.astimezone(timezone.utc), usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """If-None-Match（優先）または If-Modified-Since に照らして 304 を返せるか"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # 弱い比較（W/ の有無を無視する）
+        tag = etag.removeprefix("W/")
+        return any(candidate.strip().removeprefix("W/") == tag for candidate in if_none_match.split(","))
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP の日時は秒単位
+        return last_modified.replace(microsecond=0) <= since
+    return False
@@ -0,0 +1,99 @@
+"""@ユーザー名 によるメンション
+
+投稿・編集時に本文から @ユーザー名 を取り出し、ワーカー内のユーザー名 → ID の表で解決して
+message_mentions に書き込む。ユーザー名はワークスペース内でだけ一意なため、表はワークスペースごとに持つ。
+表は登録時に更新し、他のワーカーでの登録・変更を拾うため USERNAME_CACHE_TTL_SECONDS ごとに読み直す。
+"""
+import re
+import time
+from typing import Dict, Iterable, Set
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.models.message import Message
+from app.models.message_mention import MessageMention
+from app.models.user import User
+
+settings = get_settings()
+
+# 末尾の「.」「-」は文の区切りとみなしてユーザー名に含めない
+MENTION_PATTERN = re.compile(r"(?<![\w@])@(\w(?:[\w.\-]*\w)?)")
+# 1メッセージで通知するユーザー数の上限
+MAX_MENTIONS_PER_MESSAGE = 50
+
+
+class UsernameCache:
+    """ワークスペース → ユーザー名 → ユーザーID（有効なユーザーのみ）"""
+    
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.ids: Dict[int, Dict[str, int]] = {}
+        self.loaded_at: Dict[int, float] = {}
+    
+    def refresh(self, db: Session, workspace_id: int):
+        self.ids[workspace_id] = dict(
+            db.query(User.username, User.id)
+            .filter(User.workspace_id == workspace_id, User.is_active.isnot(False))
+        )
+        self.loaded_at[workspace_id] = time.monotonic()
+    
+    def resolve(self, db: Session, workspace_id: int, usernames: Iterable[str]) -> Set[int]:
+        if not usernames:
+            return set()
+        loaded_at = self.loaded_at.get(workspace_id)
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl_seconds:
+            self.refresh(db, workspace_id)
+        ids = self.ids[workspace_id]
+        return {ids[name] for name in usernames if name in ids}
+    
+    def add(self, user: User):
+        """このワーカーでの登録・変更をすぐに反映（未読み込みのワークスペースは次の解決時に読む）"""
+        if user.workspace_id in self.ids:
+            self.ids[user.workspace_id][user.username] = user.id
+
+
+username_cache = UsernameCache(settings.USERNAME_CACHE_TTL_SECONDS)
+
+
+def parse_mentions(text: str) -> Set[str]:
+    """本文中の @ユーザー名 を取り出す"""
+    return set(MENTION_PATTERN.findall(text))
+
+
+def record_mentions(db: Session, message: Message, workspace_id: int, edited: bool = False) -> Set[int]:
+    """メッセージのメンションを索引に書き込み、新たにメンションされたユーザーIDを返す
+
+    編集時は以前のメンションと差し替え、以前からメンションされていたユーザーは戻り値に含めない。
+    投稿者自身へのメンションは記録しない。commitは呼び出し側。
+    """
+    mentioned = username_cache.resolve(db, workspace_id, parse_mentions(message.text))
+    mentioned.discard(message.user_id)
+    mentioned = set(sorted(mentioned)[:MAX_MENTIONS_PER_MESSAGE])
+
+    previous = set()
+    if edited:
+        previous = set(
+            user_id for (user_id,) in db.query(MessageMention.mentioned_user_id)
+            .filter(MessageMention.message_id == message.id)
+        )
+    removed = previous - mentioned
+    if removed:
+        db.execute(
+            delete(MessageMention).where(
+                MessageMention.message_id == message.id,
+                MessageMention.mentioned_user_id.in_(removed),
+            )
+        )
+    added = mentioned - previous
+    if added:
+        db.add_all([
+            MessageMention(
+                mentioned_user_id=user_id,
+                message_created_at=message.created_at,
+                message_id=message.id,
+                channel_id=message.channel_id,
+                author_user_id=message.user_id,
+            )
+            for user_id in added
+        ])
+    return added
@@ -0,0 +1,81 @@
+"""管理者によるメッセージの一括非表示・一括削除
+
+条件に合うメッセージを1文の UPDATE / DELETE ... RETURNING で処理し、
+戻ってきた行をチャンネルごとにまとめて未読数・メッセージ数を1チャンネル1文ずつ補正する。
+commitとWebSocketへの配信は呼び出し側で行う。
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+from app.models.channel import Channel
+from app.models.message import Message
+from app.services import channel_stats, read_markers
+
+
+def bulk_moderate(
+    db: Session,
+    action: str,
+    workspace_id: int,
+    channel_id: Optional[int] = None,
+    message_ids: Optional[List[int]] = None,
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Dict[int, List[int]]:
+    """条件に合うメッセージを非表示（hide）または削除（delete）し、チャンネルごとのメッセージIDを返す
+
+    対象は workspace_id のワークスペースのチャンネルに限る（同じシャードの他のワークスペースには触れない）。
+    """
+    conditions = []
+    if channel_id is not None:
+        conditions.append(Message.channel_id == channel_id)
+    if message_ids:
+        conditions.append(Message.id.in_(message_ids))
+    if user_id is not None:
+        conditions.append(Message.user_id == user_id)
+    # 期間指定は該当する月のパーティションだけを読む
+    if since is not None:
+        conditions.append(Message.created_at >= since)
+    if until is not None:
+        conditions.append(Message.created_at < until)
+    if not conditions:
+        raise ValueError("条件が指定されていません")
+    conditions.append(Message.channel_id.in_(select(Channel.id).where(Channel.workspace_id == workspace_id)))
+
+    if action == "hide":
+        rows = db.execute(
+            update(Message)
+            .where(*conditions, Message.is_hidden.is_(False))
+            .values(is_hidden=True)
+            .returning(Message.channel_id, Message.id, Message.is_hidden),
+            execution_options={"synchronize_session": False},
+        ).all()
+        # 戻り値は更新後の値なので、すべて今回非表示にしたもの
+        counted = rows
+    elif action == "delete":
+        # 通報は message_reports の外部キー（ON DELETE CASCADE）で消える
+        rows = db.execute(
+            delete(Message)
+            .where(*conditions)
+            .returning(Message.channel_id, Message.id, Message.is_hidden),
+            execution_options={"synchronize_session": False},
+        ).all()
+        # 非表示済みのものは非表示にした時点で集計から外している
+        counted = [row for row in rows if not row.is_hidden]
+    else:
+        raise ValueError(f"unknown action: {action}")
+
+    affected: Dict[int, List[int]] = defaultdict(list)
+    for row in rows:
+        affected[row.channel_id].append(row.id)
+
+    adjusted: Dict[int, List[int]] = defaultdict(list)
+    for row in counted:
+        adjusted[row.channel_id].append(row.id)
+    for target_channel_id, ids in adjusted.items():
+        read_markers.on_messages_deleted(db, target_channel_id, ids)
+        channel_stats.on_messages_deleted(db, target_channel_id, len(ids))
+
+    return dict(affected)
@@ -0,0 +1,143 @@
+"""messages と、messages を参照するテーブルの月次レンジパーティション管理
+
+message_reports・message_mentions・message_revisions はメッセージの投稿月（message_created_at）で分割しているため、
+同じ月のパーティション同士がそのまま対応する。
+範囲外の月のパーティションが無いと投稿・通報が失敗するため、アプリは起動時と
+PARTITION_PRECREATE_INTERVAL_SECONDS ごとに PARTITION_PRECREATE_MONTHS か月先までを作っておく
+（cron の precreate を逃しても月の変わり目で書き込みが止まらない）。
+"""
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import List, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from app.config import get_settings
+from app.database import shard_engines
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# テーブル名 -> パーティションキー
+PARTITIONED_TABLES = {
+    "messages": "created_at",
+    "message_reports": "message_created_at",
+    "message_mentions": "message_created_at",
+    "message_revisions": "message_created_at",
+}
+
+# 切り離し・アーカイブは参照される側（messages）を最後にする
+ARCHIVE_ORDER = ["message_reports", "message_mentions", "message_revisions", "messages"]
+
+_PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+# 複数のワーカー・cron が同時にパーティションを作らないためのアドバイザリーロックのキー
+_PRECREATE_LOCK_KEY = 7020261019
+
+
+def month_start(value: date) -> date:
+    """月初日を返す"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    """月初日に月数を加算する"""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def current_month() -> date:
+    return month_start(datetime.now(timezone.utc).date())
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def _bound(month: date) -> str:
+    return f"{month:%Y-%m-%d} 00:00:00+00"
+
+
+def create_month_partition(conn: Connection, table: str, month: date) -> str:
+    """指定月のパーティションを作成（既存なら何もしない）"""
+    name = partition_name(table, month)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(add_months(month, 1))}')"
+    ))
+    return name
+
+
+def ensure_month_partitions(conn: Connection, start: date, end: date) -> List[str]:
+    """start月からend月（両端含む）までの全パーティションを作成"""
+    created = []
+    month = month_start(start)
+    end = month_start(end)
+    while month <= end:
+        for table in PARTITIONED_TABLES:
+            created.append(create_month_partition(conn, table, month))
+        month = add_months(month, 1)
+    return created
+
+
+def list_month_partitions(conn: Connection, table: str) -> List[Tuple[str, date]]:
+    """アタッチ済みの月次パーティションを (名前, 月) の昇順で返す"""
+    rows = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ), {"table": table}).scalars()
+    partitions = []
+    for name in rows:
+        match = _PARTITION_SUFFIX.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def detach_partition(conn: Connection, table: str, name: str) -> None:
+    """パーティションを親テーブルから切り離す（データは残る）"""
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+
+
+def ensure_future_partitions(conn: Connection, months: int) -> List[str]:
+    """当月から months か月先までのうち、まだ無いパーティションだけを作成して名前を返す
+
+    既にあれば CREATE を発行しない（親テーブルのロックを取らない）。
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PRECREATE_LOCK_KEY})
+    start = current_month()
+    end = add_months(start, months)
+    created = []
+    for table in PARTITIONED_TABLES:
+        existing = {month for _, month in list_month_partitions(conn, table)}
+        month = start
+        while month <= end:
+            if month not in existing:
+                created.append(create_month_partition(conn, table, month))
+            month = add_months(month, 1)
+    return created
+
+
+async def precreate_loop():
+    """起動時と PARTITION_PRECREATE_INTERVAL_SECONDS ごとに未来のパーティションを用意する"""
+    while True:
+        try:
+            created = await asyncio.to_thread(_precreate_once)
+            if created:
+                logger.info("パーティションを作成しました: %s", ", ".join(created))
+        except Exception:
+            logger.exception("パーティションの作成に失敗しました")
+        await asyncio.sleep(settings.PARTITION_PRECREATE_INTERVAL_SECONDS)
+
+
+def _precreate_once() -> List[str]:
+    created = []
+    for engine in shard_engines.values():
+        if engine.dialect.name != "postgresql":
+            continue
+        with engine.begin() as conn:
+            created += ensure_future_partitions(conn, settings.PARTITION_PRECREATE_MONTHS)
+    return created
@@ -0,0 +1,100 @@
+"""チャンネルの在席・入力中表示
+
+クライアントは入力中に {"type": "typing", "channel_id": N} を送る（キー入力のたびでもよい）。
+サーバーは入力中のユーザーと期限を記録するだけで、その場では何も配信しない。
+PRESENCE_SNAPSHOT_INTERVAL_SECONDS ごとに、購読者か入力中のユーザーが変わったチャンネルにだけ
+{"type": "presence", "online": 12, "typing": 3, "typing_users": [...]} を1フレーム送る。
+1チャンネルの配信は、キー入力の回数によらず1間隔あたり購読者数フレームまでになる。
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+from app.config import get_settings
+from app.services.websocket_manager import ConnectionManager, manager
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class PresenceTracker:
+    """チャンネルごとの入力中ユーザーと、在席表示の定期配信"""
+    
+    def __init__(self, manager: ConnectionManager):
+        self.manager = manager
+        # channel_id -> user_id -> 入力中表示を消す時刻（time.monotonic）
+        self.typing: Dict[int, Dict[int, float]] = {}
+        self.typing_events = 0
+        self.typing_collapsed = 0
+        self.snapshots_sent = 0
+    
+    def start_typing(self, channel_id: int, user_id: int, now: Optional[float] = None):
+        """入力中の通知を受け取る（既に入力中なら期限を延ばすだけ）"""
+        now = time.monotonic() if now is None else now
+        self.typing_events += 1
+        users = self.typing.setdefault(channel_id, {})
+        if user_id in users:
+            self.typing_collapsed += 1
+        else:
+            self.manager.presence_dirty.add(channel_id)
+        users[user_id] = now + settings.TYPING_TIMEOUT_SECONDS
+    
+    def stop_typing(self, channel_id: int, user_id: int):
+        """入力をやめた・投稿した"""
+        users = self.typing.get(channel_id)
+        if users and users.pop(user_id, None) is not None:
+            if not users:
+                del self.typing[channel_id]
+            self.manager.presence_dirty.add(channel_id)
+    
+    def expire(self, now: float):
+        """期限を過ぎた入力中表示を消す"""
+        for channel_id, users in list(self.typing.items()):
+            expired = [user_id for user_id, until in users.items() if until <= now]
+            if not expired:
+                continue
+            for user_id in expired:
+                del users[user_id]
+            if not users:
+                del self.typing[channel_id]
+            self.manager.presence_dirty.add(channel_id)
+    
+    def snapshot(self, channel_id: int) -> dict:
+        """チャンネルの在席人数（ユーザー単位）と入力中の人数"""
+        online = {
+            conn.user_id: conn.username
+            for conn in self.manager.active_connections.get(channel_id, ())
+        }
+        # 切断したユーザーは期限前でも入力中に数えない
+        typing = sorted(user_id for user_id in self.typing.get(channel_id, ()) if user_id in online)
+        return {
+            "type": "presence",
+            "channel_id": channel_id,
+            "online": len(online),
+            "typing": len(typing),
+            "typing_users": [online[user_id] for user_id in typing[:settings.PRESENCE_TYPING_NAMES]],
+        }
+    
+    async def tick(self, now: Optional[float] = None) -> int:
+        """変化のあったチャンネルに在席表示を送り、送ったフレーム数を返す"""
+        self.expire(time.monotonic() if now is None else now)
+        dirty, self.manager.presence_dirty = self.manager.presence_dirty, set()
+        frames = 0
+        for channel_id in dirty:
+            if channel_id in self.manager.active_connections:
+                frames += await self.manager.send_ephemeral(channel_id, self.snapshot(channel_id))
+        self.snapshots_sent += frames
+        return frames
+    
+    async def run(self):
+        """PRESENCE_SNAPSHOT_INTERVAL_SECONDS ごとに在席表示を配信"""
+        while True:
+            await asyncio.sleep(settings.PRESENCE_SNAPSHOT_INTERVAL_SECONDS)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("在席表示の配信に失敗しました")
+
+
+# シングルトンインスタンス
+presence = PresenceTracker(manager)
@@ -0,0 +1,166 @@
+"""トークンバケットによる流量制限
+
+書き込み系エンドポイントはユーザー単位・チャンネル単位の2種類のバケットで制限する。
+判定はワーカー内のバケットで行い、RATE_LIMIT_BACKEND=postgres のときは
+全ワーカーで共有する rate_limit_buckets テーブルでも判定する。
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import text
+from app.config import get_settings
+from app.database import engine
+
+settings = get_settings()
+
+
+class TokenBucket:
+    """rate 個/秒で補充され、最大 capacity 個まで貯まるトークンバケット"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def try_acquire(self, now: float = None) -> float:
+        """トークンを1つ取得する。取得できれば0、できなければ次に取得できるまでの秒数を返す"""
+        if now is None:
+            now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimitExceeded(Exception):
+    """流量制限を超えた"""
+    
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"rate limit exceeded: {scope}")
+
+
+class KeyedRateLimiter:
+    """キー（ユーザーIDやチャンネルID）ごとのトークンバケット
+
+    バケットは最近使った順に並べ、max_keys を超えたら最も長く使われていないキーから捨てる。
+    """
+    
+    def __init__(self, scope: str, rate: float, burst: int, max_keys: int):
+        self.scope = scope
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+    
+    def try_acquire(self, key: int, now: float) -> float:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                self.buckets.popitem(last=False)
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+        else:
+            self.buckets.move_to_end(key)
+        wait = bucket.try_acquire(now)
+        if wait:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+        return wait
+
+
+class PostgresBucketStore:
+    """全ワーカーで共有するトークンバケット（1回の判定につき1文のUPSERT）"""
+
+    SQL = text("""
+        INSERT INTO rate_limit_buckets AS b (key, tokens, updated_at)
+        VALUES (:key, :burst - 1, clock_timestamp())
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = least(:burst, b.tokens + extract(epoch FROM clock_timestamp() - b.updated_at) * :rate) - 1,
+            updated_at = clock_timestamp()
+        WHERE least(:burst, b.tokens + extract(epoch FROM clock_timestamp() - b.updated_at) * :rate) >= 1
+        RETURNING tokens
+    """)
+    
+    def __init__(self):
+        self.rejected = 0
+    
+    def try_acquire(self, key: str, rate: float, burst: int) -> float:
+        with engine.begin() as conn:
+            row = conn.execute(self.SQL, {"key": key, "rate": rate, "burst": burst}).first()
+        if row is None:
+            self.rejected += 1
+            return 1 / rate
+        return 0.0
+
+
+user_limiter = KeyedRateLimiter(
+    "user", settings.RATE_LIMIT_USER_RATE, settings.RATE_LIMIT_USER_BURST, settings.RATE_LIMIT_MAX_KEYS
+)
+channel_limiter = KeyedRateLimiter(
+    "channel", settings.RATE_LIMIT_CHANNEL_RATE, settings.RATE_LIMIT_CHANNEL_BURST, settings.RATE_LIMIT_MAX_KEYS
+)
+shared_store = PostgresBucketStore() if settings.RATE_LIMIT_BACKEND == "postgres" else None
+
+# 判定にかかった時間の合計（メトリクス用）
+_check_count = 0
+_check_ns = 0
+
+
+async def check_write_rate(user_id: int, channel_id: Optional[int] = None) -> None:
+    """書き込みの流量制限を判定し、超えていれば RateLimitExceeded を送出"""
+    global _check_count, _check_ns
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    started = time.perf_counter_ns()
+    now = time.monotonic()
+    try:
+        wait = user_limiter.try_acquire(user_id, now)
+        if wait:
+            raise RateLimitExceeded("user", wait)
+        if channel_id is not None:
+            wait = channel_limiter.try_acquire(channel_id, now)
+            if wait:
+                raise RateLimitExceeded("channel", wait)
+    finally:
+        _check_count += 1
+        _check_ns += time.perf_counter_ns() - started
+
+    # ワーカー内で通ったものだけ共有バケットでも判定する（DBへの問い合わせはイベントループを止めないよう別スレッドで）
+    if shared_store is not None:
+        await asyncio.to_thread(_check_shared_rate, user_id, channel_id)
+
+
+def _check_shared_rate(user_id: int, channel_id: Optional[int]) -> None:
+    wait = shared_store.try_acquire(f"user:{user_id}", user_limiter.rate, user_limiter.burst)
+    if wait:
+        raise RateLimitExceeded("user", wait)
+    if channel_id is not None:
+        wait = shared_store.try_acquire(f"channel:{channel_id}", channel_limiter.rate, channel_limiter.burst)
+        if wait:
+            raise RateLimitExceeded("channel", wait)
+
+
+def get_rate_limit_metrics() -> dict:
+    """流量制限のメトリクス"""
+    return {
+        "backend": settings.RATE_LIMIT_BACKEND,
+        "limiters": {
+            limiter.scope: {
+                "allowed": limiter.allowed,
+                "rejected": limiter.rejected,
+                "tracked_keys": len(limiter.buckets),
+            }
+            for limiter in (user_limiter, channel_limiter)
+        },
+        "shared_rejected": shared_store.rejected if shared_store is not None else 0,
+        "local_check_avg_ns": _check_ns // _check_count if _check_count else 0,
+    }
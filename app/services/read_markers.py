@@ -0,0 +1,103 @@
+"""チャンネルの既読位置と未読数の管理
+
+未読数はメッセージの投稿・削除に合わせて増減させ、チャンネル一覧では
+channel_read_states を1行ずつ結合するだけで表示できるようにする。
+一度もチャンネルを開いていないユーザーには行が無く、未読数も表示しない。
+"""
+import json
+from typing import List, Optional
+from sqlalchemy import Integer, func, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+from app.database import upsert_insert
+from app.models.channel_read_state import ChannelReadState
+from app.services.channel_stats import on_member_joined
+
+
+def mark_channel_read(db: Session, user_id: int, channel_id: int, message_id: int) -> None:
+    """message_id までを既読にして未読数を0にする（commitは呼び出し側）"""
+    inserted = db.execute(
+        upsert_insert(db, ChannelReadState)
+        .values(
+            user_id=user_id,
+            channel_id=channel_id,
+            last_read_message_id=message_id,
+            unread_count=0,
+        )
+        .on_conflict_do_nothing(
+            index_elements=[ChannelReadState.user_id, ChannelReadState.channel_id]
+        )
+        .returning(ChannelReadState.user_id)
+    ).first()
+    if inserted:
+        # 初めてチャンネルを開いたユーザー
+        on_member_joined(db, channel_id)
+        return
+
+    db.execute(
+        update(ChannelReadState)
+        .where(
+            ChannelReadState.user_id == user_id,
+            ChannelReadState.channel_id == channel_id,
+        )
+        .values(
+            last_read_message_id=func.greatest(ChannelReadState.last_read_message_id, message_id),
+            unread_count=0,
+            updated_at=func.now(),
+        )
+    )
+
+
+def get_read_state(db: Session, user_id: int, channel_id: int) -> Optional[ChannelReadState]:
+    return db.get(ChannelReadState, (user_id, channel_id))
+
+
+def on_message_created(db: Session, channel_id: int, message_id: int, author_id: int) -> None:
+    """投稿者以外の未読数を1増やし、投稿者自身は既読にする"""
+    db.execute(
+        update(ChannelReadState)
+        .where(
+            ChannelReadState.channel_id == channel_id,
+            ChannelReadState.user_id != author_id,
+            ChannelReadState.last_read_message_id < message_id,
+        )
+        .values(unread_count=ChannelReadState.unread_count + 1)
+    )
+    mark_channel_read(db, author_id, channel_id, message_id)
+
+
+def on_message_deleted(db: Session, channel_id: int, message_id: int) -> None:
+    """削除されたメッセージを未読として数えていたユーザーの未読数を1減らす"""
+    db.execute(
+        update(ChannelReadState)
+        .where(
+            ChannelReadState.channel_id == channel_id,
+            ChannelReadState.last_read_message_id < message_id,
+            ChannelReadState.unread_count > 0,
+        )
+        .values(unread_count=ChannelReadState.unread_count - 1)
+    )
+
+
+def on_messages_deleted(db: Session, channel_id: int, message_ids: List[int]) -> None:
+    """まとめて削除・非表示にしたメッセージのうち、未読だった件数ずつ各ユーザーの未読数を減らす"""
+    if db.get_bind().dialect.name == "sqlite":
+        values = func.json_each(json.dumps(message_ids)).table_valued("value")
+        removed = select(values.c.value.label("id")).subquery()
+    else:
+        removed = func.unnest(literal(message_ids, ARRAY(Integer))).table_valued("id").render_derived()
+    unread_removed = (
+        select(func.count())
+        .select_from(removed)
+        .where(removed.c.id > ChannelReadState.last_read_message_id)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(ChannelReadState)
+        .where(
+            ChannelReadState.channel_id == channel_id,
+            ChannelReadState.last_read_message_id < max(message_ids),
+            ChannelReadState.unread_count > 0,
+        )
+        .values(unread_count=func.greatest(ChannelReadState.unread_count - unread_removed, 0))
+    )
@@ -0,0 +1,290 @@
+"""通報の期間別集計（管理者ダッシュボード用）
+
+通報を受け付けるたびに、同じトランザクションで
+- report_hourly_rollups（1時間 × メッセージごとの件数）
+- report_window_totals（期間 × チャンネル/ワークスペース全体 × メッセージ/投稿者ごとの合計）
+を1文ずつ加算する。期間から外れた時間帯の件数は expire_report_rollups が
+1時間単位でまとめて差し引くため、集計の精度は1時間単位になる。
+ダッシュボードは report_window_totals の索引から上位k件を読むだけで、message_reports は読まない。
+SQLite では同じ処理を SQLite の構文で書いた文で行う。
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.database import shard_engines
+from app.models.report_rollup import ReportWindowTotal
+from app.sqlite import begin_write
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 集計期間（ダッシュボードの period パラメータ）
+PERIODS: Dict[str, timedelta] = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+}
+
+
+def workspace_channel_id(workspace_id: int) -> int:
+    """ワークスペース内の全チャンネル合計を表す channel_id（実在のチャンネルと重ならない負の値）"""
+    return -workspace_id
+
+
+# 時間帯の境界として渡す・受け取る日時（SQLite では保存形式の文字列に変換される）
+_HOUR = DateTime(timezone=True)
+# SQLite で date_trunc('hour', ...) の代わりに使う書式（AwareDateTime の保存形式にそろえる）
+_SQLITE_HOUR_FORMAT = "%Y-%m-%d %H:00:00.000000"
+
+_INCREMENT_SQL = text("""
+    WITH bucket AS (
+        INSERT INTO report_hourly_rollups (bucket_start, channel_id, message_id, author_user_id, count)
+        VALUES (date_trunc('hour', now()), :channel_id, :message_id, :author_user_id, 1)
+        ON CONFLICT (bucket_start, channel_id, message_id)
+        DO UPDATE SET count = report_hourly_rollups.count + 1
+    )
+    INSERT INTO report_window_totals (period, channel_id, subject_type, subject_id, count)
+    SELECT p.period, s.channel_id, s.subject_type, s.subject_id, 1
+    FROM unnest(CAST(:periods AS varchar[])) AS p(period)
+    CROSS JOIN (VALUES
+        (:channel_id, 'message', :message_id),
+        (:channel_id, 'user', :author_user_id),
+        (:workspace_channel_id, 'message', :message_id),
+        (:workspace_channel_id, 'user', :author_user_id)
+    ) AS s(channel_id, subject_type, subject_id)
+    ON CONFLICT (period, channel_id, subject_type, subject_id)
+    DO UPDATE SET count = report_window_totals.count + 1
+""")
+
+# SQLite の INSERT ... ON CONFLICT は WITH 句の中に書けないため2文に分ける
+_SQLITE_INCREMENT_SQL = (
+    text(f"""
+        INSERT INTO report_hourly_rollups (bucket_start, channel_id, message_id, author_user_id, count)
+        VALUES (strftime('{_SQLITE_HOUR_FORMAT}', 'now'), :channel_id, :message_id, :author_user_id, 1)
+        ON CONFLICT (bucket_start, channel_id, message_id)
+        DO UPDATE SET count = report_hourly_rollups.count + 1
+    """),
+    # WHERE true は SELECT と ON CONFLICT の構文上のあいまいさを避けるため（SQLite の仕様）
+    text("""
+        INSERT INTO report_window_totals (period, channel_id, subject_type, subject_id, count)
+        SELECT p.value, s.column1, s.column2, s.column3, 1
+        FROM json_each(:periods) AS p
+        CROSS JOIN (VALUES
+            (:channel_id, 'message', :message_id),
+            (:channel_id, 'user', :author_user_id),
+            (:workspace_channel_id, 'message', :message_id),
+            (:workspace_channel_id, 'user', :author_user_id)
+        ) AS s
+        WHERE true
+        ON CONFLICT (period, channel_id, subject_type, subject_id)
+        DO UPDATE SET count = report_window_totals.count + 1
+    """),
+)
+
+# from_ <= bucket_start < to の時間帯の件数を、チャンネル別・全体それぞれの合計から差し引く
+_SUBTRACT_SQL = text("""
+    WITH expired AS (
+        SELECT r.channel_id, -c.workspace_id AS workspace_channel_id, r.message_id, r.author_user_id, r.count
+        FROM report_hourly_rollups r
+        JOIN channels c ON c.id = r.channel_id
+        WHERE r.bucket_start >= :from_ AND r.bucket_start < :to
+    ), deltas AS (
+        SELECT channel_id, 'message' AS subject_type, message_id AS subject_id, sum(count) AS n
+        FROM expired GROUP BY channel_id, message_id
+        UNION ALL
+        SELECT channel_id, 'user', author_user_id, sum(count)
+        FROM expired GROUP BY channel_id, author_user_id
+        UNION ALL
+        SELECT workspace_channel_id, 'message', message_id, sum(count)
+        FROM expired GROUP BY workspace_channel_id, message_id
+        UNION ALL
+        SELECT workspace_channel_id, 'user', author_user_id, sum(count)
+        FROM expired GROUP BY workspace_channel_id, author_user_id
+    )
+    UPDATE report_window_totals AS t
+    SET count = t.count - d.n
+    FROM deltas d
+    WHERE t.period = :period
+      AND t.channel_id = d.channel_id
+      AND t.subject_type = d.subject_type
+      AND t.subject_id = d.subject_id
+""").bindparams(bindparam("from_", type_=_HOUR), bindparam("to", type_=_HOUR))
+
+# from_ <= bucket_start の時間帯の件数で合計を作り直す（初期構築用）
+_REBUILD_SQL = text("""
+    WITH recent AS (
+        SELECT r.channel_id, -c.workspace_id AS workspace_channel_id, r.message_id, r.author_user_id, r.count
+        FROM report_hourly_rollups r
+        JOIN channels c ON c.id = r.channel_id
+        WHERE r.bucket_start >= :from_
+    )
+    INSERT INTO report_window_totals (period, channel_id, subject_type, subject_id, count)
+    SELECT :period, channel_id, 'message', message_id, sum(count) FROM recent GROUP BY channel_id, message_id
+    UNION ALL
+    SELECT :period, channel_id, 'user', author_user_id, sum(count) FROM recent GROUP BY channel_id, author_user_id
+    UNION ALL
+    SELECT :period, workspace_channel_id, 'message', message_id, sum(count)
+    FROM recent GROUP BY workspace_channel_id, message_id
+    UNION ALL
+    SELECT :period, workspace_channel_id, 'user', author_user_id, sum(count)
+    FROM recent GROUP BY workspace_channel_id, author_user_id
+""").bindparams(bindparam("from_", type_=_HOUR))
+
+_HOURLY_REBUILD_SQL = """
+    INSERT INTO report_hourly_rollups (bucket_start, channel_id, message_id, author_user_id, count)
+    SELECT {bucket}, m.channel_id, r.message_id, m.user_id, count(*)
+    FROM message_reports r
+    JOIN messages m ON m.id = r.message_id AND m.created_at = r.message_created_at
+    WHERE r.created_at >= :oldest
+    GROUP BY 1, 2, 3, 4
+"""
+_HOURLY_REBUILD = {
+    "postgresql": text(_HOURLY_REBUILD_SQL.format(bucket="date_trunc('hour', r.created_at)")),
+    "sqlite": text(_HOURLY_REBUILD_SQL.format(bucket=f"strftime('{_SQLITE_HOUR_FORMAT}', r.created_at)")),
+}
+
+_WATERMARK_SQL = "SELECT expired_through FROM report_rollup_watermarks WHERE period = :period"
+_WATERMARK = {
+    "postgresql": text(f"{_WATERMARK_SQL} FOR UPDATE").columns(expired_through=_HOUR),
+    "sqlite": text(_WATERMARK_SQL).columns(expired_through=_HOUR),
+}
+
+
+def _current_hour(conn: Connection) -> datetime:
+    """DBの時計で今の時間帯の始まり（SQLite は同じマシンの時計なのでアプリ側で求める）"""
+    if conn.dialect.name == "sqlite":
+        return datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return conn.execute(text("SELECT date_trunc('hour', now())")).scalar()
+
+
+def on_report_created(
+    db: Session, workspace_id: int, channel_id: int, message_id: int, author_user_id: int
+) -> None:
+    """通報1件を各期間の集計に加算（commitは呼び出し側）"""
+    params = {
+        "workspace_channel_id": workspace_channel_id(workspace_id),
+        "channel_id": channel_id,
+        "message_id": message_id,
+        "author_user_id": author_user_id,
+    }
+    if db.get_bind().dialect.name == "sqlite":
+        for statement in _SQLITE_INCREMENT_SQL:
+            db.execute(statement, {**params, "periods": json.dumps(list(PERIODS))})
+    else:
+        db.execute(_INCREMENT_SQL, {**params, "periods": list(PERIODS)})
+
+
+def expire_report_rollups(conn: Connection) -> int:
+    """期間から外れた時間帯の件数を合計から差し引き、差し引いた時間帯の数を返す
+
+    期間ごとの watermark（差し引き済みの時間帯の終端）を行ロックして進めるため、
+    複数ワーカーから同時に呼ばれても二重には差し引かない（SQLite では書き込みトランザクションで読む）。
+    """
+    current_hour = _current_hour(conn)
+    begin_write(conn)
+    expired_hours = 0
+    for period, length in PERIODS.items():
+        watermark = conn.execute(_WATERMARK[conn.dialect.name], {"period": period}).scalar()
+        new_watermark = current_hour - length
+        if watermark is None or new_watermark <= watermark:
+            continue
+        conn.execute(_SUBTRACT_SQL, {"period": period, "from_": watermark, "to": new_watermark})
+        conn.execute(
+            text("DELETE FROM report_window_totals WHERE period = :period AND count <= 0"),
+            {"period": period},
+        )
+        conn.execute(
+            text("UPDATE report_rollup_watermarks SET expired_through = :to WHERE period = :period")
+            .bindparams(bindparam("to", type_=_HOUR)),
+            {"period": period, "to": new_watermark},
+        )
+        expired_hours += int((new_watermark - watermark) / timedelta(hours=1))
+
+    # 最も長い期間からも外れた時間帯はもう使わない
+    conn.execute(
+        text("DELETE FROM report_hourly_rollups WHERE bucket_start < :before")
+        .bindparams(bindparam("before", type_=_HOUR)),
+        {"before": current_hour - max(PERIODS.values())},
+    )
+    return expired_hours
+
+
+def init_rollup_watermarks(conn: Connection) -> None:
+    """watermark の無い期間を、今の時間帯から数え始める（通報の無い新しいDB用。無いと期間から外れた分を差し引かない）"""
+    current_hour = _current_hour(conn)
+    existing = set(conn.execute(text("SELECT period FROM report_rollup_watermarks")).scalars())
+    for period, length in PERIODS.items():
+        if period in existing:
+            continue
+        conn.execute(
+            text("INSERT INTO report_rollup_watermarks (period, expired_through) VALUES (:period, :watermark)")
+            .bindparams(bindparam("watermark", type_=_HOUR)),
+            {"period": period, "watermark": current_hour - length},
+        )
+
+
+def rebuild_report_rollups(conn: Connection) -> None:
+    """message_reports から直近の集計を作り直す（マイグレーション・復旧用）"""
+    current_hour = _current_hour(conn)
+    oldest = current_hour - max(PERIODS.values())
+    conn.execute(text("DELETE FROM report_window_totals"))
+    conn.execute(text("DELETE FROM report_hourly_rollups"))
+    conn.execute(text("DELETE FROM report_rollup_watermarks"))
+    conn.execute(
+        _HOURLY_REBUILD[conn.dialect.name].bindparams(bindparam("oldest", type_=_HOUR)),
+        {"oldest": oldest},
+    )
+    for period, length in PERIODS.items():
+        watermark = current_hour - length
+        conn.execute(_REBUILD_SQL, {"period": period, "from_": watermark})
+        conn.execute(
+            text("INSERT INTO report_rollup_watermarks (period, expired_through) VALUES (:period, :watermark)")
+            .bindparams(bindparam("watermark", type_=_HOUR)),
+            {"period": period, "watermark": watermark},
+        )
+
+
+def top_reported(
+    db: Session, workspace_id: int, period: str, subject_type: str, channel_id: Optional[int], limit: int
+) -> List[tuple]:
+    """通報数の多い順に (subject_id, count) を返す（索引を先頭から limit 件読むだけ）
+
+    channel_id が None ならワークスペース内の全チャンネル合計。
+    """
+    return (
+        db.query(ReportWindowTotal.subject_id, ReportWindowTotal.count)
+        .filter(
+            ReportWindowTotal.period == period,
+            ReportWindowTotal.channel_id == (
+                workspace_channel_id(workspace_id) if channel_id is None else channel_id
+            ),
+            ReportWindowTotal.subject_type == subject_type,
+        )
+        .order_by(ReportWindowTotal.count.desc(), ReportWindowTotal.subject_id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+async def expire_loop():
+    """REPORT_ROLLUP_EXPIRE_INTERVAL_SECONDS ごとに期間外の件数を差し引く"""
+    while True:
+        try:
+            await asyncio.to_thread(_expire_once)
+        except Exception:
+            logger.exception("通報集計の期限切れ処理に失敗しました")
+        await asyncio.sleep(settings.REPORT_ROLLUP_EXPIRE_INTERVAL_SECONDS)
+
+
+def _expire_once() -> int:
+    expired_hours = 0
+    for engine in shard_engines.values():
+        with engine.begin() as conn:
+            expired_hours += expire_report_rollups(conn)
+    return expired_hours
@@ -0,0 +1,168 @@
+"""メッセージの編集履歴
+
+編集のたびに、書き換えられる前の本文を message_revisions に1行追記する。
+本文は1つ新しい版から復元するための差分（逆方向の差分）として持ち、
+MESSAGE_REVISION_SNAPSHOT_INTERVAL 版ごとに本文そのものを持つため、
+どの版も最大でその版数分の差分を当てるだけで復元できる。
+履歴は管理者が開いたときにだけ読み、messages 側には何も足さない。
+"""
+import json
+import zlib
+from difflib import SequenceMatcher
+from typing import List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.models.message import Message
+from app.models.message_revision import MessageRevision
+from app.sqlite import begin_write
+
+settings = get_settings()
+
+
+def make_delta(source: str, target: str) -> list:
+    """source から target を作る操作列（[n] はn文字コピー、[-n] はn文字飛ばす、文字列は挿入）"""
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, source, target, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(-(i2 - i1))
+        if j2 > j1:
+            ops.append(target[j1:j2])
+    return ops
+
+
+def apply_delta(source: str, ops: list) -> str:
+    parts = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op >= 0:
+            parts.append(source[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(parts)
+
+
+def _compress(value) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode())
+
+
+def _decompress(payload: bytes):
+    return json.loads(zlib.decompress(payload))
+
+
+def lock_message(db: Session, message: Message) -> None:
+    """メッセージの行をロックして読み直す（同時の編集で版番号・編集前の本文が重ならないよう、編集の前に呼ぶ）"""
+    if db.get_bind().dialect.name == "sqlite":
+        begin_write(db.connection())
+        db.refresh(message)
+    else:
+        db.refresh(message, with_for_update=True)
+
+
+def record_revision(db: Session, message: Message, old_text: str, new_text: str, editor_id: int) -> None:
+    """編集前の本文を履歴に追記（lock_message 済みであること。commitは呼び出し側）"""
+    seq = (
+        db.query(func.max(MessageRevision.seq))
+        .filter(
+            MessageRevision.message_id == message.id,
+            MessageRevision.message_created_at == message.created_at,
+        )
+        .scalar()
+    )
+    seq = 0 if seq is None else seq + 1
+
+    snapshot = _compress(old_text)
+    is_snapshot = seq % settings.MESSAGE_REVISION_SNAPSHOT_INTERVAL == 0
+    payload = snapshot
+    if not is_snapshot:
+        delta = _compress(make_delta(new_text, old_text))
+        # 全面的に書き換えられた場合は本文のほうが小さい
+        if len(delta) < len(snapshot):
+            payload = delta
+        else:
+            is_snapshot = True
+    db.add(MessageRevision(
+        message_id=message.id,
+        message_created_at=message.created_at,
+        seq=seq,
+        is_snapshot=is_snapshot,
+        payload=payload,
+        edited_by=editor_id,
+    ))
+
+
+def load_history(db: Session, message: Message) -> List[dict]:
+    """全版を古い順に返す（最後の要素が現在の本文）"""
+    revisions = (
+        db.query(MessageRevision)
+        .filter(
+            MessageRevision.message_id == message.id,
+            MessageRevision.message_created_at == message.created_at,
+        )
+        .order_by(MessageRevision.seq.desc())
+        .all()
+    )
+    versions = [{"seq": len(revisions), "text": message.text, "edited_by": None, "edited_at": None}]
+    text = message.text
+    for revision in revisions:
+        text = _restore(revision, text)
+        versions.append({
+            "seq": revision.seq,
+            "text": text,
+            "edited_by": revision.edited_by,
+            "edited_at": revision.edited_at,
+        })
+    versions.reverse()
+    return versions
+
+
+def load_version(db: Session, message: Message, seq: int) -> Optional[str]:
+    """指定した版の本文（最寄りの本文保存版から差分を当てるだけで、全履歴は読まない）"""
+    snapshot_seq = (
+        db.query(func.min(MessageRevision.seq))
+        .filter(
+            MessageRevision.message_id == message.id,
+            MessageRevision.message_created_at == message.created_at,
+            MessageRevision.seq >= seq,
+            MessageRevision.is_snapshot.is_(True),
+        )
+        .scalar()
+    )
+    query = db.query(MessageRevision).filter(
+        MessageRevision.message_id == message.id,
+        MessageRevision.message_created_at == message.created_at,
+        MessageRevision.seq >= seq,
+    )
+    if snapshot_seq is not None:
+        query = query.filter(MessageRevision.seq <= snapshot_seq)
+    revisions = query.order_by(MessageRevision.seq.desc()).all()
+    if not revisions:
+        # 最新の版（load_history の最後の要素）は messages の本文そのもの
+        latest_seq = (
+            db.query(func.max(MessageRevision.seq))
+            .filter(
+                MessageRevision.message_id == message.id,
+                MessageRevision.message_created_at == message.created_at,
+            )
+            .scalar()
+        )
+        return message.text if seq == (0 if latest_seq is None else latest_seq + 1) else None
+    if revisions[-1].seq != seq:
+        return None
+    text = message.text
+    for revision in revisions:
+        text = _restore(revision, text)
+    return text
+
+
+def _restore(revision: MessageRevision, newer_text: str) -> str:
+    value = _decompress(revision.payload)
+    if revision.is_snapshot:
+        return value
+    return apply_delta(newer_text, value)
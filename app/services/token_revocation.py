@@ -0,0 +1,153 @@
+"""アクセストークンの失効（ログアウト）
+
+失効したトークンの jti を revoked_tokens に書き込み、各ワーカーはその内容をメモリ上の辞書に写して
+decode_token のたびに辞書だけを引く（リクエストごとのDB問い合わせはしない）。
+- 失効させたワーカーには即座に、他のワーカーには Postgres の NOTIFY で反映する（SQLite では読み直しだけ）
+- 接続断などで NOTIFY を取りこぼしても、TOKEN_REVOCATION_REFRESH_SECONDS ごとの読み直しで追いつく
+トークン自体が ACCESS_TOKEN_EXPIRE_MINUTES で期限切れになるため、期限を過ぎた行は辞書からも表からも消す。
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import delete, func, text
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.database import SessionLocal, engine, upsert_insert
+from app.models.revoked_token import RevokedToken
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 失効を他のワーカーへ知らせる NOTIFY のチャンネル（ペイロードは "jti 有効期限のUNIX時刻"）
+NOTIFY_CHANNEL = "token_revoked"
+
+
+class RevocationList:
+    """失効済み jti → 有効期限のUNIX時刻（ワーカー内）"""
+    
+    def __init__(self):
+        self.expires: Dict[str, float] = {}
+        self.listener = None
+        self.listener_fd: Optional[int] = None
+        self.notifications = 0
+        self.refreshed_at: Optional[float] = None
+    
+    def is_revoked(self, jti: str) -> bool:
+        return jti in self.expires
+    
+    def add(self, jti: str, expires_at: float):
+        if expires_at > time.time():
+            self.expires[jti] = expires_at
+    
+    def prune(self):
+        """期限切れのトークンはそもそも decode_token で弾かれるため忘れてよい"""
+        now = time.time()
+        for jti in [jti for jti, expires_at in self.expires.items() if expires_at <= now]:
+            del self.expires[jti]
+    
+    async def refresh(self):
+        """期限内の失効をすべて読み直す（失効は取り消さないので追加だけでよい）"""
+        rows = await asyncio.to_thread(_load_revocations)
+        for jti, expires_at in rows:
+            self.add(jti, expires_at.timestamp())
+        self.prune()
+        self.refreshed_at = time.monotonic()
+    
+    async def listen(self):
+        """専用の接続で LISTEN し、イベントループで通知を受け取る"""
+        if engine.dialect.name != "postgresql":
+            return
+        if self.listener is not None and not self.listener.closed:
+            return
+        self.listener = await asyncio.to_thread(_open_listener)
+        self.listener_fd = self.listener.fileno()
+        asyncio.get_running_loop().add_reader(self.listener_fd, self._on_readable)
+    
+    def _on_readable(self):
+        conn = self.listener
+        try:
+            conn.poll()
+        except Exception:
+            # 次回の読み直しで接続し直す
+            logger.warning("失効通知の受信接続が切れました", exc_info=True)
+            self.stop_listening()
+            return
+        while conn.notifies:
+            payload = conn.notifies.pop(0).payload
+            jti, _, expires_at = payload.partition(" ")
+            self.add(jti, float(expires_at))
+            self.notifications += 1
+    
+    def stop_listening(self):
+        conn, self.listener = self.listener, None
+        if conn is None:
+            return
+        asyncio.get_running_loop().remove_reader(self.listener_fd)
+        conn.close()
+
+
+def _load_revocations() -> list:
+    db = SessionLocal()
+    try:
+        db.execute(delete(RevokedToken).where(RevokedToken.expires_at < func.now()))
+        rows = db.query(RevokedToken.jti, RevokedToken.expires_at).all()
+        db.commit()
+        return rows
+    finally:
+        db.close()
+
+
+def _open_listener():
+    raw = engine.raw_connection()
+    # プールに返さず、このワーカーの間ずっと使う
+    raw.detach()
+    conn = raw.driver_connection
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+    return conn
+
+
+revoked_tokens = RevocationList()
+
+
+def revoke_token(db: Session, jti: str, user_id: int, expires_at: datetime) -> None:
+    """トークンを失効させ、他のワーカーへ通知する（commitは呼び出し側、NOTIFYはcommit時に届く）"""
+    db.execute(
+        upsert_insert(db, RevokedToken)
+        .values(jti=jti, user_id=user_id, expires_at=expires_at)
+        .on_conflict_do_nothing(index_elements=["jti"])
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": NOTIFY_CHANNEL, "payload": f"{jti} {expires_at.timestamp()}"},
+        )
+    revoked_tokens.add(jti, expires_at.timestamp())
+
+
+async def load_revocations():
+    """起動時に失効リストを読み込む（失敗しても起動は続け、sync_loop で読み直す）"""
+    try:
+        await revoked_tokens.refresh()
+    except Exception:
+        logger.exception("失効リストの読み込みに失敗しました")
+
+
+async def sync_loop():
+    """NOTIFY を待ち受けつつ、TOKEN_REVOCATION_REFRESH_SECONDS ごとに失効リストを読み直す"""
+    try:
+        while True:
+            try:
+                await revoked_tokens.listen()
+            except Exception:
+                logger.exception("失効通知の待ち受けを開始できませんでした")
+            await asyncio.sleep(settings.TOKEN_REVOCATION_REFRESH_SECONDS)
+            try:
+                await revoked_tokens.refresh()
+            except Exception:
+                logger.exception("失効リストの読み直しに失敗しました")
+    finally:
+        revoked_tokens.stop_listening()
@@ -1,48 +1,273 @@
-from typing import Dict, List
+from typing import Dict, List, Optional, Set
 from fastapi import WebSocket
-import json
+import asyncio
+import orjson
+import random
+import time
+from app.config import get_settings
+from app.services.channel_feed import channel_feeds
+
+settings = get_settings()
+
+# 1012: Service Restart（クライアントに再接続を促す）
+CLOSE_CODE_SERVICE_RESTART = 1012
+# 一定時間クライアントから応答が無かった接続を閉じるときのコード
+CLOSE_CODE_IDLE_TIMEOUT = 4008
+
+
+class Connection:
+    """1本のWebSocket接続と購読中のチャンネル"""
+    __slots__ = ("websocket", "user_id", "username", "workspace_id", "channels", "last_seen")
+    
+    def __init__(self, websocket: WebSocket, user_id: int, username: str = "", workspace_id: Optional[int] = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        # 入力中表示に使う（表示名のためにDBを引かない）
+        self.username = username
+        # 購読できるチャンネルの確認に使う
+        self.workspace_id = workspace_id
+        self.channels: Set[int] = set()
+        self.last_seen = time.monotonic()
+    
+    def touch(self):
+        """クライアントからフレームを受信した時刻を記録"""
+        self.last_seen = time.monotonic()
+    
+    def __repr__(self):
+        return f"<Connection(user_id={self.user_id}, channels={len(self.channels)})>"
 
 
 class ConnectionManager:
-    """WebSocket接続マネージャー"""
+    """WebSocket接続マネージャー
+
+    1本の接続で複数チャンネルを購読できる。購読・解除・切断はいずれも
+    dict / set の操作だけで済み、チャンネル内の接続数に比例しない。
+    """
     
     def __init__(self):
-        # channel_id -> list of (user_id, websocket)
-        self.active_connections: Dict[int, List[tuple[int, WebSocket]]] = {}
+        # channel_id -> 購読中の接続
+        self.active_connections: Dict[int, Set[Connection]] = {}
+        # user_id -> そのユーザーの全接続（メンション・モデレーション通知用）
+        self.user_connections: Dict[int, Set[Connection]] = {}
+        self.connections: Dict[WebSocket, Connection] = {}
+        # channel_id -> 合流待ちのイベント（キーがある間はそのチャンネルの合流ウィンドウが開いている）
+        self.pending: Dict[int, List[dict]] = {}
+        # channel_id -> 送信中のフレーム（フレームの順序を保つため前の送信の完了を待つ）
+        self.sending: Dict[int, asyncio.Task] = {}
+        # 購読者が変わり、在席表示を送り直す必要のあるチャンネル
+        self.presence_dirty: Set[int] = set()
+        self.frames_sent = 0
+        self.events_coalesced = 0
     
-    async def connect(self, websocket: WebSocket, channel_id: int, user_id: int):
-        """WebSocket接続を受け入れてチャンネルに参加"""
+    async def accept(
+        self, websocket: WebSocket, user_id: int, username: str = "", workspace_id: Optional[int] = None
+    ) -> Connection:
+        """WebSocket接続を受け入れて登録（チャンネルは未購読）"""
         await websocket.accept()
-        if channel_id not in self.active_connections:
-            self.active_connections[channel_id] = []
-        self.active_connections[channel_id].append((user_id, websocket))
+        conn = Connection(websocket, user_id, username, workspace_id)
+        self.connections[websocket] = conn
+        self.user_connections.setdefault(user_id, set()).add(conn)
+        return conn
     
-    def disconnect(self, websocket: WebSocket, channel_id: int, user_id: int):
-        """WebSocket接続を切断"""
-        if channel_id in self.active_connections:
-            self.active_connections[channel_id] = [
-                (uid, ws) for uid, ws in self.active_connections[channel_id]
-                if ws != websocket
-            ]
-            if not self.active_connections[channel_id]:
+    def subscribe(self, conn: Connection, channel_id: int) -> bool:
+        """チャンネルを購読（上限を超える場合はFalse）"""
+        if channel_id in conn.channels:
+            return True
+        if len(conn.channels) >= settings.WS_MAX_SUBSCRIPTIONS:
+            return False
+        conn.channels.add(channel_id)
+        self.active_connections.setdefault(channel_id, set()).add(conn)
+        self.presence_dirty.add(channel_id)
+        return True
+    
+    def unsubscribe(self, conn: Connection, channel_id: int):
+        """チャンネルの購読を解除"""
+        conn.channels.discard(channel_id)
+        subscribers = self.active_connections.get(channel_id)
+        if subscribers is not None:
+            subscribers.discard(conn)
+            self.presence_dirty.add(channel_id)
+            if not subscribers:
                 del self.active_connections[channel_id]
     
+    def remove(self, conn: Connection):
+        """接続を登録解除し、全購読を外す"""
+        for channel_id in list(conn.channels):
+            self.unsubscribe(conn, channel_id)
+        self.connections.pop(conn.websocket, None)
+        user_conns = self.user_connections.get(conn.user_id)
+        if user_conns is not None:
+            user_conns.discard(conn)
+            if not user_conns:
+                del self.user_connections[conn.user_id]
+    
+    async def connect(
+        self,
+        websocket: WebSocket,
+        channel_id: int,
+        user_id: int,
+        username: str = "",
+        workspace_id: Optional[int] = None,
+    ) -> Connection:
+        """WebSocket接続を受け入れてチャンネルに参加"""
+        conn = await self.accept(websocket, user_id, username, workspace_id)
+        self.subscribe(conn, channel_id)
+        return conn
+    
+    def disconnect(self, websocket: WebSocket, channel_id: int = None, user_id: int = None):
+        """WebSocket接続を切断"""
+        conn = self.connections.get(websocket)
+        if conn is not None:
+            self.remove(conn)
+    
+    async def _send(self, conns, message):
+        # 受信者ごとではなくフレームごとに1回だけエンコードする
+        frame = orjson.dumps(message).decode()
+        self.frames_sent += len(conns)
+        disconnected = []
+        for conn in conns:
+            try:
+                await conn.websocket.send_text(frame)
+            except Exception:
+                disconnected.append(conn)
+        # 失敗した接続を削除
+        for conn in disconnected:
+            self.remove(conn)
+    
     async def broadcast_to_channel(self, channel_id: int, message: dict):
         """チャンネル内のすべての接続にメッセージを送信"""
-        if channel_id in self.active_connections:
-            disconnected = []
-            for user_id, websocket in self.active_connections[channel_id]:
-                try:
-                    await websocket.send_json(message)
-                except Exception:
-                    disconnected.append((user_id, websocket))
-            # 失敗した接続を削除
-            for uid, ws in disconnected:
-                self.disconnect(ws, channel_id, uid)
+        # 複数チャンネルを購読する接続が振り分けられるよう channel_id を付ける
+        payload = {"channel_id": channel_id, **message}
+        # 閲覧専用（SSE）の購読者にも同じイベントを流す
+        channel_feeds.publish(channel_id, payload)
+        if settings.WS_COALESCE_WINDOW_MS <= 0:
+            await self._send_to_channel(channel_id, payload)
+            return
+        
+        if channel_id not in self.active_connections:
+            return
+        pending = self.pending.get(channel_id)
+        if pending is not None:
+            # 直前に送ったばかりのチャンネルはウィンドウの終わりにまとめて送る
+            pending.append(payload)
+            self.events_coalesced += 1
+            return
+        # 静かなチャンネルは待たずに送り、以降ウィンドウの間に届いたイベントを合流させる
+        self._open_window(channel_id)
+        await self._dispatch(channel_id, payload)
+    
+    def _open_window(self, channel_id: int):
+        self.pending[channel_id] = []
+        asyncio.get_running_loop().call_later(
+            settings.WS_COALESCE_WINDOW_MS / 1000, self._close_window, channel_id
+        )
+    
+    def _close_window(self, channel_id: int):
+        """ウィンドウ中に届いたイベントを1つの配列フレームで送る（無ければウィンドウを閉じる）"""
+        pending = self.pending.pop(channel_id, None)
+        if pending:
+            self._open_window(channel_id)
+            self._dispatch(channel_id, pending)
+    
+    def _dispatch(self, channel_id: int, message) -> asyncio.Task:
+        """チャンネルへの送信を、同じチャンネルの前の送信の後ろに並べる"""
+        previous = self.sending.get(channel_id)
+        task = asyncio.create_task(self._send_after(previous, channel_id, message))
+        self.sending[channel_id] = task
+        
+        def done(_):
+            if self.sending.get(channel_id) is task:
+                del self.sending[channel_id]
+        
+        task.add_done_callback(done)
+        return task
+    
+    async def _send_after(self, previous, channel_id: int, message):
+        if previous is not None:
+            await asyncio.wait([previous])
+        await self._send_to_channel(channel_id, message)
+    
+    async def _send_to_channel(self, channel_id: int, message):
+        subscribers = self.active_connections.get(channel_id)
+        if subscribers:
+            await self._send(list(subscribers), message)
+    
+    async def send_ephemeral(self, channel_id: int, message: dict) -> int:
+        """SSEのバッファや合流を通さずに送り、送った接続数を返す
+
+        在席表示のように、取りこぼしても次の送信で上書きされるイベント用。
+        """
+        subscribers = self.active_connections.get(channel_id)
+        if not subscribers:
+            return 0
+        await self._send(list(subscribers), message)
+        return len(subscribers)
+    
+    async def send_to_user(self, user_id: int, message: dict):
+        """特定ユーザーの全接続にメッセージを送信"""
+        conns = self.user_connections.get(user_id)
+        if conns:
+            await self._send(list(conns), message)
+    
+    async def heartbeat(self):
+        """定期的に全接続へpingを送り、応答の途絶えた接続を配信対象から外す
+
+        クライアントはpingにpongを返す。half-openの接続は送信が成功してしまうため、
+        受信側のタイムアウト（WS_IDLE_TIMEOUT_SECONDS）と最終受信時刻で判定する。
+        """
+        while True:
+            await asyncio.sleep(settings.WS_PING_INTERVAL_SECONDS)
+            deadline = time.monotonic() - settings.WS_IDLE_TIMEOUT_SECONDS
+            alive = []
+            for conn in list(self.connections.values()):
+                if conn.last_seen < deadline:
+                    self.remove(conn)
+                    asyncio.create_task(self._close_quietly(conn, CLOSE_CODE_IDLE_TIMEOUT))
+                else:
+                    alive.append(conn)
+            await self._send(alive, {"type": "ping"})
+            channel_feeds.keepalive()
+    
+    async def _close_quietly(self, conn: Connection, code: int):
+        try:
+            await asyncio.wait_for(conn.websocket.close(code=code), timeout=settings.WS_DRAIN_TIMEOUT_SECONDS)
+        except Exception:
+            pass
+    
+    async def drain(self):
+        """シャットダウン前に全接続へ再接続待ち時間を通知して切断する"""
+        channel_feeds.close()
+        connections = list(self.connections.values())
+        self.active_connections = {}
+        self.user_connections = {}
+        self.connections = {}
+        self.pending = {}
+        self.presence_dirty = set()
+        if not connections:
+            return
+
+        async def close_one(conn: Connection):
+            try:
+                # 再接続が一斉に起きないよう、接続ごとに待ち時間をばらつかせる
+                await conn.websocket.send_json({
+                    "type": "server_shutdown",
+                    "retry_after_ms": random.randint(0, settings.WS_RECONNECT_JITTER_MS),
+                })
+                await conn.websocket.close(code=CLOSE_CODE_SERVICE_RESTART)
+            except Exception:
+                pass
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(close_one(conn) for conn in connections)),
+                timeout=settings.WS_DRAIN_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            pass
     
     def get_channel_user_count(self, channel_id: int) -> int:
         """チャンネル内の接続数を取得"""
-        return len(self.active_connections.get(channel_id, []))
+        return len(self.active_connections.get(channel_id, ()))
 
 
 # シングルトンインスタンス
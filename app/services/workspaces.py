@@ -0,0 +1,210 @@
+"""ワークスペースとシャードの対応
+
+各ワークスペース（組織）のユーザー・チャンネル・メッセージは、いずれか1つのシャード（Postgres）にまとめて置く。
+ワークスペース → シャードの対応表は default シャードの workspaces にあり、各ワーカーは
+WORKSPACE_MAP_TTL_SECONDS ごとに読み直した写しで振り分ける（リクエストごとには読まない）。
+
+リクエストのワークスペースは、トークンの ws クレーム（ログイン後）、X-Workspace ヘッダー・
+workspace Cookie・?workspace=（ログイン前、スラッグで指定）の順で決める。どれも無ければ既定のワークスペース。
+振り分けには署名を検証していないクレームを使うが、認証時に検証済みのクレームとユーザーの所属を照合する。
+"""
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from starlette.requests import HTTPConnection
+from app.config import get_settings
+from app.database import SessionLocal, shard_engines
+from app.models.workspace import Workspace
+
+settings = get_settings()
+
+DEFAULT_WORKSPACE_ID = 1
+DEFAULT_WORKSPACE_SLUG = "default"
+WORKSPACE_HEADER = "X-Workspace"
+WORKSPACE_COOKIE = "workspace"
+# 移動中（書き込み停止中）の状態
+STATE_READONLY = "readonly"
+# 対応表に無いワークスペースで読み直す最短間隔（存在しないIDで対応表を引き続けないため）
+MISS_REFRESH_INTERVAL_SECONDS = 1.0
+
+
+class ShardMap:
+    """ワークスペース → (シャード名, 状態) の写し"""
+    
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.entries: Dict[int, Tuple[str, str]] = {}
+        self.slugs: Dict[str, int] = {}
+        self.loaded_at: Optional[float] = None
+        self.lock = threading.Lock()
+    
+    def refresh(self):
+        db = SessionLocal()
+        try:
+            rows = db.query(Workspace.id, Workspace.slug, Workspace.shard, Workspace.state).all()
+        finally:
+            db.close()
+        self.entries = {row.id: (row.shard, row.state) for row in rows}
+        self.slugs = {row.slug: row.id for row in rows}
+        self.loaded_at = time.monotonic()
+    
+    def _refresh_if_older_than(self, max_age: float):
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at <= max_age:
+            return
+        # 依存関係はスレッドプールで解決されるため、同時に期限切れを見たスレッドのうち1つだけが読み直す
+        with self.lock:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at > max_age:
+                self.refresh()
+    
+    def lookup(self, workspace_id: int) -> Optional[Tuple[str, str]]:
+        self._refresh_if_older_than(self.ttl_seconds)
+        if workspace_id not in self.entries:
+            self._refresh_if_older_than(MISS_REFRESH_INTERVAL_SECONDS)
+        return self.entries.get(workspace_id)
+    
+    def id_for_slug(self, slug: str) -> Optional[int]:
+        self._refresh_if_older_than(self.ttl_seconds)
+        if slug not in self.slugs:
+            self._refresh_if_older_than(MISS_REFRESH_INTERVAL_SECONDS)
+        return self.slugs.get(slug)
+
+
+shard_map = ShardMap(settings.WORKSPACE_MAP_TTL_SECONDS)
+
+
+def _request_token(connection: HTTPConnection) -> Optional[str]:
+    authorization = connection.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:]
+    token = connection.cookies.get("access_token")
+    if token and token.startswith("Bearer "):
+        token = token[7:]
+    return token or connection.query_params.get("token")
+
+
+def request_workspace_id(connection: HTTPConnection) -> int:
+    """リクエストのワークスペースID（同じリクエスト内では1回だけ決める）"""
+    workspace_id = getattr(connection.state, "workspace_id", None)
+    if workspace_id is not None:
+        return workspace_id
+
+    token = _request_token(connection)
+    if token:
+        try:
+            workspace_id = jwt.get_unverified_claims(token).get("ws")
+        except JWTError:
+            workspace_id = None
+    if not isinstance(workspace_id, int):
+        slug = (
+            connection.headers.get(WORKSPACE_HEADER)
+            or connection.cookies.get(WORKSPACE_COOKIE)
+            or connection.query_params.get("workspace")
+        )
+        if slug and slug != DEFAULT_WORKSPACE_SLUG:
+            workspace_id = shard_map.id_for_slug(slug)
+            if workspace_id is None:
+                raise HTTPException(status_code=404, detail="ワークスペースが見つかりません")
+        else:
+            workspace_id = DEFAULT_WORKSPACE_ID
+    connection.state.workspace_id = workspace_id
+    return workspace_id
+
+
+def resolve_shard(connection: HTTPConnection, write: bool = False) -> str:
+    """リクエストのワークスペースが置かれたシャード名
+
+    移動中のワークスペースへの書き込み系リクエスト（GET/HEAD以外）は 503 で断る。
+    """
+    entry = shard_map.lookup(request_workspace_id(connection))
+    if entry is None:
+        raise HTTPException(status_code=404, detail="ワークスペースが見つかりません")
+    shard, state = entry
+    if (
+        write
+        and state == STATE_READONLY
+        and connection.scope["type"] == "http"
+        and connection.scope["method"] not in ("GET", "HEAD")
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="ワークスペースを移動中です。しばらくしてから再度お試しください",
+            headers={"Retry-After": str(max(1, round(settings.WORKSPACE_MAP_TTL_SECONDS)))},
+        )
+    if shard not in shard_engines:
+        raise HTTPException(status_code=503, detail=f"シャード {shard} が設定されていません")
+    return shard
+
+
+def align_id_sequences(connections: Dict[str, Connection]) -> None:
+    """全シャードの連番を SHARD_ID_STRIDE 間隔・シャードごとに異なる余りで採番するよう揃える
+
+    connections は shard_engines と同じ順（default、DATABASE_SHARDS の順）で渡す。i 番目のシャードの連番は
+    i (mod SHARD_ID_STRIDE) の値だけを返すため、ワークスペースを別のシャードへ移してもIDはそのまま使え、
+    WebSocketのチャンネルIDなどもシャードをまたいで重ならない。
+    既存の行と重ならないよう、全シャードの現在値の最大より上から採番し直す（揃え済みなら何もしない）。
+    """
+    stride = settings.SHARD_ID_STRIDE
+    names = list(connections)
+    if len(names) > stride:
+        raise ValueError(f"シャード数が SHARD_ID_STRIDE（{stride}）を超えています")
+    sequences_sql = text(
+        "SELECT schemaname || '.' || sequencename, increment_by, coalesce(last_value, 0) FROM pg_sequences"
+    )
+    state = {name: {row[0]: (row[1], row[2]) for row in connections[name].execute(sequences_sql)} for name in names}
+    for sequence in sorted(set().union(*(seqs.keys() for seqs in state.values()))):
+        current = [state[name].get(sequence) for name in names]
+        if all(
+            value is not None and value[0] == stride and value[1] % stride == index
+            for index, value in enumerate(current)
+        ):
+            continue
+        top = max(value[1] for value in current if value is not None)
+        base = (top // stride + 1) * stride
+        for index, name in enumerate(names):
+            if state[name].get(sequence) is None:
+                continue
+            connections[name].execute(text(
+                f"ALTER SEQUENCE {sequence} INCREMENT BY {stride} RESTART WITH {base + index + stride}"
+            ))
+
+
+def next_id_above(next_value: int, floor: int, stride: int) -> int:
+    """next_value と同じ余り（mod stride）で floor より大きい最小の値（next_value の方が大きければ next_value）"""
+    value = floor + (next_value - floor) % stride
+    if value <= floor:
+        value += stride
+    return max(value, next_value)
+
+
+def advance_id_sequences(conn: Connection, tables: Sequence[str]) -> None:
+    """tables の id の連番を、表にある最大のIDより先へ進める（シャードごとの余りは保つ）
+
+    別のシャードからコピーした行は移動元の連番で採番されているため、そのままでは移動先の連番が
+    コピーしたIDより小さい値を返し、ID が増える順に並ぶ前提（既読位置など）が崩れる。
+    """
+    for table in tables:
+        floor = conn.execute(text(f"SELECT max(id) FROM {table}")).scalar()
+        if floor is None:
+            continue
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar()
+        stride = conn.execute(
+            text("SELECT increment_by FROM pg_sequences WHERE schemaname || '.' || sequencename = :name"),
+            {"name": sequence},
+        ).scalar()
+        last_value, is_called = conn.execute(text(f"SELECT last_value, is_called FROM {sequence}")).one()
+        next_value = last_value + stride if is_called else last_value
+        value = next_id_above(next_value, floor, stride)
+        if value == next_value:
+            continue
+        # 読んでから進めるまでに他の採番で追い越されていれば戻さない
+        conn.execute(
+            text(
+                f"SELECT setval(:name, :value, false) FROM {sequence} "
+                "WHERE :value > CASE WHEN is_called THEN last_value + :stride ELSE last_value END"
+            ),
+            {"name": sequence, "value": value, "stride": stride},
+        )
@@ -0,0 +1,248 @@
+"""SQLite（WAL）で動かすための設定
+
+DATABASE_URL が sqlite:// で始まるとき database.py から使う。小規模な1コンテナ構成と、
+DBサーバーなしのテスト・ベンチマーク向け（sqlite:// だけならメモリ上のDBを全セッションで共有する）。
+- 接続ごとに WAL・synchronous=NORMAL などの PRAGMA を設定する
+- 書き込みはワーカー内のキューで1本ずつ通す。読み取りはトランザクションを張らずに1文ずつ実行し、
+  最初の書き込み文の直前でキューに並んでから BEGIN IMMEDIATE する（WAL では書き込み中も読める）。
+  書き込み同士が SQLite のロックを取り合って "database is locked" になることがない
+- 書き込みトランザクションはそれを始めたチェックアウト（セッション）のものとし、commit / rollback も
+  そのチェックアウトからのものだけを通す。sqlite:// では全セッションが1本の接続を共有するため、
+  他のセッションの書き込みに相乗りしたり、他のセッションの commit / rollback で確定・破棄されたりしない
+  （ただし書き込み中のセッションが確定前の行は、同じ接続の他のセッションからも見える）
+- 日時はUTCの文字列で保存し、読み出すときにタイムゾーン付きに戻す（Postgres の timestamptz と同じ扱い）
+パーティション・LISTEN/NOTIFY・シャード・RATE_LIMIT_BACKEND=postgres は Postgres でしか使えない。
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.dialects.sqlite import DATETIME
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql import functions, sqltypes
+from app.config import get_settings
+
+settings = get_settings()
+
+# 書き込みトランザクションを始めない文
+_READ_ONLY_PREFIXES = ("SELECT", "PRAGMA", "EXPLAIN")
+
+
+def is_sqlite_url(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+class WriteQueue:
+    """ワーカー内の書き込みトランザクションを1本ずつ通す
+
+    スレッドプールとイベントループのどちらから書き込んでも、SQLite のロックではなくここで順番を待つ。
+    書き込みトランザクションの途中で await しないこと（同じイベントループの書き込みが待ち続ける）。
+    """
+    
+    def __init__(self, timeout_seconds: float):
+        self.timeout_seconds = timeout_seconds
+        self.lock = threading.Lock()
+        self.transactions = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+    
+    def acquire(self):
+        if self.lock.acquire(blocking=False):
+            self.transactions += 1
+            return
+        started = time.perf_counter()
+        if not self.lock.acquire(timeout=self.timeout_seconds):
+            self.timeouts += 1
+            raise sqlite3.OperationalError("database is locked (write queue timeout)")
+        self.transactions += 1
+        self.waited += 1
+        self.wait_seconds += time.perf_counter() - started
+    
+    def release(self):
+        self.lock.release()
+    
+    def metrics(self) -> dict:
+        return {
+            "transactions": self.transactions,
+            "waited": self.waited,
+            "wait_ms_total": round(self.wait_seconds * 1000, 1),
+            "timeouts": self.timeouts,
+        }
+
+
+write_queue = WriteQueue(settings.SQLITE_BUSY_TIMEOUT_MS / 1000)
+
+
+class QueuedConnection(sqlite3.Connection):
+    """書き込みトランザクションを始めたチェックアウトを覚えておき、その終了で書き込みキューを解放する接続"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 書き込みトランザクション中のチェックアウト（プールが貸し出した接続のプロキシ）
+        self.write_owner = None
+    
+    def begin_write(self, owner):
+        """owner の書き込みトランザクションを始める（owner が始め済みなら何もしない）
+
+        他のチェックアウトが書き込み中なら、その commit / rollback までキューで待つ。
+        """
+        if self.write_owner is owner:
+            return
+        write_queue.acquire()
+        try:
+            super().execute("BEGIN IMMEDIATE")
+        except BaseException:
+            write_queue.release()
+            raise
+        self.write_owner = owner
+    
+    def end_write(self, owner, commit: bool):
+        """owner の書き込みトランザクションを確定・破棄する
+
+        読み取りだけのチェックアウトや、他のチェックアウトの書き込み中に呼ばれたときは何もしない。
+        """
+        if self.write_owner is not owner:
+            return
+        try:
+            if commit:
+                super().commit()
+            else:
+                super().rollback()
+        finally:
+            self._release()
+    
+    def _release(self):
+        if self.write_owner is not None:
+            self.write_owner = None
+            write_queue.release()
+    
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._release()
+
+
+class AwareDateTime(DATETIME):
+    """UTCの文字列で保存し、タイムゾーン付きの datetime で返す"""
+    
+    def bind_processor(self, dialect):
+        process = super().bind_processor(dialect)
+
+        def to_utc(value):
+            if isinstance(value, datetime) and value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return process(value)
+        return to_utc
+    
+    def result_processor(self, dialect, coltype):
+        process = super().result_processor(dialect, coltype)
+
+        def to_aware(value):
+            value = process(value)
+            if isinstance(value, datetime):
+                value = value.replace(tzinfo=timezone.utc)
+            return value
+        return to_aware
+
+
+# Postgres 向けに書いた関数を SQLite で同じ意味に読み替える
+class greatest(functions.GenericFunction):
+    inherit_cache = True
+
+
+class least(functions.GenericFunction):
+    inherit_cache = True
+
+
+@compiles(greatest, "sqlite")
+def _compile_greatest(element, compiler, **kw):
+    return f"max({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(least, "sqlite")
+def _compile_least(element, compiler, **kw):
+    return f"min({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(functions.now, "sqlite")
+def _compile_now(element, compiler, **kw):
+    # AwareDateTime と同じ形式（マイクロ秒6桁）にそろえ、文字列のまま比較・並べ替えできるようにする
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+def _on_connect(dbapi_connection, connection_record):
+    # トランザクションは QueuedConnection.begin_write で明示的に始める
+    dbapi_connection.isolation_level = None
+    for pragma in (
+        "journal_mode = WAL",
+        "synchronous = NORMAL",
+        "foreign_keys = ON",
+        f"busy_timeout = {settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"cache_size = -{settings.SQLITE_CACHE_SIZE_KB}",
+        "temp_store = MEMORY",
+        f"mmap_size = {settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+    ):
+        dbapi_connection.execute(f"PRAGMA {pragma}")
+
+
+# conn.connection はプールのチェックアウト（セッションのトランザクションの間は同じもの）。
+# SQLAlchemy の commit / rollback とプールへの返却時の rollback は、どれもこのチェックアウトを
+# dialect.do_commit / do_rollback に渡すため、書き込みの持ち主をチェックアウト単位で判定できる
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not statement.lstrip()[:7].upper().startswith(_READ_ONLY_PREFIXES):
+        conn.connection.dbapi_connection.begin_write(conn.connection)
+
+
+def _do_commit(checkout):
+    checkout.dbapi_connection.end_write(checkout, commit=True)
+
+
+def _do_rollback(checkout):
+    checkout.dbapi_connection.end_write(checkout, commit=False)
+
+
+def begin_write(conn: Connection) -> None:
+    """読み取りから始める処理を、他の書き込みと重ならないよう書き込みトランザクションで包む
+
+    Postgres の SELECT ... FOR UPDATE の代わり。Postgres の接続では何もしない。
+    """
+    if conn.dialect.name == "sqlite":
+        conn.connection.dbapi_connection.begin_write(conn.connection)
+
+
+def create_sqlite_engine(url: str) -> Engine:
+    connect_args = {"check_same_thread": False, "factory": QueuedConnection}
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # メモリ上のDBは接続ごとに別物になるため、1本の接続を全セッションで共有する
+        engine = create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+    else:
+        engine = create_engine(
+            url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            connect_args=connect_args,
+        )
+    engine.dialect.colspecs = {**engine.dialect.colspecs, sqltypes.DateTime: AwareDateTime}
+    engine.dialect.do_commit = _do_commit
+    engine.dialect.do_rollback = _do_rollback
+    event.listen(engine, "connect", _on_connect)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    return engine
+
+
+def create_schema(conn: Connection) -> None:
+    """モデルからテーブルを作り、既定のワークスペースと通報集計の watermark を登録する（マイグレーションの代わり、何度呼んでもよい）"""
+    from app.database import Base
+    from app.models import Workspace
+    from app.services.report_rollups import init_rollup_watermarks
+    Base.metadata.create_all(conn)
+    if conn.execute(select(Workspace.id).where(Workspace.id == 1)).first() is None:
+        conn.execute(Workspace.__table__.insert().values(id=1, slug="default", name="default"))
+    init_rollup_watermarks(conn)
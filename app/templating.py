@@ -0,0 +1,49 @@
+import hashlib
+from pathlib import Path
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+from app.assets import static_url
+from app.config import get_settings
+
+settings = get_settings()
+
+BASE_DIR = Path(__file__).resolve().parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+
+
+def _create_templates() -> Jinja2Templates:
+    """アプリ全体で共有するJinja2テンプレート環境を生成"""
+    if settings.is_production:
+        # 本番ではテンプレートの更新チェックを止め、コンパイル結果をディスクに残す
+        cache_dir = Path(settings.TEMPLATE_CACHE_DIR)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        return Jinja2Templates(
+            directory=TEMPLATES_DIR,
+            auto_reload=False,
+            bytecode_cache=FileSystemBytecodeCache(str(cache_dir)),
+            cache_size=-1,
+        )
+    return Jinja2Templates(directory=TEMPLATES_DIR)
+
+
+def _templates_version() -> str:
+    """テンプレート一式の内容のハッシュ（デプロイでHTMLが変わったら ETag も変わるように）"""
+    digest = hashlib.sha256()
+    for path in sorted(TEMPLATES_DIR.rglob("*.html")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:8]
+
+
+# シングルトンインスタンス
+templates = _create_templates()
+templates.env.globals["static_url"] = static_url
+TEMPLATES_VERSION = _templates_version()
+
+
+def warm_up_templates() -> int:
+    """全テンプレートを事前コンパイルし、コンパイルした数を返す"""
+    env = templates.env
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
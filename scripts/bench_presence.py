@@ -0,0 +1,89 @@
+"""在席・入力中表示の配信フレーム数のベンチマーク
+
+    python scripts/bench_presence.py --members 1000 --typers 50 --keystrokes-per-second 5 --seconds 60
+
+1チャンネルに --members 人が接続し、そのうち --typers 人が毎秒 --keystrokes-per-second 回
+入力通知を送り続ける状況を、時計を進めながら PresenceTracker で再現する。
+キー入力ごとに全員へ配信した場合のフレーム数と、定期配信のフレーム数・所要時間を出力する。
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import get_settings  # noqa: E402
+from app.services.presence import PresenceTracker  # noqa: E402
+from app.services.websocket_manager import ConnectionManager  # noqa: E402
+
+settings = get_settings()
+
+
+class FakeWebSocket:
+    """accept / send_text だけを持つダミー接続"""
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        pass
+
+
+async def bench(args):
+    manager = ConnectionManager()
+    tracker = PresenceTracker(manager)
+    channel_id = 1
+    for user_id in range(args.members):
+        conn = await manager.accept(FakeWebSocket(), user_id, f"user{user_id}")
+        manager.subscribe(conn, channel_id)
+    await tracker.tick(now=0.0)
+    manager.frames_sent = 0
+
+    rng = random.Random(0)
+    typers = rng.sample(range(args.members), args.typers)
+    step = 1.0 / args.keystrokes_per_second
+    interval = settings.PRESENCE_SNAPSHOT_INTERVAL_SECONDS
+    next_tick = interval
+    keystrokes = 0
+    started = time.perf_counter()
+    now = 0.0
+    while now < args.seconds:
+        for user_id in typers:
+            # 入力と休止を繰り返す（休止が長いと入力中表示が期限切れになる）
+            if rng.random() < args.active_ratio:
+                tracker.start_typing(channel_id, user_id, now=now)
+                keystrokes += 1
+        now += step
+        if now >= next_tick:
+            await tracker.tick(now=now)
+            next_tick += interval
+    elapsed = time.perf_counter() - started
+    return keystrokes, manager.frames_sent, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--typers", type=int, default=50)
+    parser.add_argument("--keystrokes-per-second", type=float, default=5.0)
+    parser.add_argument("--active-ratio", type=float, default=0.5, help="各刻みで入力している確率")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    args = parser.parse_args()
+
+    keystrokes, frames, elapsed = asyncio.run(bench(args))
+    per_minute = 60.0 / args.seconds
+    print(
+        f"members={args.members} typers={args.typers} seconds={args.seconds:g} "
+        f"interval={settings.PRESENCE_SNAPSHOT_INTERVAL_SECONDS:g}s"
+    )
+    print(f"keystrokes:          {keystrokes}")
+    print(f"per-keystroke fanout: {keystrokes * args.members * per_minute:,.0f} frames/min")
+    print(f"presence snapshots:   {frames * per_minute:,.0f} frames/min ({elapsed * 1000:.1f}ms CPU)")
+
+
+if __name__ == "__main__":
+    main()
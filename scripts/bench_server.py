@@ -0,0 +1,127 @@
+"""サーバーの起動時間と定常RPSを計測するベンチマーク
+
+    python scripts/bench_server.py --mode development
+    python scripts/bench_server.py --mode production --workers 4 --path /auth/login
+
+指定モードで `python -m app.server` を起動し、/health が応答するまでの時間（コールドスタート）と、
+キープアライブ接続を並列に張って一定時間リクエストし続けたときのRPSを出力する。
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+
+
+async def fetch_status(host: str, port: int, path: str) -> int:
+    """1回だけGETしてステータスコードを返す"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def wait_until_ready(host: str, port: int, timeout: float) -> float:
+    """/health が200を返すまでの秒数を返す"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if await fetch_status(host, port, "/health") == 200:
+                return time.perf_counter() - started
+        except (OSError, IndexError, ValueError):
+            pass
+        await asyncio.sleep(0.02)
+    raise TimeoutError("サーバーが起動しませんでした")
+
+
+async def read_response(reader: asyncio.StreamReader) -> None:
+    """HTTP/1.1レスポンスを1件読み捨てる"""
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value.strip())
+        elif name == "transfer-encoding" and "chunked" in value:
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+
+
+async def client(host: str, port: int, path: str, deadline: float) -> int:
+    """キープアライブ接続で期限までリクエストを繰り返し、完了数を返す"""
+    reader, writer = await asyncio.open_connection(host, port)
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+    done = 0
+    try:
+        while time.perf_counter() < deadline:
+            writer.write(request)
+            await writer.drain()
+            await reader.readline()
+            await read_response(reader)
+            done += 1
+    finally:
+        writer.close()
+    return done
+
+
+async def measure_rps(host: str, port: int, path: str, concurrency: int, duration: float) -> float:
+    deadline = time.perf_counter() + duration
+    results = await asyncio.gather(
+        *(client(host, port, path, deadline) for _ in range(concurrency))
+    )
+    return sum(results) / duration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["development", "production"], default="production")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        SERVER_MODE=args.mode,
+        WEB_CONCURRENCY=str(args.workers),
+        HOST="127.0.0.1",
+        PORT=str(args.port),
+    )
+    proc = subprocess.Popen([sys.executable, "-m", "app.server"], cwd=ROOT_DIR, env=env)
+    try:
+        cold_start = asyncio.run(wait_until_ready("127.0.0.1", args.port, timeout=60))
+        rps = asyncio.run(
+            measure_rps("127.0.0.1", args.port, args.path, args.concurrency, args.duration)
+        )
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    print(f"mode={args.mode} workers={args.workers if args.mode == 'production' else 1}")
+    print(f"cold_start={cold_start * 1000:.0f}ms")
+    print(f"rps={rps:.0f} path={args.path} concurrency={args.concurrency}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""閲覧専用接続のメモリ・CPU比較（SSE と WebSocket）
+
+    python scripts/bench_sse_memory.py --connections 5000 --events 200
+
+アプリと同じ ConnectionManager / ChannelFeedHub を載せた計測用サーバーを別プロセスの uvicorn で起動し、
+1チャンネルに --connections 本の SSE 接続、または WebSocket 接続を張ったときのサーバーの RSS 増加量と、
+--events 件のブロードキャストにかかったサーバーの CPU 時間を出力する。
+認証・DB は使わないため、接続そのものにかかるコストだけを比べられる。Linux（/proc）専用。
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+CHANNEL_ID = 1
+
+
+def run_server(port: int) -> None:
+    import uvicorn
+    from fastapi import FastAPI, WebSocket
+    from fastapi.responses import StreamingResponse
+    from app.routers.messages import receive_loop
+    from app.services.channel_feed import channel_feeds
+    from app.services.websocket_manager import manager
+
+    app = FastAPI()
+
+    @app.get("/sse")
+    async def sse():
+        return StreamingResponse(channel_feeds.stream(CHANNEL_ID), media_type="text/event-stream")
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        conn = await manager.connect(websocket, CHANNEL_ID, 0)
+        await receive_loop(None, conn)
+
+    @app.post("/publish")
+    async def publish():
+        await manager.broadcast_to_channel(CHANNEL_ID, {"type": "new_message", "message_id": 1})
+        return {"ok": True}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", ws_ping_interval=None)
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def open_sse(port: int):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /sse HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n")
+    await writer.drain()
+    await reader.readuntil(b"\r\n\r\n")
+    return reader, writer
+
+
+async def drain_sse(conn):
+    reader, _ = conn
+    while True:
+        if not await reader.read(65536):
+            return
+
+
+async def open_ws(port: int):
+    import websockets
+    return await websockets.connect(f"ws://127.0.0.1:{port}/ws", ping_interval=None)
+
+
+async def drain_ws(ws):
+    async for _ in ws:
+        pass
+
+
+async def publish(port: int, count: int) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for _ in range(count):
+        writer.write(b"POST /publish HTTP/1.1\r\nHost: localhost\r\nContent-Length: 0\r\n\r\n")
+        await writer.drain()
+        await reader.readuntil(b'{"ok":true}')
+    writer.close()
+
+
+async def wait_until_ready(port: int) -> None:
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        return
+    raise RuntimeError("計測用サーバーが起動しませんでした")
+
+
+async def measure(kind: str, args, port: int, pid: int) -> None:
+    opener, drainer = (open_sse, drain_sse) if kind == "sse" else (open_ws, drain_ws)
+    await wait_until_ready(port)
+    await asyncio.sleep(0.5)
+    before = rss_bytes(pid)
+    conns = []
+    for start in range(0, args.connections, 500):
+        batch = min(500, args.connections - start)
+        conns += await asyncio.gather(*(opener(port) for _ in range(batch)))
+    await asyncio.sleep(1.0)
+    per_conn = (rss_bytes(pid) - before) / args.connections
+
+    readers = [asyncio.create_task(drainer(conn)) for conn in conns]
+    cpu_before = cpu_seconds(pid)
+    started = time.perf_counter()
+    await publish(port, args.events)
+    elapsed = time.perf_counter() - started
+    cpu_per_event = (cpu_seconds(pid) - cpu_before) / args.events
+
+    print(
+        f"{kind:>9}: {per_conn / 1024:.1f} KiB/conn ({(1 << 30) / per_conn:,.0f} conns/GiB), "
+        f"{cpu_per_event * 1e3:.2f} ms server CPU per broadcast, {elapsed / args.events * 1e3:.2f} ms wall"
+    )
+    for task in readers:
+        task.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for offset, kind in enumerate(("sse", "websocket")):
+        # 前の計測の接続が残らないよう、方式ごとにサーバーを起動し直す
+        port = args.port + offset
+        server = multiprocessing.Process(target=run_server, args=(port,), daemon=True)
+        server.start()
+        try:
+            asyncio.run(measure(kind, args, port, server.pid))
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""WebSocket接続の接続・切断チャーンのベンチマーク
+
+    python scripts/bench_ws_churn.py --subscriptions 50000 --channels 500 --per-connection 10
+
+ConnectionManager に合計 --subscriptions 件の購読を張った状態で、
+ランダムな接続の切断 → 再接続（同数のチャンネルを購読）を繰り返し、1回あたりの所要時間を出力する。
+比較用に、チャンネルごとのリストを切断のたびに作り直していた旧実装も同じ条件で計測する。
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.websocket_manager import ConnectionManager  # noqa: E402
+
+
+class FakeWebSocket:
+    """accept / send_text だけを持つダミー接続"""
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+
+class ListConnectionManager:
+    """旧実装（channel_id -> list of (user_id, websocket)）"""
+
+    def __init__(self):
+        self.active_connections = {}
+
+    async def connect(self, websocket, channel_id, user_id):
+        await websocket.accept()
+        self.active_connections.setdefault(channel_id, []).append((user_id, websocket))
+
+    def disconnect(self, websocket, channel_id, user_id):
+        if channel_id in self.active_connections:
+            self.active_connections[channel_id] = [
+                (uid, ws) for uid, ws in self.active_connections[channel_id]
+                if ws != websocket
+            ]
+            if not self.active_connections[channel_id]:
+                del self.active_connections[channel_id]
+
+
+async def bench_multiplexed(args, plans) -> float:
+    manager = ConnectionManager()
+    conns = []
+    for user_id, channels in enumerate(plans):
+        conn = await manager.accept(FakeWebSocket(), user_id)
+        for channel_id in channels:
+            manager.subscribe(conn, channel_id)
+        conns.append(conn)
+
+    rng = random.Random(1)
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        index = rng.randrange(len(conns))
+        old = conns[index]
+        manager.remove(old)
+        conn = await manager.accept(FakeWebSocket(), old.user_id)
+        for channel_id in plans[index]:
+            manager.subscribe(conn, channel_id)
+        conns[index] = conn
+    return time.perf_counter() - started
+
+
+async def bench_list(args, plans) -> float:
+    # 旧実装はチャンネルごとに1接続なので、購読数と同じ数の接続を張る
+    manager = ListConnectionManager()
+    sockets = []
+    for user_id, channels in enumerate(plans):
+        per_channel = []
+        for channel_id in channels:
+            ws = FakeWebSocket()
+            await manager.connect(ws, channel_id, user_id)
+            per_channel.append(ws)
+        sockets.append(per_channel)
+
+    rng = random.Random(1)
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        index = rng.randrange(len(sockets))
+        for channel_id, ws in zip(plans[index], sockets[index]):
+            manager.disconnect(ws, channel_id, index)
+        per_channel = []
+        for channel_id in plans[index]:
+            ws = FakeWebSocket()
+            await manager.connect(ws, channel_id, index)
+            per_channel.append(ws)
+        sockets[index] = per_channel
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscriptions", type=int, default=50000)
+    parser.add_argument("--channels", type=int, default=500)
+    parser.add_argument("--per-connection", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--skip-list", action="store_true", help="旧実装の計測を省略")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    connections = args.subscriptions // args.per_connection
+    plans = [
+        rng.sample(range(args.channels), args.per_connection)
+        for _ in range(connections)
+    ]
+    print(
+        f"connections={connections} subscriptions={connections * args.per_connection} "
+        f"channels={args.channels} iterations={args.iterations}"
+    )
+
+    elapsed = asyncio.run(bench_multiplexed(args, plans))
+    print(f"multiplexed: {elapsed / args.iterations * 1e6:.1f}us per disconnect+reconnect")
+    if not args.skip_list:
+        elapsed = asyncio.run(bench_list(args, plans))
+        print(f"list-based:  {elapsed / args.iterations * 1e6:.1f}us per disconnect+reconnect")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""messages と、messages を参照するテーブル（message_reports など）の月次パーティション保守コマンド
+
+    # 当月から3か月先までのパーティションを作成（cronで毎月実行する想定）
+    python scripts/manage_partitions.py precreate --months 3
+
+    # 12か月より前のパーティションを切り離し、圧縮ファイルに書き出してから削除
+    python scripts/manage_partitions.py archive --keep-months 12 --format ndjson
+
+アーカイブは MESSAGE_ARCHIVE_DIR（または --dir）に `<パーティション名>.ndjson.gz` /
+`<パーティション名>.parquet` として出力する。Parquet 出力には pyarrow が必要。
+
+どちらも既定では全シャードを順に処理する（--shard で1つに絞れる）。default 以外のシャードの
+アーカイブは `<--dir>/<シャード名>/` に出力する。
+"""
+import argparse
+import gzip
+import os
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import get_settings  # noqa: E402
+from app.database import DEFAULT_SHARD, shard_engines  # noqa: E402
+from app.services.partitions import (  # noqa: E402
+    ARCHIVE_ORDER,
+    add_months,
+    current_month,
+    detach_partition,
+    ensure_future_partitions,
+    list_month_partitions,
+    partition_name,
+)
+
+PARQUET_BATCH_SIZE = 10000
+
+
+def precreate(engine: Engine, months: int) -> None:
+    with engine.begin() as conn:
+        names = ensure_future_partitions(conn, months)
+    for name in names:
+        print(f"created {name}")
+
+
+def export_ndjson(engine: Engine, name: str, path: Path) -> None:
+    """COPYでパーティションを1行1JSONのgzipファイルに書き出す"""
+    raw = engine.raw_connection()
+    try:
+        with gzip.open(path, "wb") as out, raw.cursor() as cursor:
+            cursor.copy_expert(f"COPY (SELECT row_to_json(t) FROM {name} t) TO STDOUT", out)
+    finally:
+        raw.close()
+
+
+def export_parquet(engine: Engine, name: str, path: Path) -> None:
+    """サーバーサイドカーソルで読みながらParquet（zstd圧縮）に書き出す"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("Parquet出力には pyarrow が必要です: pip install pyarrow")
+
+    writer = None
+    with engine.connect().execution_options(stream_results=True) as conn:
+        result = conn.execute(text(f"SELECT * FROM {name}"))
+        try:
+            for rows in result.mappings().partitions(PARQUET_BATCH_SIZE):
+                batch = pa.Table.from_pylist([dict(row) for row in rows])
+                if writer is None:
+                    writer = pq.ParquetWriter(path, batch.schema, compression="zstd")
+                writer.write_table(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+def archive_partition(engine: Engine, table: str, name: str, archive_dir: Path, fmt: str) -> Path | None:
+    """切り離し → 書き出し → 削除 の順で1パーティションをアーカイブ
+
+    途中で失敗しても再実行すれば、切り離し済みのテーブルから続きを処理する。
+    """
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+            return None
+        attached = {n for n, _ in list_month_partitions(conn, table)}
+        if name in attached:
+            detach_partition(conn, table, name)
+
+    suffix = ".ndjson.gz" if fmt == "ndjson" else ".parquet"
+    path = archive_dir / f"{name}{suffix}"
+    tmp_path = path.with_name(path.name + ".tmp")
+    if fmt == "ndjson":
+        export_ndjson(engine, name, tmp_path)
+    else:
+        export_parquet(engine, name, tmp_path)
+    # 書き出しが完了したファイルだけを正式名にする
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    tmp_path.replace(path)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {name}"))
+    return path
+
+
+def archive(engine: Engine, keep_months: int, archive_dir: Path, fmt: str) -> None:
+    cutoff = add_months(current_month(), -keep_months)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+
+    with engine.connect() as conn:
+        months = sorted({
+            month
+            for table in ARCHIVE_ORDER
+            for _, month in list_month_partitions(conn, table)
+            if month < cutoff
+        })
+        # 前回途中で止まった切り離し済みテーブルも対象にする
+        detached = conn.execute(
+            text(
+                "SELECT c.relname FROM pg_class c "
+                "WHERE c.relkind = 'r' AND NOT c.relispartition AND c.relname ~ :pattern"
+            ),
+            {"pattern": f"^({'|'.join(ARCHIVE_ORDER)})_p[0-9]{{6}}$"},
+        ).scalars().all()
+
+    pending = set(detached)
+    for month in months:
+        for table in ARCHIVE_ORDER:
+            pending.add(partition_name(table, month))
+
+    for month in sorted({name[-6:] for name in pending}):
+        # 参照する側（message_reports など）を先に片付ける
+        for table in ARCHIVE_ORDER:
+            name = f"{table}_p{month}"
+            if name in pending:
+                path = archive_partition(engine, table, name, archive_dir, fmt)
+                if path is not None:
+                    print(f"archived {name} -> {path}")
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    precreate_parser = subparsers.add_parser("precreate", help="未来のパーティションを作成")
+    precreate_parser.add_argument("--months", type=int, default=3)
+
+    archive_parser = subparsers.add_parser("archive", help="古いパーティションをアーカイブ")
+    archive_parser.add_argument("--keep-months", type=int, default=12)
+    archive_parser.add_argument("--dir", default=settings.MESSAGE_ARCHIVE_DIR)
+    archive_parser.add_argument("--format", choices=["ndjson", "parquet"], default="ndjson")
+
+    for subparser in (precreate_parser, archive_parser):
+        subparser.add_argument("--shard", choices=list(shard_engines), help="処理するシャード（省略時は全シャード）")
+
+    args = parser.parse_args()
+    shards = [args.shard] if args.shard else list(shard_engines)
+    for shard in shards:
+        if len(shards) > 1:
+            print(f"[{shard}]")
+        engine = shard_engines[shard]
+        if args.command == "precreate":
+            precreate(engine, args.months)
+        else:
+            # 同じ名前のパーティションが各シャードにあるため、シャードごとに出力先を分ける
+            archive_dir = Path(args.dir) if shard == DEFAULT_SHARD else Path(args.dir) / shard
+            archive(engine, args.keep_months, archive_dir, args.format)
+
+
+if __name__ == "__main__":
+    main()
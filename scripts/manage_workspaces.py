@@ -0,0 +1,323 @@
+"""ワークスペースの作成・一覧・シャード間の移動
+
+    # ワークスペースを作成（--shard 省略時は default シャード）
+    python scripts/manage_workspaces.py create acme "Acme Inc." --shard shard2
+
+    python scripts/manage_workspaces.py list
+
+    # ワークスペースを別のシャードへオンラインで移動
+    python scripts/manage_workspaces.py move acme shard2
+
+移動は次の順に行い、書き込みを止めるのは差分のコピーと検証の間だけにする。
+1. 書き込みを止めずに、ワークスペースの行を移動先へ一括でコピー（主キーで UPSERT）
+2. ワークスペースを readonly にし、全ワーカーの対応表が入れ替わるまで待つ
+3. コピー開始以降に追加・変更された行をコピーし、移動元で削除された行を移動先からも消す
+4. 件数を照合し、移動先の連番をコピーしたIDより先へ進め、通報集計を作り直してから、対応表を移動先・active に切り替える
+5. 全ワーカーが移動先を向くまで待ってから、移動元の行を消して通報集計を作り直す
+4 の切り替えより前に失敗した場合は active に戻し、移動先にコピーした行を消す。
+readonly の間も閲覧時の既読位置の更新は移動元に書き込まれ、差分のコピー後の分は失われる。
+"""
+import argparse
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence
+
+from sqlalchemy import delete, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection, Engine
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import app.models  # noqa: E402,F401
+from app.config import get_settings  # noqa: E402
+from app.database import DEFAULT_SHARD, Base, engine, shard_engines  # noqa: E402
+from app.models.workspace import Workspace  # noqa: E402
+from app.services.partitions import ensure_month_partitions  # noqa: E402
+from app.services.report_rollups import rebuild_report_rollups  # noqa: E402
+from app.services.workspaces import STATE_READONLY, advance_id_sequences  # noqa: E402
+
+settings = get_settings()
+
+COPY_BATCH_SIZE = 5000
+DELETE_BATCH_SIZE = 1000
+
+WORKSPACE_CHANNELS = "SELECT id FROM channels WHERE workspace_id = :workspace_id"
+_OF_WORKSPACE_MESSAGE = (
+    "EXISTS (SELECT 1 FROM messages m WHERE m.id = t.message_id AND m.created_at = t.message_created_at "
+    f"AND m.channel_id IN ({WORKSPACE_CHANNELS}))"
+)
+_OF_CHANGED_MESSAGE = (
+    "EXISTS (SELECT 1 FROM messages m WHERE m.id = t.message_id AND m.created_at = t.message_created_at "
+    "AND (m.created_at >= :since OR m.updated_at >= :since))"
+)
+
+# (テーブル, 主キー, ワークスペースの行の条件, 差分コピーの条件) を外部キーの参照される側から順に
+# 差分コピーの条件が None のテーブルは行数が少ないため、差分のときも全行をコピーする
+COPY_TABLES = [
+    ("users", ("id",), "t.workspace_id = :workspace_id", None),
+    ("channels", ("id",), "t.workspace_id = :workspace_id", None),
+    (
+        "messages", ("id", "created_at"), f"t.channel_id IN ({WORKSPACE_CHANNELS})",
+        "(t.created_at >= :since OR t.updated_at >= :since)",
+    ),
+    ("message_reports", ("id", "message_created_at"), _OF_WORKSPACE_MESSAGE, "t.created_at >= :since"),
+    (
+        "message_mentions", ("mentioned_user_id", "message_created_at", "message_id"),
+        f"t.channel_id IN ({WORKSPACE_CHANNELS})", _OF_CHANGED_MESSAGE,
+    ),
+    ("message_revisions", ("id", "message_created_at"), _OF_WORKSPACE_MESSAGE, "t.edited_at >= :since"),
+    ("channel_read_states", ("user_id", "channel_id"), f"t.channel_id IN ({WORKSPACE_CHANNELS})", None),
+]
+# id を連番で採番するテーブル
+SEQUENCE_TABLES = ["users", "channels", "messages", "message_reports", "message_revisions"]
+# 編集・削除で行が消えうるテーブル（チャンネルごとの件数が合わなければ主キーを突き合わせて消す）
+DELETABLE_TABLES = ["messages", "message_mentions"]
+# 閲覧時にも書き込まれ、readonly の間も増えうるため照合しないテーブル
+UNVERIFIED_TABLES = {"channel_read_states"}
+
+
+class MoveError(Exception):
+    """移動を中断する（対応表を切り替える前なら元に戻す）"""
+
+
+def find_workspace(slug: str):
+    with engine.connect() as conn:
+        return conn.execute(
+            Workspace.__table__.select().where(Workspace.slug == slug)
+        ).mappings().first()
+
+
+def set_workspace(workspace_id: int, **values) -> None:
+    with engine.begin() as conn:
+        conn.execute(Workspace.__table__.update().where(Workspace.id == workspace_id).values(**values))
+
+
+def create(slug: str, name: str, shard: str) -> None:
+    if shard not in shard_engines:
+        sys.exit(f"シャード {shard} が設定されていません（DATABASE_SHARDS）")
+    with engine.begin() as conn:
+        workspace_id = conn.execute(
+            insert(Workspace).values(slug=slug, name=name, shard=shard).returning(Workspace.id)
+        ).scalar()
+    print(f"ok {slug} id={workspace_id} shard={shard}")
+
+
+def list_workspaces() -> None:
+    with engine.connect() as conn:
+        rows = conn.execute(Workspace.__table__.select().order_by(Workspace.id)).mappings().all()
+    for row in rows:
+        print(f"{row['id']}\t{row['slug']}\t{row['shard']}\t{row['state']}\t{row['name']}")
+
+
+def select_rows(conn: Connection, table: str, condition: str, params: dict) -> Iterator[List[dict]]:
+    """条件に合う行をサーバーサイドカーソルで COPY_BATCH_SIZE 行ずつ読む"""
+    result = conn.execution_options(stream_results=True).execute(
+        text(f"SELECT t.* FROM {table} t WHERE {condition}"), params
+    )
+    for rows in result.mappings().partitions(COPY_BATCH_SIZE):
+        yield [dict(row) for row in rows]
+
+
+def upsert_rows(conn: Connection, table: str, keys: Sequence[str], rows: List[dict]) -> None:
+    """主キーが同じ行は移動元の値で上書きする（何度コピーしても同じ結果になる）"""
+    columns = Base.metadata.tables[table]
+    stmt = insert(columns)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column.name: stmt.excluded[column.name] for column in columns.columns if column.name not in keys},
+    )
+    conn.execute(stmt, rows)
+
+
+def copy_table(source: Engine, target: Engine, table: str, keys: Sequence[str], condition: str, params: dict) -> int:
+    copied = 0
+    with source.connect() as src, target.begin() as dst:
+        for rows in select_rows(src, table, condition, params):
+            upsert_rows(dst, table, keys, rows)
+            copied += len(rows)
+    return copied
+
+
+def ensure_target_partitions(source: Engine, target: Engine, params: dict) -> None:
+    """移動先に、ワークスペースのメッセージがある月のパーティションを作る"""
+    with source.connect() as conn:
+        oldest, newest = conn.execute(
+            text(f"SELECT min(created_at), max(created_at) FROM messages WHERE channel_id IN ({WORKSPACE_CHANNELS})"),
+            params,
+        ).one()
+    if oldest is not None:
+        with target.begin() as conn:
+            ensure_month_partitions(conn, oldest.date(), newest.date())
+
+
+def copy_workspace(source: Engine, target: Engine, params: dict, delta: bool) -> None:
+    ensure_target_partitions(source, target, params)
+    for table, keys, condition, delta_condition in COPY_TABLES:
+        if delta and delta_condition is not None:
+            condition = f"{condition} AND {delta_condition}"
+        copied = copy_table(source, target, table, keys, condition, params)
+        print(f"copied {table}: {copied}")
+
+
+def channel_counts(conn: Connection, table: str, params: dict) -> Dict[int, int]:
+    return dict(conn.execute(
+        text(f"SELECT channel_id, count(*) FROM {table} WHERE channel_id IN ({WORKSPACE_CHANNELS}) GROUP BY channel_id"),
+        params,
+    ).all())
+
+
+def remove_deleted(source: Engine, target: Engine, table: str, keys: Sequence[str], params: dict) -> int:
+    """移動元で削除された行を移動先からも消す
+
+    差分コピーの後は移動先が移動元の行をすべて含むため、件数が同じチャンネルは行も同じ。
+    件数が合わないチャンネルだけ主キーを突き合わせる。
+    """
+    columns = Base.metadata.tables[table]
+    key_sql = text(f"SELECT {', '.join(keys)} FROM {table} WHERE channel_id = :channel_id")
+    removed = 0
+    with source.connect() as src, target.begin() as dst:
+        source_counts = channel_counts(src, table, params)
+        for channel_id, count in channel_counts(dst, table, params).items():
+            if count == source_counts.get(channel_id, 0):
+                continue
+            existing = set(map(tuple, src.execute(key_sql, {"channel_id": channel_id})))
+            extra = [key for key in map(tuple, dst.execute(key_sql, {"channel_id": channel_id})) if key not in existing]
+            for start in range(0, len(extra), DELETE_BATCH_SIZE):
+                dst.execute(delete(columns).where(
+                    tuple_(*[columns.c[key] for key in keys]).in_(extra[start:start + DELETE_BATCH_SIZE])
+                ))
+            removed += len(extra)
+    print(f"removed {table}: {removed}")
+    return removed
+
+
+def verify(source: Engine, target: Engine, params: dict) -> None:
+    with source.connect() as src, target.connect() as dst:
+        for table, _, condition, _ in COPY_TABLES:
+            if table in UNVERIFIED_TABLES:
+                continue
+            count_sql = text(f"SELECT count(*) FROM {table} t WHERE {condition}")
+            expected = src.execute(count_sql, params).scalar()
+            actual = dst.execute(count_sql, params).scalar()
+            if expected != actual:
+                raise MoveError(f"{table} の件数が一致しません（移動元 {expected} / 移動先 {actual}）")
+            print(f"verified {table}: {actual}")
+
+
+def delete_workspace_data(target: Engine, params: dict) -> None:
+    """シャードからワークスペースの行を消す（メッセージ以下はチャンネルの外部キーで消える）
+
+    ロックを長く持たないよう、チャンネルごとに別のトランザクションで消す。
+    """
+    with target.connect() as conn:
+        channel_ids = conn.execute(text(WORKSPACE_CHANNELS), params).scalars().all()
+    for channel_id in channel_ids:
+        with target.begin() as conn:
+            conn.execute(text("DELETE FROM channels WHERE id = :channel_id"), {"channel_id": channel_id})
+    with target.begin() as conn:
+        conn.execute(text("DELETE FROM users WHERE workspace_id = :workspace_id"), params)
+
+
+def rebuild_rollups(target: Engine) -> None:
+    with target.begin() as conn:
+        rebuild_report_rollups(conn)
+
+
+def wait_for_workers(grace: float) -> None:
+    """全ワーカーがワークスペースの対応表を読み直すまで待つ"""
+    seconds = settings.WORKSPACE_MAP_TTL_SECONDS + grace
+    print(f"waiting {seconds:g}s for workers to reload the workspace map")
+    time.sleep(seconds)
+
+
+def move(slug: str, target_shard: str, grace: float, margin: float, keep_source: bool) -> None:
+    workspace = find_workspace(slug)
+    if workspace is None:
+        sys.exit(f"ワークスペース {slug} が見つかりません")
+    if target_shard not in shard_engines:
+        sys.exit(f"シャード {target_shard} が設定されていません（DATABASE_SHARDS）")
+    if workspace["shard"] == target_shard:
+        sys.exit(f"{slug} は既に {target_shard} にあります")
+    if workspace["state"] != "active":
+        sys.exit(f"{slug} は {workspace['state']} です（前回の移動が途中で止まっていないか確認してください）")
+
+    source = shard_engines[workspace["shard"]]
+    target = shard_engines[target_shard]
+    params = {"workspace_id": workspace["id"]}
+    flipped = False
+    try:
+        # now() はトランザクション開始時刻のため、コピー中に確定した長いトランザクションの行も差分に含める
+        with source.connect() as conn:
+            params["since"] = conn.execute(text("SELECT now()")).scalar() - timedelta(seconds=margin)
+        copy_workspace(source, target, params, delta=False)
+
+        set_workspace(workspace["id"], state=STATE_READONLY)
+        wait_for_workers(grace)
+        copy_workspace(source, target, params, delta=True)
+        for table in DELETABLE_TABLES:
+            keys = next(keys for name, keys, _, _ in COPY_TABLES if name == table)
+            remove_deleted(source, target, table, keys, params)
+        verify(source, target, params)
+        with target.begin() as conn:
+            advance_id_sequences(conn, SEQUENCE_TABLES)
+        rebuild_rollups(target)
+
+        set_workspace(workspace["id"], shard=target_shard, state="active")
+        flipped = True
+        print(f"ok {slug} -> {target_shard}")
+    finally:
+        if not flipped:
+            set_workspace(workspace["id"], state="active")
+            print(f"aborted; {slug} stays on {workspace['shard']}, removing the partial copy", file=sys.stderr)
+            try:
+                delete_workspace_data(target, params)
+            except Exception as e:
+                # 移動先に残った行は、次に移動するときに上書きされる
+                print(f"failed to remove the partial copy from {target_shard}: {e}", file=sys.stderr)
+
+    if keep_source:
+        return
+    wait_for_workers(grace)
+    delete_workspace_data(source, params)
+    rebuild_rollups(source)
+    print(f"removed {slug} from {workspace['shard']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="ワークスペースを作成")
+    create_parser.add_argument("slug")
+    create_parser.add_argument("name")
+    create_parser.add_argument("--shard", default=DEFAULT_SHARD, choices=list(shard_engines))
+
+    subparsers.add_parser("list", help="ワークスペースとシャードの一覧")
+
+    move_parser = subparsers.add_parser("move", help="ワークスペースを別のシャードへ移動")
+    move_parser.add_argument("slug")
+    move_parser.add_argument("target", choices=list(shard_engines))
+    move_parser.add_argument("--grace", type=float, default=2.0, help="対応表の読み直しを待つ時間に足す秒数")
+    move_parser.add_argument(
+        "--margin", type=float, default=60.0,
+        help="差分コピーの起点をコピー開始より何秒前にするか（実行中のトランザクションの上限目安）",
+    )
+    move_parser.add_argument("--keep-source", action="store_true", help="移動元の行を消さない")
+
+    args = parser.parse_args()
+    if args.command == "create":
+        create(args.slug, args.name, args.shard)
+    elif args.command == "list":
+        list_workspaces()
+    else:
+        try:
+            move(args.slug, args.target, args.grace, args.margin, args.keep_source)
+        except MoveError as e:
+            sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""テスト共通の設定
+
+DB は sqlite://（メモリ上の SQLite）を使う。Postgres でしか確かめられないテストは
+TEST_POSTGRES_URL（テストのたびに public スキーマを作り直す、テスト専用のDB）を指定したときだけ実行する。
+"""
+import os
+from pathlib import Path
+
+# app を読み込む前に設定する
+os.environ["DATABASE_URL"] = "sqlite://"
+
+import pytest  # noqa: E402
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import Channel, User  # noqa: E402
+from app.services.rate_limit import channel_limiter, user_limiter  # noqa: E402
+from app.sqlite import create_schema  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """テストごとにIDが振り直されるため、前のテストで使ったトークンを持ち越さない"""
+    for limiter in (user_limiter, channel_limiter):
+        limiter.buckets.clear()
+
+
+@pytest.fixture
+def db():
+    with engine.begin() as conn:
+        create_schema(conn)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def make_user(db):
+    def make(username: str, workspace_id: int = 1, is_admin: bool = False) -> User:
+        user = User(
+            workspace_id=workspace_id,
+            email=f"{username}@example.com",
+            username=username,
+            hashed_password="x",
+            is_admin=is_admin,
+        )
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_channel(db):
+    def make(name: str, owner: User) -> Channel:
+        channel = Channel(workspace_id=owner.workspace_id, name=name, created_by=owner.id)
+        db.add(channel)
+        db.commit()
+        return channel
+    return make
+
+
+@pytest.fixture
+def pg_engine(monkeypatch):
+    """マイグレーションを head まで適用した Postgres（TEST_POSTGRES_URL が無ければスキップ）"""
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL が設定されていません")
+    pg_engine = create_engine(url)
+    with pg_engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    root = Path(__file__).resolve().parents[1]
+    config = Config(str(root / "alembic.ini"))
+    config.set_main_option("script_location", str(root / "alembic"))
+    monkeypatch.setenv("DATABASE_URL", url)
+    command.upgrade(config, "head")
+    try:
+        yield pg_engine
+    finally:
+        pg_engine.dispose()
@@ -0,0 +1,40 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers.api_v1 import channel_history, decode_cursor, encode_cursor
+from app.routers.messages import post_message
+
+
+def test_cursor_is_url_safe_and_round_trips():
+    created_at = datetime(2026, 10, 19, 9, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor({"created_at": created_at, "id": 12345})
+    assert all(c.isalnum() or c in "-_" for c in cursor)
+    assert decode_cursor(cursor) == (created_at, 12345)
+
+
+@pytest.mark.parametrize("cursor", ["!!!", "bm90LWEtY3Vyc29y", "2026-10-19T09:30:15+00:00_1"])
+def test_invalid_cursor_is_bad_request(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+def test_history_pages_with_cursor(db, make_user, make_channel):
+    alice = make_user("alice")
+    channel = make_channel("general", alice)
+    for i in range(3):
+        asyncio.run(post_message(db, channel.id, alice, f"hello {i}"))
+
+    def page(cursor):
+        response = asyncio.run(channel_history(channel.id, cursor, 2, "id,text", alice, db))
+        return json.loads(response.body)
+
+    first = page(None)
+    assert [message["text"] for message in first["messages"]] == ["hello 2", "hello 1"]
+    second = page(first["next_cursor"])
+    assert [message["text"] for message in second["messages"]] == ["hello 0"]
+    assert second["next_cursor"] is None
@@ -0,0 +1,49 @@
+import asyncio
+
+from app.database import SessionLocal
+from app.routers.channels import channel_detail
+from app.routers.messages import post_message
+
+from tests.test_messages import cookie_request
+
+
+def get_channel(db, channel, user, headers: dict = None):
+    write_db = SessionLocal()
+    try:
+        return asyncio.run(channel_detail(cookie_request(user, "GET", headers), channel.id, db, write_db))
+    finally:
+        write_db.close()
+
+
+def test_channel_page_conditional_get(db, make_user, make_channel):
+    alice = make_user("alice")
+    bob = make_user("bob")
+    channel = make_channel("general", alice)
+    asyncio.run(post_message(db, channel.id, alice, "hello"))
+
+    first = get_channel(db, channel, alice)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    # 通報・削除のリンクに投稿日時を載せ、投稿月のパーティションだけを読ませる
+    assert b"/report?created_at=" in first.body
+    assert etag.startswith('W/"')
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    not_modified = get_channel(db, channel, alice, {"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    # W/ の有無は比較しない
+    assert get_channel(db, channel, alice, {"If-None-Match": etag.removeprefix("W/")}).status_code == 304
+    assert get_channel(db, channel, alice, {"If-Modified-Since": first.headers["last-modified"]}).status_code == 304
+
+    # 閲覧ユーザーごとに内容（通報ボタンなど）が違うため、他のユーザーの ETag では 304 にしない
+    other = get_channel(db, channel, bob, {"If-None-Match": etag})
+    assert other.status_code == 200
+    assert other.headers["etag"] != etag
+
+    # 投稿でチャンネルの変更番号が進むと作り直す
+    asyncio.run(post_message(db, channel.id, bob, "hi"))
+    db.expire_all()
+    changed = get_channel(db, channel, alice, {"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
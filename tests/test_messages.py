@@ -0,0 +1,140 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.database import SessionLocal
+from app.models import Message, MessageReport, MessageRevision
+from app.routers.messages import edit_message, find_workspace_message, post_message, report_message, report_summary
+from app.services.auth import create_access_token
+from app.services.moderation import bulk_moderate
+from app.services.rate_limit import channel_limiter, user_limiter
+from app.services.revisions import load_history, load_version
+
+
+def cookie_request(user, method: str = "POST", headers: dict = None) -> Request:
+    """user としてログインしたブラウザからのリクエスト"""
+    token = create_access_token(data={"sub": str(user.id), "email": user.email, "ws": user.workspace_id})
+    return Request({
+        "type": "http",
+        "method": method,
+        "path": "/",
+        "query_string": b"",
+        "headers": [(b"cookie", f'access_token="Bearer {token}"'.encode())] + [
+            (name.lower().encode(), value.encode()) for name, value in (headers or {}).items()
+        ],
+    })
+
+
+@pytest.fixture
+def hidden_message(db, make_user, make_channel):
+    author = make_user("alice")
+    channel = make_channel("general", author)
+    message = asyncio.run(post_message(db, channel.id, author, "hello"))
+    bulk_moderate(db, "hide", author.workspace_id, message_ids=[message.id])
+    db.commit()
+    return message
+
+
+def test_edit_hidden_message_is_not_found(db, hidden_message):
+    author = hidden_message.user
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(edit_message(db, hidden_message.channel_id, hidden_message.id, author, "edited @bob"))
+    assert excinfo.value.status_code == 404
+    db.rollback()
+    db.refresh(hidden_message)
+    assert hidden_message.text == "hello"
+    assert db.query(MessageRevision).count() == 0
+
+
+def test_report_hidden_message_is_not_found(db, make_user, hidden_message):
+    reporter = make_user("bob")
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(report_message(cookie_request(reporter), hidden_message.id, "harassment_suspected", db))
+    assert excinfo.value.status_code == 404
+    assert db.query(MessageReport).count() == 0
+
+
+def test_report_summary_of_hidden_message_is_not_found(db, hidden_message):
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(report_summary(cookie_request(hidden_message.user), hidden_message.id, db))
+    assert excinfo.value.status_code == 404
+
+
+def limiter_calls() -> int:
+    return sum(limiter.allowed + limiter.rejected for limiter in (user_limiter, channel_limiter))
+
+
+def test_not_found_does_not_use_rate_limit_tokens(db, make_user, make_channel):
+    author = make_user("alice")
+    channel = make_channel("general", author)
+    other_workspace_user = make_user("mallory", workspace_id=2)
+    message = asyncio.run(post_message(db, channel.id, author, "hello"))
+    calls = limiter_calls()
+
+    for attempt in (
+        post_message(db, channel.id + 1, author, "hello"),
+        post_message(db, channel.id, other_workspace_user, "hello"),
+        edit_message(db, channel.id, message.id + 1, author, "edited"),
+        report_message(cookie_request(author), message.id + 1, "harassment_suspected", db),
+    ):
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(attempt)
+        assert excinfo.value.status_code == 404
+
+    assert limiter_calls() == calls
+
+
+
+def test_edit_rereads_message_edited_meanwhile(db, make_user, make_channel):
+    """読み込んだ後に他のセッションで編集されていても、行をロックして読み直した本文と版番号で履歴を残す"""
+    author = make_user("alice")
+    channel = make_channel("general", author)
+    message = asyncio.run(post_message(db, channel.id, author, "v0"))
+
+    second = SessionLocal()
+    try:
+        stale = second.get(Message, message.id)
+        first = SessionLocal()
+        try:
+            asyncio.run(edit_message(first, channel.id, message.id, first.merge(author), "v1"))
+        finally:
+            first.close()
+        asyncio.run(edit_message(second, channel.id, message.id, second.merge(author), "v2"))
+        assert stale.text == "v2"
+    finally:
+        second.close()
+
+    db.expire_all()
+    history = load_history(db, db.get(Message, message.id))
+    assert [(version["seq"], version["text"]) for version in history] == [(0, "v0"), (1, "v1"), (2, "v2")]
+
+
+def test_load_version_of_current_text(db, make_user, make_channel):
+    """load_history の最後の版（現在の本文）も版番号で読める"""
+    author = make_user("alice")
+    channel = make_channel("general", author)
+    message = asyncio.run(post_message(db, channel.id, author, "v0"))
+    assert load_version(db, message, 0) == "v0"
+    assert load_version(db, message, 1) is None
+
+    asyncio.run(edit_message(db, channel.id, message.id, author, "v1"))
+    assert load_version(db, message, 0) == "v0"
+    assert load_version(db, message, 1) == "v1"
+    assert load_version(db, message, 2) is None
+
+
+def test_find_message_with_created_at(db, make_user, make_channel):
+    """履歴から分かる投稿日時を渡すと、その日時のメッセージだけを探す"""
+    author = make_user("alice")
+    channel = make_channel("general", author)
+    message = asyncio.run(post_message(db, channel.id, author, "hello"))
+    assert find_workspace_message(db, message.id, author.workspace_id, channel.id, message.created_at) is message
+    assert find_workspace_message(db, message.id, author.workspace_id, created_at=message.created_at) is message
+    day_before = message.created_at - timedelta(days=1)
+    assert find_workspace_message(db, message.id, author.workspace_id, created_at=day_before) is None
+
+    summary = asyncio.run(report_summary(cookie_request(author), message.id, db, message.created_at))
+    assert summary.message_id == message.id
@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app.services.partitions import (
+    ARCHIVE_ORDER,
+    add_months,
+    current_month,
+    ensure_future_partitions,
+    ensure_month_partitions,
+    partition_name,
+)
+from scripts.manage_partitions import archive
+
+
+def insert_message(conn, created_at: datetime):
+    """ユーザー・チャンネル・メッセージを1件ずつ作り、(user_id, channel_id, message_id) を返す"""
+    user_id = conn.execute(text(
+        "INSERT INTO users (workspace_id, email, username, hashed_password) "
+        "VALUES (1, 'alice@example.com', 'alice', 'x') RETURNING id"
+    )).scalar()
+    channel_id = conn.execute(
+        text("INSERT INTO channels (workspace_id, name, created_by) VALUES (1, 'general', :user_id) RETURNING id"),
+        {"user_id": user_id},
+    ).scalar()
+    message_id = conn.execute(
+        text(
+            "INSERT INTO messages (channel_id, user_id, text, created_at) "
+            "VALUES (:channel_id, :user_id, 'hello @alice', :created_at) RETURNING id"
+        ),
+        {"channel_id": channel_id, "user_id": user_id, "created_at": created_at},
+    ).scalar()
+    return user_id, channel_id, message_id
+
+
+def test_archive_month_with_mentions(pg_engine, tmp_path):
+    month = add_months(current_month(), -24)
+    created_at = datetime(month.year, month.month, 15, tzinfo=timezone.utc)
+    with pg_engine.begin() as conn:
+        ensure_month_partitions(conn, month, month)
+        user_id, channel_id, message_id = insert_message(conn, created_at)
+        conn.execute(
+            text(
+                "INSERT INTO message_mentions "
+                "(mentioned_user_id, message_created_at, message_id, channel_id, author_user_id) "
+                "VALUES (:user_id, :created_at, :message_id, :channel_id, :user_id)"
+            ),
+            {"user_id": user_id, "created_at": created_at, "message_id": message_id, "channel_id": channel_id},
+        )
+
+    archive(pg_engine, 12, tmp_path, "ndjson")
+
+    with pg_engine.connect() as conn:
+        for table in ("message_mentions", "messages"):
+            name = partition_name(table, month)
+            assert (tmp_path / f"{name}.ndjson.gz").exists()
+            assert conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None
+
+
+def test_archive_month_with_revisions(pg_engine, tmp_path):
+    month = add_months(current_month(), -24)
+    created_at = datetime(month.year, month.month, 15, tzinfo=timezone.utc)
+    with pg_engine.begin() as conn:
+        ensure_month_partitions(conn, month, month)
+        user_id, _, message_id = insert_message(conn, created_at)
+        conn.execute(
+            text(
+                "INSERT INTO message_revisions "
+                "(message_id, message_created_at, seq, is_snapshot, payload, edited_by) "
+                "VALUES (:message_id, :created_at, 0, true, :payload, :user_id)"
+            ),
+            {"message_id": message_id, "created_at": created_at, "payload": b"x", "user_id": user_id},
+        )
+
+    archive(pg_engine, 12, tmp_path, "ndjson")
+
+    with pg_engine.connect() as conn:
+        for table in ("message_revisions", "messages"):
+            name = partition_name(table, month)
+            assert (tmp_path / f"{name}.ndjson.gz").exists()
+            assert conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None
+
+
+def test_ensure_future_partitions_creates_only_missing_months(pg_engine):
+    next_month = add_months(current_month(), 1)
+    with pg_engine.begin() as conn:
+        for table in ARCHIVE_ORDER:
+            conn.execute(text(f"DROP TABLE {partition_name(table, next_month)}"))
+
+    with pg_engine.begin() as conn:
+        created = ensure_future_partitions(conn, 3)
+    assert sorted(created) == sorted(partition_name(table, next_month) for table in ARCHIVE_ORDER)
+
+    with pg_engine.begin() as conn:
+        assert ensure_future_partitions(conn, 3) == []
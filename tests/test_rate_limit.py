@@ -0,0 +1,13 @@
+from app.services.rate_limit import KeyedRateLimiter
+
+
+def test_evicts_least_recently_used_key():
+    limiter = KeyedRateLimiter("user", rate=1, burst=2, max_keys=2)
+    limiter.try_acquire(1, 0.0)
+    limiter.try_acquire(2, 0.0)
+    # 1 を使い直すと、最も長く使われていないのは 2
+    limiter.try_acquire(1, 0.0)
+    limiter.try_acquire(3, 0.0)
+    assert list(limiter.buckets) == [1, 3]
+    # 残ったバケットはトークンを使い切ったまま
+    assert limiter.try_acquire(1, 0.0) > 0
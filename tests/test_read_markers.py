@@ -0,0 +1,44 @@
+import asyncio
+
+from app.routers.messages import post_message, remove_message
+from app.services.moderation import bulk_moderate
+from app.services.read_markers import get_read_state, mark_channel_read
+
+
+def unread(db, user, channel) -> int:
+    db.expire_all()
+    return get_read_state(db, user.id, channel.id).unread_count
+
+
+def test_unread_count_follows_posts_and_deletes(db, make_user, make_channel):
+    alice = make_user("alice")
+    bob = make_user("bob")
+    carol = make_user("carol")
+    channel = make_channel("general", alice)
+    first = asyncio.run(post_message(db, channel.id, alice, "first"))
+    mark_channel_read(db, bob.id, channel.id, first.id)
+    db.commit()
+
+    posted = [asyncio.run(post_message(db, channel.id, alice, f"hello {i}")) for i in range(3)]
+    assert unread(db, bob, channel) == 3
+    # 投稿者自身は既読のまま
+    assert unread(db, alice, channel) == 0
+    # 一度も開いていないユーザーには行が無い
+    assert get_read_state(db, carol.id, channel.id) is None
+
+    asyncio.run(remove_message(db, channel.id, posted[0].id, alice))
+    assert unread(db, bob, channel) == 2
+
+    bulk_moderate(db, "hide", alice.workspace_id, message_ids=[posted[1].id, posted[2].id])
+    db.commit()
+    assert unread(db, bob, channel) == 0
+
+    # 既読位置より前のメッセージを消しても未読数は変わらない
+    latest = asyncio.run(post_message(db, channel.id, alice, "latest"))
+    asyncio.run(remove_message(db, channel.id, first.id, alice))
+    assert unread(db, bob, channel) == 1
+
+    mark_channel_read(db, bob.id, channel.id, latest.id)
+    db.commit()
+    assert unread(db, bob, channel) == 0
+    assert get_read_state(db, bob.id, channel.id).last_read_message_id == latest.id
@@ -0,0 +1,58 @@
+import asyncio
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.routers.messages import post_message, report_message
+from app.services import report_rollups
+from app.services.report_rollups import expire_report_rollups, top_reported
+
+from tests.test_messages import cookie_request
+
+
+def watermark(db, period: str):
+    return db.execute(
+        text("SELECT expired_through FROM report_rollup_watermarks WHERE period = :period")
+        .columns(expired_through=report_rollups._HOUR),
+        {"period": period},
+    ).scalar()
+
+
+def test_reports_expire_hour_by_hour(db, make_user, make_channel, monkeypatch):
+    author = make_user("alice")
+    reporter = make_user("bob")
+    channel = make_channel("general", author)
+    message = asyncio.run(post_message(db, channel.id, author, "hello"))
+    asyncio.run(report_message(cookie_request(reporter), message.id, "harassment_suspected", db))
+
+    for period in report_rollups.PERIODS:
+        assert top_reported(db, author.workspace_id, period, "message", None, 10) == [(message.id, 1)]
+        assert top_reported(db, author.workspace_id, period, "user", channel.id, 10) == [(author.id, 1)]
+    db.commit()
+
+    # 2時間後: 1h の期間からだけ外れる
+    current_hour = report_rollups._current_hour(db.connection())
+    db.rollback()
+    monkeypatch.setattr(report_rollups, "_current_hour", lambda conn: current_hour + timedelta(hours=2))
+    with engine.begin() as conn:
+        assert expire_report_rollups(conn) == 2 * len(report_rollups.PERIODS)
+    assert top_reported(db, author.workspace_id, "1h", "message", None, 10) == []
+    assert top_reported(db, author.workspace_id, "24h", "message", None, 10) == [(message.id, 1)]
+    assert watermark(db, "1h") == current_hour + timedelta(hours=1)
+    assert watermark(db, "24h") == current_hour - timedelta(hours=22)
+    db.rollback()
+
+    # 同じ時刻にもう一度呼んでも二重には差し引かない
+    with engine.begin() as conn:
+        assert expire_report_rollups(conn) == 0
+    assert top_reported(db, author.workspace_id, "24h", "message", None, 10) == [(message.id, 1)]
+    db.rollback()
+
+    # 8日後: すべての期間から外れ、時間帯ごとの行も消える
+    monkeypatch.setattr(report_rollups, "_current_hour", lambda conn: current_hour + timedelta(days=8))
+    with engine.begin() as conn:
+        expire_report_rollups(conn)
+    for period in report_rollups.PERIODS:
+        assert top_reported(db, author.workspace_id, period, "message", None, 10) == []
+    assert db.execute(text("SELECT count(*) FROM report_hourly_rollups")).scalar() == 0
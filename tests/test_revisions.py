@@ -0,0 +1,41 @@
+import asyncio
+
+from app.config import get_settings
+from app.models import MessageRevision
+from app.routers.messages import post_message
+from app.services.revisions import apply_delta, load_history, load_version, lock_message, make_delta, record_revision
+
+settings = get_settings()
+
+
+def test_delta_round_trip():
+    source = "今日は晴れ。明日は雨らしい"
+    target = "今日は曇り。明日も曇りらしい @bob"
+    assert apply_delta(source, make_delta(source, target)) == target
+    assert apply_delta(target, make_delta(target, "")) == ""
+
+
+def test_every_version_restores_through_deltas_and_snapshots(db, make_user, make_channel):
+    author = make_user("alice")
+    channel = make_channel("general", author)
+    count = settings.MESSAGE_REVISION_SNAPSHOT_INTERVAL * 2 + 3
+    texts = [f"version {i}: the quick brown fox jumps over the lazy dog" for i in range(count)]
+    # 全面的な書き換えは差分より本文のほうが小さい
+    texts[5] = "x"
+    message = asyncio.run(post_message(db, channel.id, author, texts[0]))
+    for text in texts[1:]:
+        lock_message(db, message)
+        record_revision(db, message, message.text, text, author.id)
+        message.text = text
+        db.commit()
+
+    revisions = db.query(MessageRevision).order_by(MessageRevision.seq).all()
+    assert [revision.seq for revision in revisions] == list(range(len(texts) - 1))
+    for revision in revisions:
+        if revision.seq % settings.MESSAGE_REVISION_SNAPSHOT_INTERVAL == 0:
+            assert revision.is_snapshot
+    assert not all(revision.is_snapshot for revision in revisions)
+    assert revisions[4].is_snapshot
+
+    assert [version["text"] for version in load_history(db, message)] == texts
+    assert [load_version(db, message, seq) for seq in range(len(texts))] == texts
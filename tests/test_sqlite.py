@@ -0,0 +1,62 @@
+import threading
+
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models import Workspace
+from app.sqlite import write_queue
+
+
+def test_memory_mode_writers_do_not_share_transactions(db):
+    """sqlite:// で1本の接続を共有していても、他のスレッドの書き込みトランザクションに相乗りしない"""
+    a_wrote = threading.Event()
+    b_started = threading.Event()
+    waited_before = write_queue.waited
+    
+    def writer_a():
+        session = SessionLocal()
+        try:
+            session.add(Workspace(id=10, slug="a", name="a"))
+            session.flush()
+            a_wrote.set()
+            # B がキューに並ぶのを待ってから取り消す
+            b_started.wait(timeout=5)
+            threading.Event().wait(0.2)
+            session.rollback()
+        finally:
+            session.close()
+    
+    def writer_b():
+        a_wrote.wait(timeout=5)
+        session = SessionLocal()
+        try:
+            b_started.set()
+            session.add(Workspace(id=99, slug="b", name="b"))
+            session.commit()
+        finally:
+            session.close()
+    
+    threads = [threading.Thread(target=writer_a), threading.Thread(target=writer_b)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert db.scalars(select(Workspace.id).order_by(Workspace.id)).all() == [1, 99]
+    assert write_queue.waited == waited_before + 1
+
+
+def test_memory_mode_reader_rollback_keeps_other_writes(db):
+    """読み取りだけのセッションを閉じても、他のセッションの書き込み中のトランザクションは残る"""
+    writer = SessionLocal()
+    reader = SessionLocal()
+    try:
+        writer.add(Workspace(id=10, slug="a", name="a"))
+        writer.flush()
+        reader.scalars(select(Workspace.id)).all()
+        reader.close()
+        writer.commit()
+    finally:
+        writer.close()
+    
+    assert db.scalars(select(Workspace.id).order_by(Workspace.id)).all() == [1, 10]
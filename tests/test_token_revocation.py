@@ -0,0 +1,58 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from jose import jwt
+from starlette.requests import Request
+
+from app.config import get_settings
+from app.routers.auth import logout
+from app.services.auth import create_access_token, decode_token
+from app.services.token_revocation import RevocationList
+
+settings = get_settings()
+
+
+def issue(user) -> str:
+    return create_access_token(data={"sub": str(user.id), "email": user.email, "ws": user.workspace_id})
+
+
+def test_logout_revokes_only_that_token(db, make_user):
+    alice = make_user("alice")
+    token = issue(alice)
+    other_session = issue(alice)
+    assert decode_token(token).jti
+
+    request = Request({"type": "http", "method": "POST", "path": "/", "query_string": b"", "headers": []})
+    response = asyncio.run(logout(request, token, db))
+    assert response.status_code == 204
+
+    assert decode_token(token) is None
+    # 同じユーザーの別のトークン（別の端末）はそのまま使える
+    assert decode_token(other_session).user_id == alice.id
+
+    # 他のワーカーは revoked_tokens を読み直して同じ jti を失効扱いにする
+    other_worker = RevocationList()
+    asyncio.run(other_worker.refresh())
+    assert other_worker.is_revoked(decode_token(other_session).jti) is False
+    assert other_worker.is_revoked(jwt.get_unverified_claims(token)["jti"])
+
+
+def test_token_without_jti_is_valid_until_expiry(db, make_user):
+    alice = make_user("alice")
+    expire = datetime.utcnow() + timedelta(minutes=5)
+    legacy = jwt.encode(
+        {"sub": str(alice.id), "email": alice.email, "exp": expire}, settings.SECRET_KEY, algorithm=settings.ALGORITHM
+    )
+    token_data = decode_token(legacy)
+    assert token_data.jti is None
+    assert token_data.workspace_id == 1
+
+
+def test_expired_revocations_are_forgotten():
+    revocations = RevocationList()
+    revocations.add("expired", time.time() - 1)
+    revocations.add("live", time.time() + 60)
+    revocations.expires["stale"] = time.time() - 1
+    revocations.prune()
+    assert set(revocations.expires) == {"live"}
@@ -0,0 +1,42 @@
+from sqlalchemy import text
+
+from app.services.workspaces import advance_id_sequences, align_id_sequences, next_id_above
+
+
+def test_next_id_above_keeps_residue():
+    # 移動先の連番は 1 (mod 16)。移動元（0 (mod 16)）からコピーした最大IDが 160
+    assert next_id_above(33, 160, 16) == 161
+    assert next_id_above(33, 161, 16) == 177
+    # 既にコピーしたIDより先にあれば動かさない
+    assert next_id_above(177, 160, 16) == 177
+
+
+def test_advance_id_sequences_after_copy(pg_engine):
+    with pg_engine.begin() as conn:
+        align_id_sequences({"default": conn})
+        stride = conn.execute(text(
+            "SELECT increment_by FROM pg_sequences WHERE sequencename = 'channels_id_seq'"
+        )).scalar()
+        user_id = conn.execute(text(
+            "INSERT INTO users (workspace_id, email, username, hashed_password) "
+            "VALUES (1, 'alice@example.com', 'alice', 'x') RETURNING id"
+        )).scalar()
+        # 別のシャードからコピーした行（余りが違う、連番より先のID）
+        copied_id = user_id + stride * 10 + 1
+        conn.execute(
+            text(
+                "INSERT INTO channels (id, workspace_id, name, created_by) "
+                "VALUES (:id, 1, 'copied', :user_id)"
+            ),
+            {"id": copied_id, "user_id": user_id},
+        )
+
+        advance_id_sequences(conn, ["users", "channels"])
+
+        channel_id = conn.execute(text(
+            "INSERT INTO channels (workspace_id, name, created_by) VALUES (1, 'general', :user_id) RETURNING id"
+        ), {"user_id": user_id}).scalar()
+        assert channel_id > copied_id
+        assert channel_id % stride == 0
+        # コピーした行のない連番はそのまま
+        assert conn.execute(text("SELECT nextval('users_id_seq')")).scalar() == user_id + stride